@@ -1,143 +1,336 @@
 # agent/browser_automation.py
 # This file contains the core browser automation logic.
 # It uses Playwright to launch a browser, log in to Gmail, and send an email.
+# The individual steps (launch, login, compose & send) are split into small helpers so the
+# long-lived session manager (agent/session_manager.py) can reuse them on a warm page.
+# By default a one-shot send skips the inbox: it opens Gmail's compose view with the email already filled in
+# (send_direct). Images, fonts and analytics requests are blocked, since nobody looks at them. The old
+# click-through flow is still there (BROWSER_SEND_PATH=steps) and takes over whenever the direct view fails.
 
-# Core Libraries 
-# os: Used to interact with the operating system, specifically to create the 'screenshots' directory.
+# Core Libraries
 # playwright.sync_api: The main library for browser automation. We use the synchronous API for simplicity in this script.
 
-import os
-import re # We'll use the 're' library to create safe folder names from email addresses.
-from playwright.sync_api import sync_playwright, Playwright, TimeoutError as PlaywrightTimeoutError
+from playwright.sync_api import sync_playwright, Playwright, Page, BrowserContext, Route, TimeoutError as PlaywrightTimeoutError
 import time
+from urllib.parse import quote, urlencode, urljoin
 
-def send_email_with_browser(playwright: Playwright, recipient: str, subject: str, body: str, sender_email: str, sender_password: str):
+from agent.settings import getenv
+
+# Each sender's profile folder name is built from their email address (see agent/profiles.py).
+from agent.profiles import local_storage_script, profile_dir_for, slimmed_profile_state
+# Cheap login-state checks: stored cookies, recently-seen-good senders, and racing selectors.
+from agent import session_probe
+# Step-by-step screenshots (or a trace), written in the background; see CAPTURE_MODE in agent/capture.py.
+from agent.capture import NO_CAPTURE, SendCapture
+# Stage timings (browser.launch, browser.session_probe, browser.compose, browser.wait_sent...), see agent/tracing.py.
+from agent.tracing import span, traced
+# Raised when we clicked Send but never saw Gmail confirm it, so the email may or may not have gone out.
+from agent.transports import AmbiguousSendError
+
+# Both can point at a local stand-in of Gmail (see benchmarks/fake_gmail.py) to run the flow offline.
+GMAIL_URL = getenv("GMAIL_BASE_URL", "https://mail.google.com/")
+# When we already know there is no session, we go straight to the sign-in form instead of rendering Gmail first.
+LOGIN_URL = getenv("GMAIL_LOGIN_URL", "https://accounts.google.com/ServiceLogin?service=mail&continue=https://mail.google.com/mail/")
+
+# "direct" opens the pre-filled compose view; "steps" loads the inbox, clicks Compose and types every field.
+SEND_PATH = getenv("BROWSER_SEND_PATH", "direct").lower()
+# Images, fonts, media and analytics pings are not needed to send an email.
+BLOCK_RESOURCES = getenv("BROWSER_BLOCK_RESOURCES", "1").lower() not in ("0", "false", "no")
+# Slow motion (50 ms per action) and a pause before closing, to watch what the automation does.
+BROWSER_DEBUG = getenv("BROWSER_DEBUG", "").lower() in ("1", "true", "yes")
+# Only for senders that are already logged in (the one-time login needs the visible window), e.g. benchmarks.
+BROWSER_HEADLESS = getenv("BROWSER_HEADLESS", "").lower() in ("1", "true", "yes")
+# Longer bodies don't go into the compose URL (it would get too long); they are typed in instead.
+COMPOSE_URL_MAX_CHARS = int(getenv("COMPOSE_URL_MAX_CHARS", "6000"))
+
+SEND_BUTTON_NAME = "Send ‪(Ctrl-Enter)‬"
+_BLOCKED_RESOURCE_TYPES = {"image", "font", "media"}
+_BLOCKED_URL_PARTS = ("google-analytics.com", "googletagmanager.com", "doubleclick.net", "/gen_204", "/log?", "/csi?")
+
+def _route_request(route: Route):
+    request = route.request
+    if request.resource_type in _BLOCKED_RESOURCE_TYPES or any(part in request.url for part in _BLOCKED_URL_PARTS):
+        route.abort()
+    else:
+        route.continue_()
+
+def block_heavy_requests(context: BrowserContext):
+    """Stops the context from downloading images, fonts, media and analytics (if BROWSER_BLOCK_RESOURCES is on)."""
+    if BLOCK_RESOURCES:
+        context.route("**/*", _route_request)
+
+def allow_all_requests(context: BrowserContext):
+    """Undoes block_heavy_requests, e.g. so a CAPTCHA image can show during the manual login."""
+    if BLOCK_RESOURCES:
+        context.unroute("**/*", _route_request)
+
+def compose_url(recipient: str, subject: str, body: str) -> tuple[str, bool]:
     """
-    The definitive browser automation function. It combines all our best ideas:
-    1. A unique, persistent browser profile for EACH sender email, so sessions never conflict.
-    2. A trusted browser that doesn't give error.
-    3. Automatic filling of credentials for the very first login on a new account: email and password.
-    4. Automatic detection of a successful login after the user handles 2FA/CAPTCHA(manual intervention).
-    5. Detailed step-by-step screenshots for clear debugging.
+    Gmail's full-page compose view with the email filled in.
+
+    Returns:
+        tuple[str, bool]: The URL, and whether the body is part of it (it is left out of overly long URLs).
     """
-    
-    # Let's create a unique and safe folder name from the user's email address.
-    # This is the key to managing multiple accounts without them interfering with each other.
-    # For example, 'user.name@example.com' becomes 'profile_user_name_example_com'.
-    # After that it will be accesed for further email automations
-    
-    safe_email_name = re.sub(r'[^a-zA-Z0-9]', '_', sender_email)
-    USER_PROFILE_DIR = f"./profile_{safe_email_name}"
-    
-    # We'll make sure our screenshots folder is ready to go.
-    os.makedirs("screenshots", exist_ok=True)
+    url = urljoin(GMAIL_URL, "mail/") + "?" + urlencode({"view": "cm", "fs": "1", "tf": "1", "to": recipient, "su": subject}, quote_via=quote)
+    with_body = f"{url}&body={quote(body)}"
+    if len(with_body) <= COMPOSE_URL_MAX_CHARS:
+        return with_body, True
+    return url, False
+
+def launch_sender_context(playwright: Playwright, sender_email: str) -> BrowserContext:
+    """
+    Launches the visible Chromium window bound to the sender's persistent profile.
+
+    Args:
+        playwright (Playwright): The running Playwright instance.
+        sender_email (str): The account whose profile should be loaded.
+
+    Returns:
+        BrowserContext: The persistent context (the browser window itself).
+    """
+    # A profile slimmed down to its storage_state JSON gets a fresh folder, with the saved login put back in.
+    saved_state = slimmed_profile_state(sender_email)
 
     # We launch the browser using our special persistent profile directory.
     # This is what makes Google trust the browser and saves our login session like a real browser would.
-    context = playwright.chromium.launch_persistent_context(
-        user_data_dir=USER_PROFILE_DIR,
-        headless=False,
-        slow_mo=50
-    )
-    
-    # The browser might already have a page open from a previous run. We'll use it if it's there.
-    page = context.pages[0] if context.pages else context.new_page()
-    
+    with span("browser.launch", sender=sender_email, persistent=True, restored=saved_state is not None):
+        context = playwright.chromium.launch_persistent_context(
+            user_data_dir=profile_dir_for(sender_email),
+            headless=BROWSER_HEADLESS,
+            slow_mo=50 if BROWSER_DEBUG else 0
+        )
+        if saved_state:
+            print(f"Restoring the saved login of {sender_email} into a fresh profile...")
+            context.add_cookies(saved_state["cookies"])
+            # launch_persistent_context has no storage_state=, so local storage goes back in through an init script.
+            script = local_storage_script(saved_state["origins"])
+            if script:
+                context.add_init_script(script=script)
+    block_heavy_requests(context)
+    return context
+
+@traced("browser.manual_login")
+def _manual_login(page: Page, sender_email: str, sender_password: str, capture: SendCapture):
+    """The one-time assisted login: best-effort autofill, then waiting for the user to finish 2FA/CAPTCHA."""
+    print(f"No active session for {sender_email}. Starting one-time login process...")
+    # The sign-in page may need to show a CAPTCHA image.
+    allow_all_requests(page.context)
+
+    # The script will do its best to fill in the login details.
     try:
-        # Gmail page.
-        print("Navigating to Gmail...")
-        page.goto("https://mail.google.com/", wait_until='load', timeout=60000)
-        page.screenshot(path="screenshots/01_login_page.png")
+        print("Filling the email...")
+        page.get_by_role("textbox", name="Email or phone").fill(sender_email)
+        page.get_by_role("button", name="Next").click()
+        capture.frame("02_email_entered")
+
+        print("Filling the password...")
+        password_input = page.get_by_role("textbox", name="Enter your password")
+        password_input.wait_for(timeout=5000)
+        password_input.fill(sender_password)
+        capture.frame("03_password_entered")
+
+        page.get_by_role("button", name="Next").click()
+        print("Autofill successful. Now waiting for you to complete the login(Captch/2FA)...")
+    except Exception:
+        # If autofill fails for any reason, it's not a problem. You can just log in normally.
+        print("Could not complete autofill. Please proceed with login manually.")
+
+    # AUTOMATIC DETECTION
+    # We will wait for the inbox to appear.
+    print("\n" + "="*60)
+    print("WAITING FOR MANUAL LOGIN...")
+    print("Please complete the login in the browser (2FA, CAPTCHA, etc.).")
+    print("The script will automatically detect when you're done and continue...")
+
+    # This command will wait for the "Compose" button to appear.
+    # Once it appears, the script knows you're in and will proceed.
+
+    compose_button = page.get_by_role("button", name="Compose")
+    compose_button.wait_for(timeout=180000) # increased timeout
+    print("Login successful! Inbox detected automatically.")
+    print("="*60 + "\n")
+    block_heavy_requests(page.context)
+
+@traced("browser.ensure_logged_in")
+def ensure_logged_in(page: Page, sender_email: str, sender_password: str, capture: SendCapture = NO_CAPTURE):
+    """
+    Opens Gmail and makes sure the page ends up in the inbox, handling the
+    one-time assisted login (autofill + manual 2FA/CAPTCHA) when needed.
+
+    Args:
+        page (Page): The page to drive.
+        sender_email (str): The account to log in with.
+        sender_password (str): The password used for the best-effort autofill.
+        capture (SendCapture): Where the step screenshots go (none by default).
+    """
+    with span("browser.session_probe", sender=sender_email) as probe:
+        # First a cheap guess without rendering anything: does the profile hold a live Google session?
+        started = time.perf_counter()
+        expected_logged_in = session_probe.expect_logged_in(sender_email)
+
+        if expected_logged_in:
+            # Gmail page. We don't wait for the full 'load' event; the selector race below tells us when we're in.
+            print("Stored session found. Navigating to Gmail...")
+            page.goto(GMAIL_URL, wait_until='domcontentloaded', timeout=60000)
+        else:
+            print("No stored session. Navigating straight to the sign-in page...")
+            page.goto(LOGIN_URL, wait_until='domcontentloaded', timeout=60000)
+        capture.frame("01_login_page")
 
         # Now, let's check if we're already logged in for this account.
-        
-        is_logged_in = False
-        try:
-            # We'll know we're in the inbox if we can find the "Compose" button.
-            
-            page.wait_for_selector('div[gh="cm"]', timeout=7000)  # Timeout is increased for slow connections.
-            is_logged_in = True
-            print(f"Active session found for {sender_email}. Proceeding automatically.")
-        except PlaywrightTimeoutError:
-            # If we can't find it, no worries, it just means we need to log in.
-            is_logged_in = False
-
-        # This entire block only runs if it's the FIRST time we're using this email address, otherwise if it is already existing no credentials needed, direct login.
-        if not is_logged_in:
-            print(f"No active session for {sender_email}. Starting one-time login process...")
-            
-            # The script will do its best to fill in the login details.
-            try:
-                print("Filling the email...")
-                page.get_by_role("textbox", name="Email or phone").fill(sender_email)
-                page.get_by_role("button", name="Next").click()
-                page.screenshot(path="screenshots/02_email_entered.png")
-                
-                print("Filling the password...")
-                password_input = page.get_by_role("textbox", name="Enter your password")
-                password_input.wait_for(timeout=5000)
-                password_input.fill(sender_password)
-                page.screenshot(path="screenshots/03_password_entered.png")
-                
-                page.get_by_role("button", name="Next").click()
-                print("Autofill successful. Now waiting for you to complete the login(Captch/2FA)...")
-            except Exception:
-                # If autofill fails for any reason, it's not a problem. You can just log in normally.
-                print("Could not complete autofill. Please proceed with login manually.")
-
-            # AUTOMATIC DETECTION
-            # We will wait for the inbox to appear.
-            print("\n" + "="*60)
-            print("WAITING FOR MANUAL LOGIN...")
-            print("Please complete the login in the browser (2FA, CAPTCHA, etc.).")
-            print("The script will automatically detect when you're done and continue...")
-            
-            # This command will wait for the "Compose" button to appear.
-            # Once it appears, the script knows you're in and will proceed.
-            
-            compose_button = page.get_by_role("button", name="Compose")
-            compose_button.wait_for(timeout=180000) # increased timeout
-            print("Login successful! Inbox detected automatically.")
-            print("="*60 + "\n")
-
-        # Whether we logged in automatically or with manual help, we are now in the inbox.
-        # The persistent context has saved this successful login for all future runs.
-        
-        print("Login confirmed. Taking screenshot of inbox...")
-        page.screenshot(path="screenshots/04_inbox_loaded.png")
-
-        # Now we proceed with sending the email.
-        # Email Composition Process
+        # Whichever renders first, the inbox's "Compose" button or a login form, gives us the answer.
+        # A logged-out sender is detected as soon as the login form shows up, instead of after a fixed 7 second wait.
+        state = session_probe.detect_page_state(page, timeout=30000 if expected_logged_in else 15000)
+        session_probe.record_check(state, time.perf_counter() - started)
+        probe.set(expected_logged_in=expected_logged_in, state=state)
+    is_logged_in = state == "inbox"
+    if is_logged_in:
+        print(f"Active session found for {sender_email}. Proceeding automatically.")
+    else:
+        # The stored session turned out to be stale (or there was none), so we stop trusting it.
+        session_probe.known_good_sessions.forget(sender_email)
+
+    # This entire block only runs if it's the FIRST time we're using this email address, otherwise if it is already existing no credentials needed, direct login.
+    if not is_logged_in:
+        _manual_login(page, sender_email, sender_password, capture)
+
+    # Whether we logged in automatically or with manual help, we are now in the inbox.
+    # The persistent context has saved this successful login for all future runs.
+    session_probe.known_good_sessions.mark_good(sender_email)
 
+    print("Login confirmed.")
+    capture.frame("04_inbox_loaded")
+
+def compose_and_send(page: Page, recipient: str, subject: str, body: str, capture: SendCapture = NO_CAPTURE):
+    """
+    Opens the Compose window from the inbox, fills it in and clicks Send,
+    waiting for Gmail's "Message sent" confirmation.
+
+    Args:
+        page (Page): A page that is already showing the logged-in inbox.
+        recipient (str): The recipient's email address.
+        subject (str): The email subject line.
+        body (str): The email body.
+        capture (SendCapture): Where the step screenshots go (none by default).
+    """
+    # Email Composition Process
+
+    with span("browser.compose", body_chars=len(body)):
         print("Composing email...")
         page.get_by_role("button", name="Compose").click()
-        
+
         to_field = page.get_by_role("combobox", name="Recipients")
         to_field.wait_for(timeout=15000)
-        
+
         to_field.fill(recipient)
         page.get_by_placeholder("Subject").fill(subject)  # For subject.
         page.get_by_role("textbox", name="Message Body").fill(body)
-        page.screenshot(path="screenshots/05_email_composed.png")
+        capture.frame("05_email_composed")
+
+    _send_and_confirm(page, capture)
+
+def send_direct(page: Page, recipient: str, subject: str, body: str, sender_email: str, sender_password: str,
+                capture: SendCapture = NO_CAPTURE):
+    """
+    The fast path: opens Gmail's compose view with the recipient, subject and body already filled in, so the
+    inbox never renders and nothing is typed, then clicks Send. A sender without a stored session logs in the
+    usual way first. If the compose view doesn't show up, the step-by-step flow takes over.
+
+    Args:
+        page (Page): The page to drive.
+        recipient (str): The recipient's email address.
+        subject (str): The email subject line.
+        body (str): The email body.
+        sender_email (str): The account to send from.
+        sender_password (str): The password used for the best-effort autofill, if a login is needed.
+        capture (SendCapture): Where the step screenshots go (none by default).
+    """
+    url, body_in_url = compose_url(recipient, subject, body)
+    if not session_probe.expect_logged_in(sender_email):
+        # The login ends in the inbox; the compose view is opened from there.
+        ensure_logged_in(page, sender_email, sender_password, capture)
+
+    with span("browser.compose", body_chars=len(body), direct=True) as compose:
+        print("Opening the compose view...")
+        page.goto(url, wait_until="domcontentloaded", timeout=60000)
+        state = session_probe.detect_page_state(page, timeout=30000, target="compose")
+        compose.set(state=state)
+        if state == "compose":
+            # Gmail normally fills the fields from the URL; if it didn't, they are typed in like before.
+            subject_field = page.get_by_placeholder("Subject")
+            if subject_field.input_value() != subject:
+                subject_field.fill(subject)
+            if not body_in_url:
+                page.get_by_role("textbox", name="Message Body").fill(body)
+            capture.frame("05_email_composed")
+
+    if state != "compose":
+        if state == "login":
+            session_probe.known_good_sessions.forget(sender_email)
+        print(f"The compose view did not open directly (page state: {state}). Falling back to the step-by-step flow.")
+        ensure_logged_in(page, sender_email, sender_password, capture)
+        compose_and_send(page, recipient, subject, body, capture)
+        return
+    session_probe.known_good_sessions.mark_good(sender_email)
+    _send_and_confirm(page, capture)
 
+def _send_and_confirm(page: Page, capture: SendCapture):
+    with span("browser.wait_sent"):
         print("Sending email...")
-        page.get_by_role("button", name="Send ‪(Ctrl-Enter)‬").click()
-        page.get_by_text("Message sent").wait_for(timeout=15000)
-        page.screenshot(path="screenshots/06_email_sent.png")
-        
+        page.get_by_role("button", name=SEND_BUTTON_NAME).click()
+        try:
+            page.get_by_text("Message sent").wait_for(timeout=15000)
+        except PlaywrightTimeoutError as e:
+            # Send was clicked, so the email may well be on its way. Retrying blindly could send it twice.
+            raise AmbiguousSendError("Send was clicked but Gmail never confirmed 'Message sent'.") from e
+    capture.frame("06_email_sent")
+
+@traced("send", transport="browser", warm=False)
+def send_email_with_browser(playwright: Playwright, recipient: str, subject: str, body: str, sender_email: str, sender_password: str):
+    """
+    The definitive browser automation function. It combines all our best ideas:
+    1. A unique, persistent browser profile for EACH sender email, so sessions never conflict.
+    2. A trusted browser that doesn't give error.
+    3. Automatic filling of credentials for the very first login on a new account: email and password.
+    4. Automatic detection of a successful login after the user handles 2FA/CAPTCHA(manual intervention).
+    5. Step-by-step screenshots for debugging, per CAPTURE_MODE (by default only kept when something fails).
+    6. The direct compose view instead of the inbox (BROWSER_SEND_PATH), without images, fonts or analytics.
+
+    This is the "cold" one-shot path: it launches Chromium, sends one email and closes it again.
+    The app normally goes through BrowserSessionManager, which keeps the window warm between sends.
+    """
+
+    context = launch_sender_context(playwright, sender_email)
+
+    # The browser might already have a page open from a previous run. We'll use it if it's there.
+    page = context.pages[0] if context.pages else context.new_page()
+    # This run's captures get their own folder, so back-to-back or parallel runs never overwrite each other.
+    capture = SendCapture(page, f"send_{sender_email}")
+
+    try:
+        if SEND_PATH == "direct":
+            send_direct(page, recipient, subject, body, sender_email, sender_password, capture)
+        else:
+            ensure_logged_in(page, sender_email, sender_password, capture)
+
+            # Now we proceed with sending the email.
+            compose_and_send(page, recipient, subject, body, capture)
+        capture.success()
+
         print("Browser automation finished successfully.")
 
     except Exception as e:
-       # If any error occurs, take a final screenshot for debugging.
-       
+       # If any error occurs, the recent screenshots and a final one are saved for debugging.
+
         print(f"An error occurred during the browser automation: {e}")
-        page.screenshot(path="screenshots/error.png")
-        
+        capture.failure(e)
+
         # Re-raise the exception so the UI can catch it and display a detailed error message.
-        
+
         raise e
     finally:
         # This makes sure the browser always closes down neatly.
         print("Closing browser context.")
-        time.sleep(2) # A small pause to see the final result.
-        context.close()
\ No newline at end of file
+        if BROWSER_DEBUG:
+            time.sleep(2) # A small pause to see the final result.
+        context.close()
@@ -0,0 +1,182 @@
+# agent/bulk_sender.py
+# This file adds a bulk / mail-merge mode on top of the assistant.
+# Instead of one conversation per email, it reads a CSV or JSONL list of recipients (with
+# per-row variables), writes a draft for every row, and then queues all of them in the durable outbox
+# (agent/outbox.py), whose workers send them through one warm Gmail page (BrowserSessionManager) or, with
+# --transport smtp, over pooled SMTP connections (see agent/transports.py).
+# Each row's idempotency key is derived from the input file and the row (its number and recipient), so running
+# the same file again after a partial failure or a crash only sends the rows that did not go out yet.
+#
+# Usage:
+#     python -m agent.bulk_sender contacts.csv --sender you@gmail.com --name "Your Name" \
+#         --template "Thank {first_name} for attending the {event} workshop"
+#
+# Every row needs a 'recipient' column. Any other column can be used as a {placeholder} in the
+# template, or a row can carry its own full 'prompt' column instead.
+
+import argparse
+import asyncio
+import csv
+import getpass
+import hashlib
+import json
+import os
+import queue
+import time
+
+from agent.email_generator import agenerate_many
+from agent.outbox import get_outbox
+from agent.transports import close_transports
+
+def load_rows(path: str) -> list[dict]:
+    """
+    Reads the recipient list from a .csv or .jsonl file.
+
+    Args:
+        path (str): Path to the CSV (with a header row) or JSONL (one object per line) file.
+
+    Returns:
+        list[dict]: One dictionary of variables per row.
+    """
+    if path.lower().endswith(".jsonl"):
+        with open(path, encoding="utf-8") as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    else:
+        with open(path, newline="", encoding="utf-8-sig") as f:
+            rows = list(csv.DictReader(f))
+
+    for number, row in enumerate(rows, start=1):
+        if not str(row.get("recipient", "")).strip():
+            raise ValueError(f"Row {number} in {path} has no 'recipient' value.")
+    return rows
+
+def build_prompt(row: dict, template: str | None) -> str:
+    """Fills the template with the row's variables, or uses the row's own 'prompt' column."""
+    if row.get("prompt"):
+        return str(row["prompt"])
+    if not template:
+        raise ValueError("Row has no 'prompt' column and no --template was given.")
+    return template.format_map(row)
+
+def generate_drafts(rows: list[dict], user_name: str, template: str | None, on_progress=print) -> list[dict]:
+    """
+    Writes a draft for every row. The drafts are generated concurrently through agenerate_many,
+    so a large batch takes a few model round-trips instead of one round-trip per row.
+    Each result keeps the row, its prompt and either the draft or an error.
+    """
+    results = []
+    requests = []
+    for number, row in enumerate(rows, start=1):
+        result = {"row": number, "recipient": row["recipient"].strip(), "draft": None, "status": "pending", "error": ""}
+        try:
+            result["prompt"] = build_prompt(row, template)
+            requests.append((result, {"user_name": row.get("user_name") or user_name, "prompt": result["prompt"]}))
+        except Exception as e:
+            result["status"] = "draft_failed"
+            result["error"] = str(e)
+        results.append(result)
+
+    for result in results:
+        if result["status"] == "draft_failed":
+            on_progress(f"[draft {result['row']}/{len(rows)}] {result['recipient']}: {result['error']}")
+
+    def on_draft(index, draft):
+        result = requests[index][0]
+        result["draft"] = draft
+        if draft is None:
+            result["status"] = "draft_failed"
+            result["error"] = "The AI could not generate a draft for this row."
+        on_progress(f"[draft {result['row']}/{len(rows)}] {result['recipient']}: {'ok' if draft else result['error']}")
+
+    asyncio.run(agenerate_many([request for _, request in requests], on_done=on_draft))
+    return results
+
+def row_key(source: str, result: dict) -> str:
+    """The idempotency key of one row of the input file: the same row of the same file is only ever sent once."""
+    raw = "\x1f".join(["bulk", os.path.abspath(source), str(result["row"]), result["recipient"].lower()])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+def send_drafts(results: list[dict], source: str, sender_email: str, sender_password: str, transport: str | None = None,
+                on_progress=print) -> list[dict]:
+    """
+    Queues every successfully drafted row in the outbox and waits until each one reaches a final state.
+    The outbox sends them one after another per sender (over one warm browser session, or one pool of
+    authenticated SMTP connections), retries failures and rate limits the sender (OUTBOX_SENDER_PER_MINUTE).
+    Rows this file already sent in an earlier run are reported as sent without being sent again.
+
+    Args:
+        results (list[dict]): The output of generate_drafts().
+        source (str): The input file; with the row number and recipient it makes each row's idempotency key.
+        sender_email, sender_password (str): The account to send from.
+        transport (str | None): "browser", "shared-browser" or "smtp" (defaults to the EMAIL_TRANSPORT setting).
+        on_progress (callable): Called with one line of text per finished row.
+    """
+    sendable = [r for r in results if r["draft"]]
+    finished = queue.Queue()
+    outbox = get_outbox()
+    for result in sendable:
+        outbox_id, created = outbox.enqueue(
+            result["recipient"], result["draft"]["subject"], result["draft"]["body"], sender_email, sender_password,
+            transport=transport, idempotency_key=row_key(source, result),
+            on_done=lambda row, result=result: finished.put((result, row)),
+        )
+        result["outbox_id"] = outbox_id
+        result["earlier_run"] = not created
+
+    for done in range(1, len(sendable) + 1):
+        result, row = finished.get()
+        result["status"] = {"sent": "sent", "uncertain": "uncertain"}.get(row["status"], "send_failed")
+        result["error"] = row["last_error"] or ""
+        if row["latency"] is not None:
+            result["latency"] = row["latency"]
+        note = " (sent by an earlier run)" if result["earlier_run"] and result["status"] == "sent" else ""
+        on_progress(f"[send {done}/{len(sendable)}] {result['recipient']}: {result['status']}{note}")
+    return results
+
+def write_report(results: list[dict], path: str):
+    """Writes one line per row with its final status, so failed rows can be retried."""
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=["row", "recipient", "status", "subject", "latency", "error"])
+        writer.writeheader()
+        for r in results:
+            writer.writerow({
+                "row": r["row"],
+                "recipient": r["recipient"],
+                "status": r["status"],
+                "subject": r["draft"]["subject"] if r["draft"] else "",
+                "latency": f"{r['latency']:.2f}" if "latency" in r else "",
+                "error": r["error"],
+            })
+
+def main():
+    parser = argparse.ArgumentParser(description="Send a personalised email to every row of a CSV/JSONL file.")
+    parser.add_argument("path", help="CSV or JSONL file with a 'recipient' column and any template variables.")
+    parser.add_argument("--sender", required=True, help="The Gmail account to send from.")
+    parser.add_argument("--name", required=True, help="Your name for the signature.")
+    parser.add_argument("--template", help="Prompt template, e.g. 'Thank {first_name} for the meeting'.")
+    parser.add_argument("--report", help="Where to write the per-row results CSV (default: <input>.results.csv).")
+    parser.add_argument("--transport", choices=["browser", "shared-browser", "smtp"], help="How to deliver the emails (default: EMAIL_TRANSPORT or browser).")
+    parser.add_argument("--dry-run", action="store_true", help="Only generate the drafts, do not send anything.")
+    args = parser.parse_args()
+
+    rows = load_rows(args.path)
+    started = time.perf_counter()
+    results = generate_drafts(rows, args.name, args.template)
+
+    if not args.dry_run:
+        password = getpass.getpass(f"Password for {args.sender}: ")
+        try:
+            send_drafts(results, args.path, args.sender, password, args.transport)
+        finally:
+            get_outbox().stop()
+            close_transports()
+
+    report_path = args.report or f"{os.path.splitext(args.path)[0]}.results.csv"
+    write_report(results, report_path)
+
+    sent = sum(r["status"] == "sent" for r in results)
+    elapsed = time.perf_counter() - started
+    print(f"\nDone: {sent}/{len(results)} sent in {elapsed:.1f}s. Report written to {report_path}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,189 @@
+# agent/capture.py
+# Screenshots and traces of the browser automation, kept off the send's critical path.
+# Every send used to write six PNG files to fixed names in screenshots/ (01_login_page.png ... 06_email_sent.png),
+# waiting on the disk each time, and every run overwrote the previous one's pictures.
+# Now the CAPTURE_MODE setting picks one of:
+#   off         - no captures at all.
+#   on-failure  - (default) frames are kept in a small in-memory ring buffer and only written to disk when
+#                 something goes wrong, together with the error.
+#   full        - every frame is written, like before.
+#   trace       - a Playwright trace (screenshots + DOM snapshots, open it with `playwright show-trace`).
+# Each run gets its own folder (screenshots/<time>_<label>_<id>/), and the files are written by a background
+# thread, so the send itself never waits for the disk.
+
+import atexit
+import os
+import queue
+import re
+import shutil
+import threading
+import time
+import traceback
+import uuid
+from collections import deque
+
+from agent.settings import getenv
+
+CAPTURE_MODES = ("off", "on-failure", "full", "trace")
+CAPTURE_MODE = getenv("CAPTURE_MODE", "on-failure").lower()
+CAPTURE_DIR = getenv("CAPTURE_DIR", "screenshots")
+# How many recent frames the on-failure ring buffer remembers.
+CAPTURE_RING_SIZE = int(getenv("CAPTURE_RING_SIZE", "6"))
+# Older run folders beyond this many are deleted (0 keeps everything).
+CAPTURE_KEEP_RUNS = int(getenv("CAPTURE_KEEP_RUNS", "50"))
+
+if CAPTURE_MODE not in CAPTURE_MODES:
+    print(f"Unknown CAPTURE_MODE '{CAPTURE_MODE}', using 'on-failure'. Choose one of: {', '.join(CAPTURE_MODES)}.")
+    CAPTURE_MODE = "on-failure"
+
+class CaptureWriter:
+    """A background thread that writes capture files, so callers only hand over bytes in memory."""
+
+    def __init__(self, root: str = CAPTURE_DIR, keep_runs: int = CAPTURE_KEEP_RUNS):
+        self.root = root
+        self.keep_runs = keep_runs
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        self.stats = {"files": 0, "bytes": 0, "errors": 0}
+
+    def submit(self, run_dir: str, name: str, data: bytes):
+        """Queues one file to be written as <root>/<run_dir>/<name>."""
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="capture-writer", daemon=True)
+                self._thread.start()
+        self._jobs.put((run_dir, name, data))
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Waits until everything queued so far is on disk. Returns False if the timeout ran out first."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._jobs.put(done)
+        return done.wait(timeout)
+
+    def _run(self):
+        while True:
+            job = self._jobs.get()
+            if isinstance(job, threading.Event):
+                job.set()
+                continue
+            run_dir, name, data = job
+            folder = os.path.join(self.root, run_dir)
+            try:
+                new_run = not os.path.isdir(folder)
+                os.makedirs(folder, exist_ok=True)
+                with open(os.path.join(folder, name), "wb") as f:
+                    f.write(data)
+                self.stats["files"] += 1
+                self.stats["bytes"] += len(data)
+                if new_run:
+                    self._prune()
+            except OSError as e:
+                self.stats["errors"] += 1
+                print(f"Could not write capture {folder}/{name}: {e}")
+
+    def _prune(self):
+        if self.keep_runs <= 0:
+            return
+        # Run folders start with their timestamp, so sorting by name sorts them by age.
+        runs = sorted(entry.path for entry in os.scandir(self.root) if entry.is_dir() and entry.name[:1].isdigit())
+        for old in runs[:-self.keep_runs]:
+            shutil.rmtree(old, ignore_errors=True)
+
+_writer = None
+_writer_lock = threading.Lock()
+
+def get_capture_writer() -> CaptureWriter:
+    """Returns the process-wide capture writer, creating it on first use."""
+    global _writer
+    with _writer_lock:
+        if _writer is None:
+            _writer = CaptureWriter()
+            # Give queued captures a moment to reach the disk when the program exits.
+            atexit.register(_writer.flush, 5.0)
+        return _writer
+
+class SendCapture:
+    """
+    The captures of one run (one login, one send...). Call frame() at each step, then success() or failure().
+
+    Args:
+        page: The Playwright page being driven (None for a capture that does nothing).
+        label (str): A short description used in the run folder name, e.g. "send_user@example.com".
+        mode (str | None): One of CAPTURE_MODES, defaulting to the CAPTURE_MODE setting.
+    """
+
+    def __init__(self, page, label: str, mode: str | None = None):
+        self.page = page
+        self.mode = (mode or CAPTURE_MODE) if page is not None else "off"
+        safe_label = re.sub(r"[^a-zA-Z0-9]+", "_", label).strip("_")[:60]
+        self.run_dir = f"{time.strftime('%Y%m%d-%H%M%S')}_{safe_label}_{uuid.uuid4().hex[:6]}"
+        self._ring = deque(maxlen=max(1, CAPTURE_RING_SIZE))
+        self._tracing = False
+        if self.mode == "trace":
+            try:
+                page.context.tracing.start(screenshots=True, snapshots=True, title=label)
+                self._tracing = True
+            except Exception as e:
+                # Tracing may already be running on a reused context; the run still works without it.
+                print(f"Could not start the Playwright trace: {e}")
+
+    def frame(self, name: str):
+        """Captures the page at a named step (e.g. "04_inbox_loaded"). Never raises."""
+        if self.mode == "on-failure":
+            # A JPEG in memory is much cheaper than a PNG on disk, and it is only written if the run fails.
+            data = self._screenshot(type="jpeg", quality=70)
+            if data is not None:
+                self._ring.append((f"{name}.jpg", data))
+        elif self.mode == "full":
+            data = self._screenshot()
+            if data is not None:
+                get_capture_writer().submit(self.run_dir, f"{name}.png", data)
+        # "trace" records the screenshots itself; "off" records nothing.
+
+    def success(self):
+        """The run went fine: the ring buffer is dropped, a trace is saved."""
+        self._ring.clear()
+        self._stop_trace()
+
+    def failure(self, error: BaseException | None = None):
+        """The run failed: writes the recent frames, a final screenshot and the error to the run folder."""
+        if self.mode == "off":
+            return
+        writer = get_capture_writer()
+        if self.mode in ("on-failure", "full"):
+            for name, data in self._ring:
+                writer.submit(self.run_dir, name, data)
+            self._ring.clear()
+            data = self._screenshot()
+            if data is not None:
+                writer.submit(self.run_dir, "error.png", data)
+        if error is not None:
+            details = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+            writer.submit(self.run_dir, "error.txt", details.encode("utf-8"))
+        self._stop_trace()
+        print(f"Failure captures are being saved to {os.path.join(writer.root, self.run_dir)}")
+
+    def _screenshot(self, **options) -> bytes | None:
+        try:
+            return self.page.screenshot(**options)
+        except Exception as e:
+            print(f"Could not take a screenshot: {e}")
+            return None
+
+    def _stop_trace(self):
+        if not self._tracing:
+            return
+        self._tracing = False
+        folder = os.path.join(get_capture_writer().root, self.run_dir)
+        try:
+            # Playwright writes the trace archive itself; this is the one capture that is not handed to the writer.
+            os.makedirs(folder, exist_ok=True)
+            self.page.context.tracing.stop(path=os.path.join(folder, "trace.zip"))
+        except Exception as e:
+            print(f"Could not save the Playwright trace: {e}")
+
+# A capture that does nothing, for callers that don't pass one.
+NO_CAPTURE = SendCapture(None, "none")
@@ -0,0 +1,201 @@
+# agent/conversation.py
+# The conversation engine, independent of any user interface.
+# It holds the state machine that used to live inside ChatApp.handle_user_input:
+#
+#   asking_recipient -> asking_name -> asking_prompt -> analyzing -> (asking_followup ->) generating
+#   -> awaiting_decision -> (revising after feedback | sending) -> asking_recipient
+#
+# A ConversationSession never calls the AI or the browser itself. Every method returns a Step: the
+# messages to show, plus the action (if any) the driver should perform next ("analyze", "generate",
+# "revise", "review" or "send"). The driver performs it in whatever way suits it and feeds the result back
+# (on_analysis, on_draft, on_revision, on_sent). The desktop app drives it with threads; agent/server.py drives
+# hundreds of sessions at once with asyncio.
+#
+# While a draft is being generated, the driver may offer a similar draft the user approved before
+# (offer_suggestion, see agent/draft_index.py); use_suggestion then puts it up for review straight away.
+
+import time
+import uuid
+
+from agent.revision import RevisionContext
+
+class Step:
+    """
+    What a session wants its driver to do after an event.
+
+    Attributes:
+        messages (list[tuple[str, str]]): (speaker, text) pairs to show, speaker is "bot" or "user".
+        action (str | None): "analyze", "generate", "revise", "review", "send" or None (just wait for the user).
+        regenerate (bool): For "generate": skip the draft cache (the user asked for changes).
+        accepts_input (bool): Whether the text input should be enabled afterwards.
+    """
+
+    def __init__(self, messages=None, action=None, regenerate=False, accepts_input=False):
+        self.messages = messages or []
+        self.action = action
+        self.regenerate = regenerate
+        self.accepts_input = accepts_input
+
+    def to_dict(self) -> dict:
+        return {"messages": [{"speaker": s, "text": t} for s, t in self.messages], "action": self.action,
+                "accepts_input": self.accepts_input}
+
+class ConversationSession:
+    """One user's conversation: the state machine plus everything gathered along the way."""
+
+    def __init__(self, session_id: str | None = None):
+        self.session_id = session_id or uuid.uuid4().hex
+        # All the information gathered during the conversation: recipient, user_name and prompt.
+        self.data = {}
+        # The current draft ({'subject': ..., 'body': ...}) once one has been generated.
+        self.draft = None
+        # The request, latest draft and feedback, kept compact for "edit this draft" revisions.
+        self.revision = None
+        # A fresh id per draft, used as the outbox idempotency key so one approval sends one email.
+        self.draft_id = None
+        # A similar, previously approved draft offered while the new one is being generated.
+        self.suggestion = None
+        self.state = "asking_recipient"
+        self.last_active = time.monotonic()
+
+    def start(self) -> Step:
+        """The opening message of the conversation."""
+        self._touch()
+        return Step([("bot", "Hello! I'm your Autonomous Email Assistant.\nWho should this email be sent to (recipient email id)?")],
+                    accepts_input=True)
+
+    def submit(self, user_text: str) -> Step:
+        """Handles a message typed by the user, according to the current state."""
+        self._touch()
+        user_text = user_text.strip()
+        # We'll ignore if any empty messages.
+        if not user_text:
+            return Step(accepts_input=self.state in ("asking_recipient", "asking_name", "asking_prompt", "asking_followup"))
+
+        if self.state == "asking_recipient":
+            self.data["recipient"] = user_text
+            self.state = "asking_name"
+            return Step([("bot", "Got it. What is your name for the signature?")], accepts_input=True)
+        if self.state == "asking_name":
+            self.data["user_name"] = user_text
+            self.state = "asking_prompt"
+            return Step([("bot", "Perfect! Now, what should the email be about?")], accepts_input=True)
+        if self.state == "asking_prompt":
+            self.revision = RevisionContext(user_text)
+            self.data["prompt"] = self.revision.request_text()
+            self.state = "analyzing"
+            return Step([("bot", "Analyzing your request...")], action="analyze")
+        if self.state == "asking_followup":
+            # The user has provided the answer to the AI's follow-up question.
+            # We'll add it to the original request.
+            self.revision.add_detail(user_text)
+            self.data["prompt"] = self.revision.request_text()
+            self.state = "generating"
+            return Step([("bot", "Thank you. I'm writing the draft now...")], action="generate")
+        # Analyzing, generating, reviewing or sending: nothing to type right now.
+        return Step([("bot", "One moment please, I'm still working on the previous step.")])
+
+    def on_analysis(self, follow_up_question: str | None) -> Step:
+        """Feeds back the result of the "analyze" action."""
+        self._touch()
+        if follow_up_question:
+            self.state = "asking_followup"
+            return Step([("bot", f"One quick question: {follow_up_question}")], accepts_input=True)
+        self.state = "generating"
+        return Step([("bot", "Understood. I'm writing the draft now...")], action="generate")
+
+    def offer_suggestion(self, suggestion: dict) -> Step:
+        """Offers a similar, previously approved draft ({"subject", "body"}) while the new one is being generated."""
+        self._touch()
+        if self.state != "generating":
+            return Step()
+        self.suggestion = {"subject": suggestion["subject"], "body": suggestion["body"]}
+        return Step([("bot", "While I write yours, here is a similar email you approved before. "
+                             "Click \"Use Suggested Draft\" to start from it instead.")])
+
+    def use_suggestion(self) -> Step:
+        """The user picked the suggested draft; the draft being generated is no longer needed."""
+        self._touch()
+        if self.state != "generating" or not self.suggestion:
+            return Step()
+        self._use_draft(self.suggestion)
+        return Step([("bot", "Here is the suggested draft for your review:")], action="review")
+
+    def on_draft(self, draft: dict | None) -> Step:
+        """Feeds back the result of the "generate" action."""
+        self._touch()
+        if self.state != "generating":
+            # The user already went ahead with a suggested draft.
+            return Step()
+        self.suggestion = None
+        if draft:
+            self._use_draft(draft)
+            return Step([("bot", "Here is the draft I've prepared for your review:")], action="review")
+        self.draft = None
+        self.state = "asking_prompt"
+        return Step([("bot", "I'm sorry, I couldn't generate an email. Please check the terminal for error details."),
+                     ("bot", "Let's try again. What should the email be about?")], accepts_input=True)
+
+    def reject(self, feedback: str | None) -> Step:
+        """The user clicked "No, I need changes". Without feedback, the same draft stays up for review."""
+        self._touch()
+        if self.state != "awaiting_decision":
+            return Step()
+        if not feedback:
+            return Step(action="review")
+        # The feedback joins the revision context, and the model is asked to edit the current draft.
+        self.revision.add_feedback(feedback)
+        self.state = "revising"
+        return Step([("user", f"(Feedback provided: {feedback})"), ("bot", "Thank you. I'm writing a new version now...")],
+                    action="revise")
+
+    def on_revision(self, draft: dict | None) -> Step:
+        """Feeds back the result of the "revise" action. If it failed, the previous draft stays up for review."""
+        self._touch()
+        if draft:
+            self._use_draft(draft)
+            return Step([("bot", "Here is the revised draft for your review:")], action="review")
+        self.state = "awaiting_decision"
+        return Step([("bot", "I'm sorry, I couldn't revise the draft. Here is the previous version; you can ask for changes again.")],
+                    action="review")
+
+    def approve(self) -> Step:
+        """The user clicked "Yes, Send It"."""
+        self._touch()
+        if self.state != "awaiting_decision":
+            return Step()
+        self.state = "sending"
+        return Step(action="send")
+
+    def cancel_send(self) -> Step:
+        """The user backed out of sending (e.g. closed the credentials dialog): back to reviewing the draft."""
+        self._touch()
+        if self.state == "sending":
+            self.state = "awaiting_decision"
+        return Step(action="review")
+
+    def on_sent(self, message: str) -> Step:
+        """Feeds back that the "send" action has been handed off; the conversation starts over."""
+        self._touch()
+        self.state = "asking_recipient"
+        self.data = {}
+        self.draft = None
+        self.draft_id = None
+        self.revision = None
+        self.suggestion = None
+        return Step([("bot", message), ("bot", "I'm ready to help with another email. Who is the next recipient?")],
+                    accepts_input=True)
+
+    def to_dict(self) -> dict:
+        return {"session_id": self.session_id, "state": self.state, "data": dict(self.data), "draft": self.draft,
+                "suggestion": self.suggestion, "revision": self.revision.to_dict() if self.revision else None}
+
+    def _use_draft(self, draft: dict):
+        self.suggestion = None
+        self.draft = draft
+        self.revision.set_draft(draft)
+        self.draft_id = uuid.uuid4().hex
+        self.state = "awaiting_decision"
+
+    def _touch(self):
+        self.last_active = time.monotonic()
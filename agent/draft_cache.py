@@ -0,0 +1,151 @@
+# agent/draft_cache.py
+# A two-tier cache for LLM results, so the same request never pays for a second Gemini call.
+# Tier 1 is an in-process LRU (an OrderedDict) that answers in microseconds.
+# Tier 2 is a small SQLite file on disk, so cached drafts survive an app restart.
+# Entries expire after a time-to-live and both tiers are trimmed to a maximum size.
+
+# Core Libraries
+# sqlite3: The standard library's embedded database, used for the persistent tier.
+# hashlib / json: Used to turn the key parts (prompt, model, template version...) into one stable key.
+
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+from agent.settings import getenv
+
+DEFAULT_CACHE_PATH = getenv("DRAFT_CACHE_PATH", os.path.join(".cache", "drafts.sqlite3"))
+DEFAULT_MEMORY_ENTRIES = int(getenv("DRAFT_CACHE_MEMORY_ENTRIES", "512"))
+DEFAULT_DISK_ENTRIES = int(getenv("DRAFT_CACHE_DISK_ENTRIES", "20000"))
+DEFAULT_TTL = float(getenv("DRAFT_CACHE_TTL", str(7 * 24 * 3600)))  # One week.
+CACHE_DISABLED = getenv("DRAFT_CACHE_DISABLED", "").lower() in ("1", "true", "yes")
+
+# Returned by get() when nothing is cached. We can't use None for that, because
+# "no follow-up needed" is itself cached as None.
+MISS = object()
+
+def make_key(kind: str, *parts) -> str:
+    """Builds a stable cache key from the kind of call and everything that affects its output."""
+    raw = json.dumps([kind, *parts], ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class DraftCache:
+    """
+    A thread-safe LRU + SQLite cache for JSON-serialisable values.
+
+    Args:
+        path (str | None): Where the SQLite file lives, or None for a memory-only cache.
+        memory_entries (int): Maximum number of entries kept in the in-process LRU.
+        disk_entries (int): Maximum number of rows kept in SQLite (least recently used are dropped).
+        ttl (float): Seconds an entry stays valid.
+    """
+
+    def __init__(self, path: str | None = DEFAULT_CACHE_PATH, memory_entries: int = DEFAULT_MEMORY_ENTRIES,
+                 disk_entries: int = DEFAULT_DISK_ENTRIES, ttl: float = DEFAULT_TTL):
+        self.memory_entries = memory_entries
+        self.disk_entries = disk_entries
+        self.ttl = ttl
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self.stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0, "writes": 0}
+
+        self._db = None
+        if path:
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            # The UI calls us from several background threads, so the connection is shared behind our lock.
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS cache ("
+                " key TEXT PRIMARY KEY, kind TEXT, value TEXT, created_at REAL, last_access REAL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS cache_last_access ON cache (last_access)")
+            self._db.commit()
+
+    def get(self, key: str):
+        """Returns the cached value for key, or MISS."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                value, created_at = entry
+                if now - created_at <= self.ttl:
+                    self._memory.move_to_end(key)
+                    self.stats["memory_hits"] += 1
+                    return value
+                del self._memory[key]
+
+            if self._db is not None:
+                row = self._db.execute("SELECT value, created_at FROM cache WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    if now - row[1] <= self.ttl:
+                        self._db.execute("UPDATE cache SET last_access = ? WHERE key = ?", (now, key))
+                        self._db.commit()
+                        value = json.loads(row[0])
+                        self._remember(key, value, row[1])
+                        self.stats["disk_hits"] += 1
+                        return value
+                    self._db.execute("DELETE FROM cache WHERE key = ?", (key,))
+                    self._db.commit()
+
+            self.stats["misses"] += 1
+            return MISS
+
+    def put(self, key: str, value, kind: str = ""):
+        """Stores value (anything json.dumps can handle, including None) under key in both tiers."""
+        now = time.time()
+        with self._lock:
+            self._remember(key, value, now)
+            self.stats["writes"] += 1
+            if self._db is not None:
+                self._db.execute(
+                    "INSERT OR REPLACE INTO cache (key, kind, value, created_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, kind, json.dumps(value, ensure_ascii=False), now, now),
+                )
+                self._trim_disk(now)
+                self._db.commit()
+
+    def clear(self):
+        """Empties both tiers (the hit/miss counters are kept)."""
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM cache")
+                self._db.commit()
+
+    def hit_rate(self) -> float:
+        hits = self.stats["memory_hits"] + self.stats["disk_hits"]
+        total = hits + self.stats["misses"]
+        return hits / total if total else 0.0
+
+    def _remember(self, key, value, created_at):
+        self._memory[key] = (value, created_at)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_entries:
+            self._memory.popitem(last=False)
+
+    def _trim_disk(self, now):
+        self._db.execute("DELETE FROM cache WHERE created_at < ?", (now - self.ttl,))
+        count = self._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+        if count > self.disk_entries:
+            self._db.execute(
+                "DELETE FROM cache WHERE key IN (SELECT key FROM cache ORDER BY last_access LIMIT ?)",
+                (count - self.disk_entries,),
+            )
+
+_cache = None
+_cache_lock = threading.Lock()
+
+def get_draft_cache() -> DraftCache:
+    """Returns the process-wide cache. With DRAFT_CACHE_DISABLED=1 it is memory-only and holds nothing."""
+    global _cache
+    with _cache_lock:
+        if _cache is None:
+            if CACHE_DISABLED:
+                _cache = DraftCache(path=None, memory_entries=0)
+            else:
+                _cache = DraftCache()
+        return _cache
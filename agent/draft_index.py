@@ -0,0 +1,370 @@
+# agent/draft_index.py
+# A similarity index of every draft the user approved, so a new request can start from the ones that came before.
+# People send many near-identical emails (leave requests, thank-you notes, follow-ups), but generation used to
+# start from nothing every time. Each approved draft ("Yes, Send It") is now added to this index, and a new
+# request is matched against them:
+# - the closest match is shown at once as a suggested draft while the fresh one is being written, and
+# - the top matches are given to the model as examples of the user's own style (few-shot).
+#
+# How it works: each draft's request + subject is turned into a hashed TF-IDF vector (words and word pairs,
+# hashed into 2^DRAFT_INDEX_BITS buckets, so there is no vocabulary to maintain). The vectors are kept as an
+# inverted index in NumPy arrays sorted by bucket, so a lookup only touches the drafts that share a term with
+# the request and stays in the low milliseconds at 100k drafts. New drafts go into a small unsorted tail that
+# is merged into the sorted arrays every DRAFT_INDEX_MERGE_EVERY drafts. Every new draft changes the IDF of
+# every term, so the drafts' vector lengths are recomputed on the first search after an add; scores are true
+# cosines (never above 1).
+#
+# On disk (DRAFT_INDEX_DIR, default .cache/draft_index/):
+#   drafts.jsonl - every approved draft, appended as it is approved (the source of truth), and
+#   index.npz    - a snapshot of the arrays, rewritten after each merge. Drafts approved after the last
+#                  snapshot are re-indexed from drafts.jsonl at start-up.
+#
+# NumPy is only imported when the index is first used. Without it (or with DRAFT_INDEX=0) everything works
+# as before, just without suggestions.
+#
+#     python -m benchmarks.draft_index_benchmark --drafts 100000    # lookup latency at scale
+
+import atexit
+import json
+import os
+import re
+import threading
+import time
+import zlib
+from array import array
+
+from agent.settings import getenv
+
+DRAFT_INDEX_ENABLED = getenv("DRAFT_INDEX", "1").lower() not in ("0", "false", "no")
+DRAFT_INDEX_DIR = getenv("DRAFT_INDEX_DIR", os.path.join(".cache", "draft_index"))
+# Terms are hashed into 2^bits buckets (2^20 keeps collisions rare and costs 4 MB of document frequencies).
+DRAFT_INDEX_BITS = int(getenv("DRAFT_INDEX_BITS", "20"))
+DRAFT_INDEX_MERGE_EVERY = int(getenv("DRAFT_INDEX_MERGE_EVERY", "1024"))
+# A past draft is offered as a suggestion only if it is at least this similar (cosine, 0-1)...
+DRAFT_SUGGESTION_MIN_SIMILARITY = float(getenv("DRAFT_SUGGESTION_MIN_SIMILARITY", "0.5"))
+# ...and up to DRAFT_FEW_SHOT drafts at least this similar are shown to the model as examples.
+DRAFT_FEW_SHOT = int(getenv("DRAFT_FEW_SHOT", "2"))
+DRAFT_FEW_SHOT_MIN_SIMILARITY = float(getenv("DRAFT_FEW_SHOT_MIN_SIMILARITY", "0.3"))
+# Terms found in more than this share of all drafts ("email", "request"...) are skipped at lookup time:
+# they say little about which draft matches, but their lists of drafts are the longest to go through.
+_MAX_DOCUMENT_FREQUENCY = 0.2
+
+_WORD = re.compile(r"[a-z0-9']+")
+_STOPWORDS = {"a", "an", "the", "to", "for", "of", "and", "or", "in", "on", "at", "my", "me", "i", "is", "it", "be",
+              "with", "about", "this", "that", "from", "as", "by", "please", "write", "email", "mail"}
+
+# NumPy, imported on first use (see _load_numpy) so the app window doesn't wait for it.
+np = None
+
+def _load_numpy():
+    global np
+    if np is None:
+        import numpy
+        np = numpy
+    return np
+
+def _user_key(user_name: str | None) -> int:
+    return zlib.crc32((user_name or "").strip().lower().encode("utf-8"))
+
+class DraftIndex:
+    """
+    An append-only, persisted hashed TF-IDF index of approved drafts.
+
+    Args:
+        folder (str): Where drafts.jsonl and index.npz live.
+        bits (int): Terms are hashed into 2^bits buckets.
+        merge_every (int): How many new drafts collect in the unsorted tail before it is merged and snapshotted.
+    """
+
+    def __init__(self, folder: str = DRAFT_INDEX_DIR, bits: int = DRAFT_INDEX_BITS, merge_every: int = DRAFT_INDEX_MERGE_EVERY):
+        _load_numpy()
+        self.folder = folder
+        self.records_path = os.path.join(folder, "drafts.jsonl")
+        self.snapshot_path = os.path.join(folder, "index.npz")
+        self.bits = bits
+        self.merge_every = max(1, merge_every)
+        self._lock = threading.Lock()
+        self.stats = {"drafts": 0, "searches": 0, "merges": 0, "search_seconds": 0.0}
+        self._reset()
+        self._load()
+
+    def __len__(self) -> int:
+        return len(self._offsets)
+
+    # Public API
+
+    def add(self, prompt: str, draft: dict, user_name: str = ""):
+        """Adds one approved draft (appended to drafts.jsonl straight away, so it survives a crash)."""
+        record = {"time": round(time.time(), 3), "user": user_name, "prompt": prompt,
+                  "subject": draft["subject"], "body": draft["body"]}
+        line = (json.dumps(record, ensure_ascii=False) + "\n").encode("utf-8")
+        with self._lock:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(self.records_path, "ab") as f:
+                offset = f.seek(0, os.SEEK_END)
+                f.write(line)
+            self._records_size = offset + len(line)
+            self._index(offset, record)
+            if len(self._offsets) - self._merged_docs >= self.merge_every:
+                self._merge()
+                self._save()
+
+    def search(self, prompt: str, k: int = 3, user_name: str | None = None, min_score: float = 0.0) -> list[dict]:
+        """
+        The k approved drafts most similar to a request.
+
+        Args:
+            prompt (str): The new request.
+            k (int): How many matches to return at most.
+            user_name (str | None): Only drafts signed with this name (None searches everyone's).
+            min_score (float): Matches less similar than this (cosine, 0-1) are left out.
+
+        Returns:
+            list[dict]: {"score", "prompt", "subject", "body", "user", "time"} per match, best first.
+        """
+        started = time.perf_counter()
+        query_buckets, query_counts = self._featurize(prompt)
+        with self._lock:
+            hits = self._search(query_buckets, query_counts, k, user_name, min_score)
+            self.stats["searches"] += 1
+        matches = [{"score": round(score, 4), **self._read(offset)} for score, offset in hits]
+        with self._lock:
+            self.stats["search_seconds"] += time.perf_counter() - started
+        return matches
+
+    def save(self):
+        """Merges the tail and writes a fresh snapshot (also done on exit)."""
+        with self._lock:
+            if len(self._offsets) != self._saved_docs:
+                self._merge()
+                self._save()
+
+    # Internals (called with the lock held)
+
+    def _reset(self):
+        # The sorted, merged part of the inverted index: one entry per (term bucket, draft).
+        self._buckets = np.zeros(0, dtype=np.int32)
+        self._docs = np.zeros(0, dtype=np.int32)
+        self._tf = np.zeros(0, dtype=np.float32)
+        # Entries for drafts added since the last merge, in the order they came in.
+        self._tail_buckets, self._tail_docs, self._tail_tf = array("i"), array("i"), array("f")
+        # Per draft: where its record starts in drafts.jsonl and whose it is.
+        self._offsets, self._users = array("q"), array("I")
+        # Per draft: the length of its vector under the IDF of the first _norms_docs drafts (see _refresh_norms).
+        self._norms = np.zeros(0)
+        self._norms_docs = 0
+        # How many drafts contain each term bucket.
+        self._df = np.zeros(1 << self.bits, dtype=np.int32)
+        self._merged_docs = 0
+        self._saved_docs = 0
+        self._records_size = 0
+
+    def _featurize(self, text: str):
+        """The request's term buckets (sorted, unique) and their sublinear term frequencies (1 + log count)."""
+        words = [word for word in _WORD.findall(text.lower()) if word not in _STOPWORDS]
+        terms = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+        mask = (1 << self.bits) - 1
+        hashed = np.fromiter((zlib.crc32(term.encode("utf-8")) & mask for term in terms), dtype=np.int32, count=len(terms))
+        buckets, counts = np.unique(hashed, return_counts=True)
+        return buckets, (1.0 + np.log(counts)).astype(np.float32)
+
+    def _idf(self, df, n: int):
+        return np.log((n + 1) / (df + 1)) + 1.0
+
+    def _index(self, offset: int, record: dict):
+        buckets, tf = self._featurize(f"{record['prompt']} {record['subject']}")
+        doc = len(self._offsets)
+        self._df[buckets] += 1
+        self._tail_buckets.extend(buckets.tolist())
+        self._tail_docs.extend([doc] * len(buckets))
+        self._tail_tf.extend(tf.tolist())
+        self._offsets.append(offset)
+        self._users.append(_user_key(record.get("user")))
+        self.stats["drafts"] = doc + 1
+
+    def _refresh_norms(self):
+        """
+        Recomputes every draft's vector length with the current IDF, if drafts were added since the last time.
+        A length computed with an older IDF no longer matches the weights a search uses, and would let scores
+        go over 1. This is one pass over the index, paid by the first search after an approval.
+        """
+        n = len(self._offsets)
+        if self._norms_docs == n:
+            return
+        squares = np.zeros(n)
+        if len(self._docs):
+            squares += np.bincount(self._docs, weights=(self._tf * self._idf(self._df[self._buckets], n)) ** 2, minlength=n)
+        if len(self._tail_docs):
+            tail_buckets = np.array(self._tail_buckets, dtype=np.int32)
+            tail_weights = np.array(self._tail_tf, dtype=np.float32) * self._idf(self._df[tail_buckets], n)
+            squares += np.bincount(np.array(self._tail_docs, dtype=np.int32), weights=tail_weights ** 2, minlength=n)
+        self._norms = np.sqrt(squares)
+        self._norms_docs = n
+
+    def _search(self, query_buckets, query_counts, k: int, user_name: str | None, min_score: float) -> list[tuple[float, int]]:
+        n = len(self._offsets)
+        if not n or not len(query_buckets):
+            return []
+        df = self._df[query_buckets]
+        known = df > 0
+        if not known.any():
+            return []
+        # The query's length counts all of its terms, including the ones no draft has (they get the IDF of a
+        # term seen nowhere): leaving them out would make a request that shares a few words look like a match.
+        idf = self._idf(df, n)
+        query = query_counts * idf
+        query /= np.linalg.norm(query)
+        query_buckets, query, idf, df = query_buckets[known], query[known], idf[known], df[known]
+        # A draft's score is sum(query weight * draft tf * idf) over shared terms, divided by the draft's vector length.
+        weights = query * idf
+        common = df > max(_MAX_DOCUMENT_FREQUENCY * n, 50)
+        if common.any() and not common.all():
+            query_buckets, weights = query_buckets[~common], weights[~common]
+
+        docs_parts, score_parts = [], []
+        # The merged part: each term's drafts are one contiguous slice of the sorted arrays.
+        starts = np.searchsorted(self._buckets, query_buckets, "left")
+        lengths = np.searchsorted(self._buckets, query_buckets, "right") - starts
+        total = int(lengths.sum())
+        if total:
+            positions = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths) + np.arange(total)
+            docs_parts.append(self._docs[positions])
+            score_parts.append(self._tf[positions] * np.repeat(weights, lengths))
+        # The tail is small, so it is simply scanned.
+        if len(self._tail_docs):
+            tail_buckets = np.array(self._tail_buckets, dtype=np.int32)
+            matching = np.isin(tail_buckets, query_buckets)
+            if matching.any():
+                docs_parts.append(np.array(self._tail_docs, dtype=np.int32)[matching])
+                term = np.searchsorted(query_buckets, tail_buckets[matching])
+                score_parts.append(np.array(self._tail_tf, dtype=np.float32)[matching] * weights[term])
+        if not docs_parts:
+            return []
+
+        self._refresh_norms()
+        scores = np.bincount(np.concatenate(docs_parts), weights=np.concatenate(score_parts), minlength=n)
+        scores /= np.maximum(self._norms, 1e-9)
+        if user_name is not None:
+            scores[np.array(self._users, dtype=np.uint32) != _user_key(user_name)] = 0.0
+        k = min(k, n)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(float(scores[doc]), int(self._offsets[doc])) for doc in top if scores[doc] > 0 and scores[doc] >= min_score]
+
+    def _merge(self):
+        if len(self._tail_docs):
+            buckets = np.concatenate([self._buckets, np.array(self._tail_buckets, dtype=np.int32)])
+            docs = np.concatenate([self._docs, np.array(self._tail_docs, dtype=np.int32)])
+            tf = np.concatenate([self._tf, np.array(self._tail_tf, dtype=np.float32)])
+            order = np.argsort(buckets, kind="stable")
+            self._buckets, self._docs, self._tf = buckets[order], docs[order], tf[order]
+            self._tail_buckets, self._tail_docs, self._tail_tf = array("i"), array("i"), array("f")
+        self._merged_docs = len(self._offsets)
+        self.stats["merges"] += 1
+
+    def _save(self):
+        temporary = self.snapshot_path + ".tmp"
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            with open(temporary, "wb") as f:
+                np.savez(f, bits=self.bits, records_size=self._records_size, buckets=self._buckets, docs=self._docs,
+                         tf=self._tf, df=self._df, offsets=np.array(self._offsets, dtype=np.int64),
+                         users=np.array(self._users, dtype=np.uint32))
+            # Replaced in one step, so a crash mid-write leaves the previous snapshot intact.
+            os.replace(temporary, self.snapshot_path)
+            self._saved_docs = len(self._offsets)
+        except OSError as e:
+            print(f"Could not save the draft index snapshot: {e}")
+
+    def _load(self):
+        size = os.path.getsize(self.records_path) if os.path.exists(self.records_path) else 0
+        start = 0
+        if os.path.exists(self.snapshot_path):
+            try:
+                with np.load(self.snapshot_path) as data:
+                    # A snapshot is only usable if it was built with the same hashing and covers part of this file.
+                    if int(data["bits"]) == self.bits and int(data["records_size"]) <= size:
+                        self._buckets, self._docs, self._tf, self._df = data["buckets"], data["docs"], data["tf"], data["df"].copy()
+                        self._offsets.frombytes(data["offsets"].astype(np.int64).tobytes())
+                        self._users.frombytes(data["users"].astype(np.uint32).tobytes())
+                        start = int(data["records_size"])
+            except (OSError, ValueError, KeyError) as e:
+                print(f"The draft index snapshot could not be read ({e}); rebuilding it from {self.records_path}.")
+                self._reset()
+                start = 0
+        self._merged_docs = self._saved_docs = len(self._offsets)
+        self._records_size = start
+        if size > start:
+            # Drafts approved after the last snapshot.
+            with open(self.records_path, "rb") as f:
+                f.seek(start)
+                offset = start
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                        self._index(offset, record)
+                    except (ValueError, KeyError, TypeError):
+                        pass  # A line cut short by a crash; the drafts after it are still fine.
+                    offset += len(line)
+                if not line.endswith(b"\n"):
+                    # Start the next draft on a line of its own.
+                    with open(self.records_path, "ab") as out:
+                        out.write(b"\n")
+                    offset += 1
+            self._records_size = offset
+            if len(self._offsets) - self._merged_docs >= self.merge_every:
+                self._merge()
+                self._save()
+        self.stats["drafts"] = len(self._offsets)
+
+    def _read(self, offset: int) -> dict:
+        with open(self.records_path, "rb") as f:
+            f.seek(offset)
+            return json.loads(f.readline())
+
+_index = None
+_index_unavailable = False
+_index_lock = threading.Lock()
+
+def get_draft_index() -> DraftIndex | None:
+    """Returns the process-wide index (loading it on first use), or None if it is switched off or NumPy is missing."""
+    global _index, _index_unavailable
+    with _index_lock:
+        if _index is None and not _index_unavailable:
+            if not DRAFT_INDEX_ENABLED:
+                _index_unavailable = True
+            else:
+                try:
+                    _index = DraftIndex()
+                    atexit.register(_index.save)
+                except ImportError:
+                    print("NumPy is not installed, so approved drafts are not indexed for suggestions (pip install numpy).")
+                    _index_unavailable = True
+        return _index
+
+def remember_approved(prompt: str, draft: dict, user_name: str = ""):
+    """Adds an approved draft to the index (does nothing if the index is unavailable). Never raises."""
+    index = get_draft_index()
+    if index is None:
+        return
+    try:
+        index.add(prompt, draft, user_name)
+    except Exception as e:
+        print(f"Could not add the approved draft to the index: {e}")
+
+def similar_drafts(prompt: str, user_name: str | None = None, k: int = DRAFT_FEW_SHOT,
+                   min_score: float = DRAFT_FEW_SHOT_MIN_SIMILARITY) -> list[dict]:
+    """The user's approved drafts most similar to a request ([] if none, or if the index is unavailable)."""
+    index = get_draft_index()
+    if index is None or k <= 0:
+        return []
+    try:
+        return index.search(prompt, k=k, user_name=user_name, min_score=min_score)
+    except Exception as e:
+        print(f"Draft index lookup failed: {e}")
+        return []
+
+def suggest_draft(prompt: str, user_name: str | None = None) -> dict | None:
+    """The closest approved draft, if it is similar enough to show as a suggestion."""
+    matches = similar_drafts(prompt, user_name, k=1, min_score=DRAFT_SUGGESTION_MIN_SIMILARITY)
+    return matches[0] if matches else None
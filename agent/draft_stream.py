@@ -0,0 +1,187 @@
+# agent/draft_stream.py
+# Helpers for streaming a draft into the UI while the model is still writing it.
+# 1. StreamingDraftParser: reads the {"subject": ..., "body": ...} JSON one chunk at a time and
+#    emits the decoded text of each field as soon as it arrives (escapes split across chunks included).
+# 2. DraftStream: a thread-safe buffer between the generating thread and the UI thread. The model
+#    thread pushes deltas in, and the UI drains them in batches from an after() timer, so the
+#    widgets are redrawn a few times per second instead of once per token.
+
+import threading
+
+_ESCAPES = {'"': '"', '\\': '\\', '/': '/', 'b': '\b', 'f': '\f', 'n': '\n', 'r': '\r', 't': '\t'}
+
+class StreamingDraftParser:
+    """
+    An incremental parser for the top-level string fields of the draft's JSON object.
+    Anything before the first '{' (like a ```json fence) is ignored, and non-string values are skipped.
+
+    Call feed(chunk) with each piece of model output; it returns a list of (field, text) deltas.
+    """
+
+    def __init__(self, fields=("subject", "body")):
+        self.fields = set(fields)
+        self._buffer = ""
+        self._pos = 0
+        self._state = "seek_object"
+        self._key = []
+        self._current_key = None
+        self._pending_surrogate = None
+        self._depth = 0
+        self._in_skipped_string = False
+
+    def feed(self, chunk: str) -> list[tuple[str, str]]:
+        self._buffer += chunk
+        deltas = []
+        text = []
+        buf = self._buffer
+        while self._pos < len(buf):
+            ch = buf[self._pos]
+            state = self._state
+
+            if state == "seek_object":
+                if ch == "{":
+                    self._state = "seek_key"
+            elif state == "seek_key":
+                if ch == '"':
+                    self._key = []
+                    self._state = "in_key"
+                elif ch == "}":
+                    self._state = "done"
+            elif state == "in_key":
+                if ch == "\\":
+                    # Keys never contain escapes in practice; keep the next character literally.
+                    if self._pos + 1 >= len(buf):
+                        break
+                    self._pos += 1
+                    self._key.append(buf[self._pos])
+                elif ch == '"':
+                    self._current_key = "".join(self._key)
+                    self._state = "seek_colon"
+                else:
+                    self._key.append(ch)
+            elif state == "seek_colon":
+                if ch == ":":
+                    self._state = "seek_value"
+            elif state == "seek_value":
+                if ch == '"':
+                    self._state = "in_value" if self._current_key in self.fields else "skip_value"
+                    self._in_skipped_string = self._state == "skip_value"
+                elif not ch.isspace():
+                    # A number, object, array... we don't display those, so we just skip past it.
+                    self._state = "skip_value"
+                    self._in_skipped_string = False
+                    self._depth = 0
+                    continue
+            elif state == "in_value":
+                if ch == "\\":
+                    decoded, consumed = self._decode_escape(buf, self._pos)
+                    if consumed == 0:
+                        break  # The escape sequence is split across chunks; wait for more text.
+                    if decoded:
+                        # Nothing yet for the first half of a surrogate pair: it is emitted with the second.
+                        text.append(decoded)
+                    self._pos += consumed
+                    continue
+                lone = self._take_pending_surrogate()
+                if lone:
+                    text.append(lone)
+                if ch == '"':
+                    self._flush(deltas, text)
+                    self._state = "after_value"
+                else:
+                    text.append(ch)
+            elif state == "skip_value":
+                if self._in_skipped_string:
+                    if ch == "\\":
+                        if self._pos + 1 >= len(buf):
+                            break
+                        self._pos += 1
+                    elif ch == '"':
+                        self._in_skipped_string = False
+                        if self._depth == 0:
+                            self._state = "after_value"
+                elif ch == '"':
+                    self._in_skipped_string = True
+                elif ch in "{[":
+                    self._depth += 1
+                elif ch in "}]":
+                    if self._depth == 0:
+                        self._state = "done"
+                    else:
+                        self._depth -= 1
+                        if self._depth == 0:
+                            self._state = "after_value"
+                elif ch == "," and self._depth == 0:
+                    self._state = "seek_key"
+            elif state == "after_value":
+                if ch == ",":
+                    self._state = "seek_key"
+                elif ch == "}":
+                    self._state = "done"
+            else:  # done
+                break
+            self._pos += 1
+
+        self._flush(deltas, text)
+        # Drop what we've consumed so the buffer doesn't grow with the whole response.
+        self._buffer = buf[self._pos:]
+        self._pos = 0
+        return deltas
+
+    def _flush(self, deltas, text):
+        if text:
+            deltas.append((self._current_key, "".join(text)))
+            text.clear()
+
+    def _decode_escape(self, buf, pos):
+        """Decodes the escape at buf[pos] ('\\'). Returns (text, characters consumed) or ('', 0) if incomplete."""
+        if pos + 1 >= len(buf):
+            return "", 0
+        kind = buf[pos + 1]
+        if kind != "u":
+            return self._take_pending_surrogate() + _ESCAPES.get(kind, kind), 2
+        if pos + 6 > len(buf):
+            return "", 0
+        try:
+            code = int(buf[pos + 2:pos + 6], 16)
+        except ValueError:
+            return "", 6
+        if 0xD800 <= code <= 0xDBFF:
+            # A high surrogate: remember it and wait for the low half that follows.
+            lone = self._take_pending_surrogate()
+            self._pending_surrogate = code
+            return lone, 6
+        if 0xDC00 <= code <= 0xDFFF:
+            if self._pending_surrogate is None:
+                return "\ufffd", 6
+            code = 0x10000 + ((self._pending_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self._pending_surrogate = None
+            return chr(code), 6
+        return self._take_pending_surrogate() + chr(code), 6
+
+    def _take_pending_surrogate(self) -> str:
+        """A replacement character for a high surrogate that was not followed by its low half, else ''."""
+        if self._pending_surrogate is None:
+            return ""
+        self._pending_surrogate = None
+        return "\ufffd"
+
+class DraftStream:
+    """A thread-safe mailbox of subject/body deltas between the model thread and the UI thread."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}
+        self.received_any = False
+
+    def push(self, field: str, delta: str):
+        """Called from the generating thread for every decoded delta."""
+        with self._lock:
+            self._pending[field] = self._pending.get(field, "") + delta
+            self.received_any = True
+
+    def drain(self) -> dict:
+        """Called from the UI thread; returns all text received since the last drain, per field."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
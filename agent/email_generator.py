@@ -2,31 +2,53 @@
 # This file serves as the "creative brain" of the AI assistant. It now has two functions:
 # 1. analyze_prompt_for_followup: To intelligently decide if a critical detail is missing.
 # 2. generate_email_content: To write the complete, professional email draft.
+# Both also have async versions (aanalyze_prompt_for_followup / agenerate_email_content), and
+# agenerate_many() runs a whole batch of drafts concurrently with bounded parallelism and rate limits.
+# The sync functions are thin wrappers: they share the prompt building and response parsing below.
+# Successful results are cached (agent/draft_cache.py), so a repeated request comes back in milliseconds.
+# stream_email_content() is the streaming variant: it reports subject/body text as the model writes it.
+# revise_email_content() / arevise_email_content() apply the user's feedback to the current draft
+# ("edit this draft") from a compact RevisionContext (agent/revision.py) instead of starting over.
+# The Gemini SDK itself is only imported when the first request is made (see agent/llm_client.py).
+# Every call is recorded as a tracing span (llm.analyze / llm.generate / llm.revise, see agent/tracing.py).
+# Before the follow-up analysis goes to the model, a local classifier (agent/followup_classifier.py) answers
+# the obvious cases in microseconds; every decision the model does make is logged so the classifier learns from it.
+# New drafts are written with the user's most similar approved drafts as examples (agent/draft_index.py).
+# Drafts are requested in JSON mode and almost-valid answers are repaired locally (agent/structured_output.py).
+# Every model call has a deadline, and a slow or unusable answer is raced by a second request (agent/hedging.py).
 
-import os
-import google.generativeai as genai
-import json
-import re
-from dotenv import load_dotenv
+import asyncio
 
-load_dotenv()
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+from agent.settings import getenv
+from agent.llm_client import MODEL_NAME, get_model
+from agent.rate_limiter import AsyncRateLimiter, estimate_tokens
+from agent.draft_cache import get_draft_cache, make_key, MISS
+from agent.draft_stream import StreamingDraftParser
+from agent.revision import RevisionContext, RevisionTimer
+from agent.tracing import traced, annotate, mark_failed
+from agent.followup_classifier import FOLLOWUP_FAST_PATH, FollowupDecision, get_followup_classifier
+from agent.draft_index import similar_drafts
+from agent.structured_output import draft_generation_config, parse_draft, structured_output_rejected
+from agent.hedging import AttemptAbandoned, HedgedCall
 
-def analyze_prompt_for_followup(prompt: str) -> str | None:
-    """
-    Analyzes the user's prompt with expert human-like judgment to see if a
-    critical detail is missing, returning a follow-up question or None.
+# Bump this whenever the prompt templates below change, so old cached drafts are not served for the new prompts.
+PROMPT_TEMPLATE_VERSION = 2
 
-    Args:
-        prompt (str): The user's raw request for the email.
-
-    Returns:
-        str | None: A single, non-irritating follow-up question if needed, otherwise None.
-    """
-    model = genai.GenerativeModel('gemini-1.5-flash-latest')
+# Batch defaults for agenerate_many. They can be overridden per call or through the .env file.
+# A rate limit of 0 means "no limit".
+DEFAULT_CONCURRENCY = int(getenv("GEMINI_MAX_CONCURRENCY", "8"))
+DEFAULT_REQUESTS_PER_MINUTE = float(getenv("GEMINI_REQUESTS_PER_MINUTE", "0"))
+DEFAULT_TOKENS_PER_MINUTE = float(getenv("GEMINI_TOKENS_PER_MINUTE", "0"))
+# Per-call deadlines in seconds, including any hedged second request. A follow-up check that takes this
+# long isn't worth waiting for: the draft is written without it.
+DEFAULT_REQUEST_TIMEOUT = float(getenv("GEMINI_REQUEST_TIMEOUT", "60"))
+DEFAULT_ANALYSIS_TIMEOUT = float(getenv("GEMINI_ANALYSIS_TIMEOUT", "20"))
+# Few-shot examples are cut to this many characters each, so they don't crowd out the request.
+_EXAMPLE_BODY_CHARS = 1200
 
+def _build_analysis_prompt(prompt: str) -> str:
     # This prompt trains the AI to act as a minimalist assistant.
-    analysis_prompt = f"""
+    return f"""
     You are an AI assistant's brain. Your job is to analyze a user's request for an email and decide if a single, absolutely critical piece of information is missing.
 
     **Your Core Principles:**
@@ -48,66 +70,440 @@ def analyze_prompt_for_followup(prompt: str) -> str | None:
     - User Request: "thank you note to the hiring team" -> Your Response: NO_FOLLOWUP_NEEDED
     - User Request: "Write something for some student let's say" -> Your Response: Name and Student_ID of the student?
     """
+
+def _parse_followup(response_text: str) -> str | None:
+    result_text = response_text.strip()
+
+    if result_text == "NO_FOLLOWUP_NEEDED":
+        print("Analysis complete. No follow-up needed.")
+        return None
+    else:
+        print(f"Analysis complete. Follow-up needed: {result_text}")
+        return result_text  # This is the follow-up question
+
+def _build_examples(examples: list[dict]) -> str:
+    if not examples:
+        return ""
+    lines = ["**Emails this user approved for similar requests.** Match their tone, length and sign-off, but write a new "
+             "email for the new request and don't copy details that don't apply to it:"]
+    for i, example in enumerate(examples, 1):
+        body = example["body"] if len(example["body"]) <= _EXAMPLE_BODY_CHARS else example["body"][:_EXAMPLE_BODY_CHARS].rstrip() + "..."
+        lines.append(f'Example {i}. Request: "{example["prompt"]}"\nSubject: {example["subject"]}\nBody:\n"""\n{body}\n"""')
+    return "\n\n".join(lines)
+
+def _build_generation_prompt(user_name: str, prompt: str, examples: list[dict] | None = None) -> str:
+    return f"""
+    You are an expert AI assistant. Your function is to write a perfect, 100% ready-to-send email based on a user's request.
+
+    **YOUR #1 UNBREAKABLE RULE: YOU ARE FORBIDDEN FROM USING BRACKETS `[]` OR PARENTHESES `()` TO SUGGEST USER INPUT.**
+    Your output must be a final product. If a minor detail is missing, you MUST invent a plausible, professional-sounding detail.
+
+    **CRITICAL RULE ON PERSONAL DETAILS:** You are STRICTLY FORBIDDEN from inventing personal names or contact information. Instead, you must use a general phrases like "my team is briefed" or "I am available to connect or just anything that fits the best according to the input."
+
+    **YOUR TASK:**
+    - User's Name (for signature): "{user_name}"
+    - User's Request (now including any necessary details): "{prompt}"
+    - Now, write the complete email. The output format MUST be ONLY a valid JSON string:
+    {{"subject": "A creative and professional subject line", "body": "The full, well-written email body."}}
+
+    {_build_examples(examples or [])}
+    """
+
+def _build_revision_prompt(user_name: str, context: RevisionContext) -> str:
+    return f"""
+    You are an expert AI assistant editing an email draft you wrote earlier. Apply the newest requested change to the current draft.
+
+    **RULES:**
+    - Edit the current draft; keep everything the user did not ask to change.
+    - YOU ARE FORBIDDEN FROM USING BRACKETS `[]` OR PARENTHESES `()` TO SUGGEST USER INPUT, and from inventing personal names or contact information.
+    - Sign the email as "{user_name}".
+
+    {context.render()}
+
+    The output format MUST be ONLY a valid JSON string with the complete revised email:
+    {{"subject": "The revised subject line", "body": "The full revised email body."}}
+    """
+
+def _request_kwargs(attempt, draft: bool, stream: bool = False) -> dict:
+    kwargs = {"stream": True} if stream else {}
+    config = draft_generation_config() if draft else None
+    if config is not None:
+        kwargs["generation_config"] = config
+    remaining = attempt.remaining()
+    if remaining is not None:
+        # The request itself gives up when the whole call does, so a hung connection doesn't hold a thread.
+        kwargs["request_options"] = {"timeout": max(1.0, remaining)}
+    return kwargs
+
+def _ask(model, prompt: str, attempt, draft: bool = False, stream: bool = False):
+    """One request (drafts in JSON mode). If the API rejects JSON mode, asks again once without it."""
+    kwargs = _request_kwargs(attempt, draft, stream)
+    try:
+        return model.generate_content(prompt, **kwargs)
+    except Exception as e:
+        if "generation_config" not in kwargs or not structured_output_rejected(e):
+            raise
+        return model.generate_content(prompt, **_request_kwargs(attempt, draft, stream))
+
+async def _aask(model, prompt: str, attempt, draft: bool = False):
+    kwargs = _request_kwargs(attempt, draft)
+    try:
+        return await model.generate_content_async(prompt, **kwargs)
+    except Exception as e:
+        if "generation_config" not in kwargs or not structured_output_rejected(e):
+            raise
+        return await model.generate_content_async(prompt, **_request_kwargs(attempt, draft))
+
+def _stream_draft(model, prompt: str, on_delta, attempt) -> tuple:
+    """One streamed draft request; returns (response, draft). Only the attempt that claims the call talks to on_delta."""
+    parser = StreamingDraftParser()
+    chunks = []
+    response = _ask(model, prompt, attempt, draft=True, stream=True)
+    for chunk in response:
+        if attempt.abandoned or not attempt.claim():
+            raise AttemptAbandoned()
+        chunks.append(chunk.text)
+        for field, delta in parser.feed(chunk.text):
+            on_delta(field, delta)
+    return response, parse_draft("".join(chunks))
+
+def _analysis_key(prompt: str) -> str:
+    return make_key("analysis", prompt, MODEL_NAME, PROMPT_TEMPLATE_VERSION)
+
+def _generation_key(user_name: str, prompt: str) -> str:
+    return make_key("generation", user_name, prompt, MODEL_NAME, PROMPT_TEMPLATE_VERSION)
+
+def _local_followup(prompt: str, regenerate: bool) -> FollowupDecision | None:
+    """The local classifier's decision, or None when the fast path is off or the user asked for a fresh answer."""
+    if not FOLLOWUP_FAST_PATH or regenerate:
+        return None
+    decision = get_followup_classifier().classify(prompt)
+    annotate(followup_source=decision.source)
+    if decision.is_local:
+        annotate(followup=decision.needs_followup)
+        print(f"Analysis answered locally ({decision.source}: {decision.reason}).")
+    return decision
+
+@traced("llm.analyze", model=MODEL_NAME)
+def analyze_prompt_for_followup(prompt: str, regenerate: bool = False, timeout: float | None = DEFAULT_ANALYSIS_TIMEOUT) -> str | None:
+    """
+    Analyzes the user's prompt with expert human-like judgment to see if a
+    critical detail is missing, returning a follow-up question or None.
+
+    Args:
+        prompt (str): The user's raw request for the email.
+        regenerate (bool): Skip the cache lookup and always ask the model (the new answer is still cached).
+        timeout (float | None): Seconds to wait for the model before going ahead without a follow-up.
+
+    Returns:
+        str | None: A single, non-irritating follow-up question if needed, otherwise None.
+    """
+    cache = get_draft_cache()
+    key = _analysis_key(prompt)
+    if not regenerate:
+        cached = cache.get(key)
+        if cached is not MISS:
+            print("Analysis served from cache.")
+            annotate(cache_hit=True)
+            return cached
+
+    local = _local_followup(prompt, regenerate)
+    if local is not None and local.is_local:
+        return local.question
+
+    model = get_model()
+    analysis_prompt = _build_analysis_prompt(prompt)
+    annotate(cache_hit=False, prompt_tokens=estimate_tokens(analysis_prompt))
     try:
         print("Analyzing prompt for follow-up...")
-        response = model.generate_content(analysis_prompt)
-        result_text = response.text.strip()
-
-        if result_text == "NO_FOLLOWUP_NEEDED":
-            print("Analysis complete. No follow-up needed.")
-            return None
-        else:
-            print(f"Analysis complete. Follow-up needed: {result_text}")
-            return result_text  # This is the follow-up question
+        result = HedgedCall("analyze", timeout).run(lambda attempt: _parse_followup(_ask(model, analysis_prompt, attempt).text))
     except Exception as e:
         print(f"ERROR during follow-up analysis: {e}")
+        mark_failed(e)
         return None # If analysis fails, proceed without a follow-up
+    annotate(followup=result is not None)
+    get_followup_classifier().record(prompt, result, local)
+    cache.put(key, result, kind="analysis")
+    return result
 
-def generate_email_content(user_name: str, prompt: str) -> dict | None:
+@traced("llm.generate", model=MODEL_NAME)
+def generate_email_content(user_name: str, prompt: str, regenerate: bool = False, timeout: float | None = DEFAULT_REQUEST_TIMEOUT) -> dict | None:
     """
     Generates a 100% complete, high-quality email draft using the (now complete) prompt.
 
     Args:
         user_name (str): The name of the user for the signature.
         prompt (str): The user's request, now including any follow-up answers.
+        regenerate (bool): Skip the cache lookup and always write a fresh draft (the new draft is still cached).
+        timeout (float | None): Seconds to wait for a valid draft before giving up (None waits forever).
 
     Returns:
         dict | None: A dictionary with the email 'subject' and 'body', or None on failure.
     """
-    model = genai.GenerativeModel('gemini-1.5-flash-latest')  # gemini model used
-    
-    full_prompt = f"""
-    You are an expert AI assistant. Your function is to write a perfect, 100% ready-to-send email based on a user's request.
+    cache = get_draft_cache()
+    key = _generation_key(user_name, prompt)
+    if not regenerate:
+        cached = cache.get(key)
+        if cached is not MISS:
+            print("Draft served from cache.")
+            annotate(cache_hit=True)
+            return cached
 
-    **YOUR #1 UNBREAKABLE RULE: YOU ARE FORBIDDEN FROM USING BRACKETS `[]` OR PARENTHESES `()` TO SUGGEST USER INPUT.**
-    Your output must be a final product. If a minor detail is missing, you MUST invent a plausible, professional-sounding detail.
+    model = get_model()
+    examples = similar_drafts(prompt, user_name)
+    generation_prompt = _build_generation_prompt(user_name, prompt, examples)
+    annotate(cache_hit=False, prompt_tokens=estimate_tokens(generation_prompt), few_shot=len(examples))
+    try:
+        print("Generating final draft...")
+        draft = HedgedCall("generate", timeout).run(lambda attempt: parse_draft(_ask(model, generation_prompt, attempt, draft=True).text))
+    except Exception as e:
+        print(f"FATAL ERROR during email generation: {e}")
+        mark_failed(e)
+        return None
+    cache.put(key, draft, kind="generation")
+    return draft
 
-    **CRITICAL RULE ON PERSONAL DETAILS:** You are STRICTLY FORBIDDEN from inventing personal names or contact information. Instead, you must use a general phrases like "my team is briefed" or "I am available to connect or just anything that fits the best according to the input."
+@traced("llm.generate", model=MODEL_NAME)
+def stream_email_content(user_name: str, prompt: str, on_delta, regenerate: bool = False, timeout: float | None = DEFAULT_REQUEST_TIMEOUT) -> dict | None:
+    """
+    Same as generate_email_content, but streams the response. Every piece of subject/body text is
+    passed to on_delta(field, text) as soon as it arrives, so the UI can show the draft being written.
+    The returned draft is still parsed from the complete response and is the one to trust.
+    If the first chunk is slow to arrive, a second request is raced against the first; only the one that
+    starts answering first ever reaches on_delta.
 
-    **YOUR TASK:**
-    - User's Name (for signature): "{user_name}"
-    - User's Request (now including any necessary details): "{prompt}"
-    - Now, write the complete email. The output format MUST be ONLY a valid JSON string:
-    {{"subject": "A creative and professional subject line", "body": "The full, well-written email body."}}
+    Args:
+        user_name (str): The name of the user for the signature.
+        prompt (str): The user's request, now including any follow-up answers.
+        on_delta (callable): Called as on_delta("subject" | "body", text) from a background thread.
+        regenerate (bool): Skip the cache lookup and always write a fresh draft.
+        timeout (float | None): Seconds to wait for the complete draft before giving up (None waits forever).
+
+    Returns:
+        dict | None: A dictionary with the email 'subject' and 'body', or None on failure.
     """
-    
+    cache = get_draft_cache()
+    key = _generation_key(user_name, prompt)
+    if not regenerate:
+        cached = cache.get(key)
+        if cached is not MISS:
+            print("Draft served from cache.")
+            annotate(cache_hit=True, streamed=True)
+            on_delta("subject", cached["subject"])
+            on_delta("body", cached["body"])
+            return cached
+
+    model = get_model()
+    examples = similar_drafts(prompt, user_name)
+    generation_prompt = _build_generation_prompt(user_name, prompt, examples)
+    annotate(cache_hit=False, streamed=True, prompt_tokens=estimate_tokens(generation_prompt), few_shot=len(examples))
     try:
-        print("Generating final draft...")
-        response = model.generate_content(full_prompt)
-        
-        json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
-        if not json_match:
-            raise ValueError("No valid JSON object found in the AI's response.")
-            
-        json_str = json_match.group(0)
-        draft = json.loads(json_str)
-        
-        if not draft.get("subject") or not draft.get("body"):
-            raise ValueError("Generated JSON is missing 'subject' or 'body'.")
-            
-        print("Draft generation successful.")
-        return draft
-        
+        print("Generating final draft (streaming)...")
+        call = HedgedCall("generate", timeout, streaming=True)
+        draft = call.run(lambda attempt: _stream_draft(model, generation_prompt, on_delta, attempt))[1]
     except Exception as e:
         print(f"FATAL ERROR during email generation: {e}")
+        mark_failed(e)
+        return None
+    cache.put(key, draft, kind="generation")
+    return draft
+
+@traced("llm.revise", model=MODEL_NAME)
+def revise_email_content(user_name: str, context: RevisionContext, on_delta=None, timeout: float | None = DEFAULT_REQUEST_TIMEOUT) -> dict | None:
+    """
+    Applies the newest feedback in 'context' to its current draft. Revisions are never served from the cache:
+    asking for changes should always produce a fresh edit. The round's prompt tokens and latency are recorded
+    on the context, and the revised draft becomes its current draft.
+
+    Args:
+        user_name (str): The name of the user for the signature.
+        context (RevisionContext): The original request, the current draft and the feedback so far.
+        on_delta (callable | None): If given, the response is streamed and passed to on_delta(field, text).
+        timeout (float | None): Seconds to wait for the revised draft before giving up (None waits forever).
+
+    Returns:
+        dict | None: The revised 'subject' and 'body', or None on failure.
+    """
+    model = get_model()
+    revision_prompt = _build_revision_prompt(user_name, context)
+    annotate(streamed=on_delta is not None, prompt_tokens=estimate_tokens(revision_prompt), feedback_items=len(context.feedback))
+    try:
+        with RevisionTimer(context, "revise", revision_prompt) as timer:
+            print("Revising the draft...")
+            if on_delta is None:
+                def attempt_fn(attempt):
+                    response = _ask(model, revision_prompt, attempt, draft=True)
+                    return response, parse_draft(response.text)
+            else:
+                def attempt_fn(attempt):
+                    return _stream_draft(model, revision_prompt, on_delta, attempt)
+            timer.response, draft = HedgedCall("revise", timeout, streaming=on_delta is not None).run(attempt_fn)
+            timer.ok = True
+    except Exception as e:
+        print(f"FATAL ERROR during draft revision: {e}")
+        mark_failed(e)
+        return None
+    context.set_draft(draft)
+    return draft
+
+# Async API
+
+@traced("llm.analyze", model=MODEL_NAME)
+async def aanalyze_prompt_for_followup(prompt: str, limiter: AsyncRateLimiter | None = None, timeout: float | None = DEFAULT_ANALYSIS_TIMEOUT, regenerate: bool = False) -> str | None:
+    """
+    Async version of analyze_prompt_for_followup.
+
+    Args:
+        prompt (str): The user's raw request for the email.
+        limiter (AsyncRateLimiter | None): Optional shared rate limiter to wait on before calling the model.
+        timeout (float | None): Seconds to wait for the model (including a hedged second request) before giving up.
+        regenerate (bool): Skip the cache lookup and always ask the model.
+
+    Returns:
+        str | None: A follow-up question if needed, otherwise None (also None on failure or timeout).
+    """
+    # The cache and the decision log are SQLite and a file on disk, so they are used from a worker thread
+    # to keep every other conversation on the event loop moving.
+    cache = get_draft_cache()
+    key = _analysis_key(prompt)
+    if not regenerate:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not MISS:
+            annotate(cache_hit=True)
+            return cached
+
+    local = _local_followup(prompt, regenerate)
+    if local is not None and local.is_local:
+        return local.question
+
+    model = get_model()
+    analysis_prompt = _build_analysis_prompt(prompt)
+    annotate(cache_hit=False, prompt_tokens=estimate_tokens(analysis_prompt))
+    async def attempt_fn(attempt):
+        if limiter:
+            await limiter.acquire(estimate_tokens(analysis_prompt))
+        return _parse_followup((await _aask(model, analysis_prompt, attempt)).text)
+
+    try:
+        result = await HedgedCall("analyze", timeout).arun(attempt_fn)
+    except Exception as e:
+        print(f"ERROR during follow-up analysis: {e!r}")
+        mark_failed(e)
+        return None
+    annotate(followup=result is not None)
+    await asyncio.to_thread(get_followup_classifier().record, prompt, result, local)
+    await asyncio.to_thread(cache.put, key, result, kind="analysis")
+    return result
+
+@traced("llm.generate", model=MODEL_NAME)
+async def agenerate_email_content(user_name: str, prompt: str, limiter: AsyncRateLimiter | None = None, timeout: float | None = DEFAULT_REQUEST_TIMEOUT, regenerate: bool = False) -> dict | None:
+    """
+    Async version of generate_email_content.
+
+    Args:
+        user_name (str): The name of the user for the signature.
+        prompt (str): The user's request, now including any follow-up answers.
+        limiter (AsyncRateLimiter | None): Optional shared rate limiter to wait on before calling the model.
+        timeout (float | None): Seconds to wait for a valid draft (including a hedged second request) before giving up.
+        regenerate (bool): Skip the cache lookup and always write a fresh draft.
+
+    Returns:
+        dict | None: A dictionary with the email 'subject' and 'body', or None on failure or timeout.
+    """
+    cache = get_draft_cache()
+    key = _generation_key(user_name, prompt)
+    if not regenerate:
+        cached = await asyncio.to_thread(cache.get, key)
+        if cached is not MISS:
+            annotate(cache_hit=True)
+            return cached
+
+    model = get_model()
+    # The lookup itself takes a few milliseconds, but loading the index the first time takes longer than that.
+    examples = await asyncio.to_thread(similar_drafts, prompt, user_name)
+    full_prompt = _build_generation_prompt(user_name, prompt, examples)
+    annotate(cache_hit=False, prompt_tokens=estimate_tokens(full_prompt), few_shot=len(examples))
+    async def attempt_fn(attempt):
+        if limiter:
+            await limiter.acquire(estimate_tokens(full_prompt))
+        return parse_draft((await _aask(model, full_prompt, attempt, draft=True)).text)
+
+    try:
+        draft = await HedgedCall("generate", timeout).arun(attempt_fn)
+    except Exception as e:
+        print(f"FATAL ERROR during email generation: {e!r}")
+        mark_failed(e)
+        return None
+    await asyncio.to_thread(cache.put, key, draft, kind="generation")
+    return draft
+
+async def agenerate_many(
+    requests: list[dict],
+    concurrency: int = DEFAULT_CONCURRENCY,
+    requests_per_minute: float | None = DEFAULT_REQUESTS_PER_MINUTE,
+    tokens_per_minute: float | None = DEFAULT_TOKENS_PER_MINUTE,
+    timeout: float | None = DEFAULT_REQUEST_TIMEOUT,
+    on_done=None,
+) -> list[dict | None]:
+    """
+    Generates many drafts concurrently. At most 'concurrency' model calls are in flight at once,
+    and all of them share one rate limiter, so a batch of 200 drafts takes roughly
+    200 / concurrency model round-trips of wall time instead of 200.
+
+    Args:
+        requests (list[dict]): One {"user_name": ..., "prompt": ...} dictionary per draft.
+        concurrency (int): Maximum number of requests in flight at the same time.
+        requests_per_minute (float | None): Requests-per-minute limit (0/None for no limit).
+        tokens_per_minute (float | None): Prompt-tokens-per-minute limit (0/None for no limit).
+        timeout (float | None): Per-request timeout in seconds.
+        on_done (callable | None): Called as on_done(index, draft) as soon as each draft is ready (or failed),
+            e.g. to report progress while the rest of the batch is still being written.
+
+    Returns:
+        list[dict | None]: The drafts, in the same order as 'requests' (None where a request failed).
+    """
+    limiter = AsyncRateLimiter(requests_per_minute, tokens_per_minute)
+    semaphore = asyncio.Semaphore(max(1, concurrency))
+
+    async def run_one(index, request):
+        async with semaphore:
+            draft = await agenerate_email_content(request["user_name"], request["prompt"], limiter, timeout)
+        if on_done is not None:
+            on_done(index, draft)
+        return draft
+
+    return await asyncio.gather(*(run_one(i, r) for i, r in enumerate(requests)))
+
+@traced("llm.revise", model=MODEL_NAME)
+async def arevise_email_content(user_name: str, context: RevisionContext, limiter: AsyncRateLimiter | None = None, timeout: float | None = DEFAULT_REQUEST_TIMEOUT) -> dict | None:
+    """
+    Async version of revise_email_content (without streaming).
+
+    Args:
+        user_name (str): The name of the user for the signature.
+        context (RevisionContext): The original request, the current draft and the feedback so far.
+        limiter (AsyncRateLimiter | None): Optional shared rate limiter to wait on before calling the model.
+        timeout (float | None): Seconds to wait for the model before giving up (None waits forever).
+
+    Returns:
+        dict | None: The revised 'subject' and 'body', or None on failure or timeout.
+    """
+    model = get_model()
+    revision_prompt = _build_revision_prompt(user_name, context)
+    annotate(prompt_tokens=estimate_tokens(revision_prompt), feedback_items=len(context.feedback))
+    async def attempt_fn(attempt):
+        if limiter:
+            await limiter.acquire(estimate_tokens(revision_prompt))
+        response = await _aask(model, revision_prompt, attempt, draft=True)
+        return response, parse_draft(response.text)
+
+    try:
+        with RevisionTimer(context, "revise", revision_prompt) as timer:
+            timer.response, draft = await HedgedCall("revise", timeout).arun(attempt_fn)
+            timer.ok = True
+    except Exception as e:
+        print(f"FATAL ERROR during draft revision: {e!r}")
+        mark_failed(e)
         return None
+    context.set_draft(draft)
+    return draft
@@ -0,0 +1,391 @@
+# agent/followup_classifier.py
+# A local first opinion on "does this request need a follow-up question?", so the obvious cases skip Gemini.
+# analyze_prompt_for_followup used to spend a full model round-trip on every request, even ones like
+# "sick leave for tomorrow and the day after" where the answer is plainly NO_FOLLOWUP_NEEDED.
+# Two cheap stages now run first:
+# 1. Rules: the request's intent (leave, meeting, order, thank-you...) and the entities it already contains
+#    (dates, names, IDs, email addresses). "Leave request with dates" or "thank-you note" is answered
+#    here; "leave request without dates" gets the same question the model would ask. An intent only counts
+#    on a phrase that means it ("sick leave", "leave from", "day off"), not on a word that can mean anything
+#    ("leave the package at the desk", "sick of the noise"), and only real dates and day names count as dates
+#    ("for 2 days" says how long, not when). The rules score how clear-cut the request is, and below
+#    FOLLOWUP_RULES_CONFIDENCE (mixed intents, long requests) they leave it to the model.
+# 2. A small naive Bayes model trained on the model's own past decisions, which every real analysis
+#    appends to FOLLOWUP_LOG_PATH. It only answers "no follow-up needed", and only when it is very sure,
+#    because a question still needs the model to word it.
+# Anything else goes to Gemini as before. Both stages take microseconds.
+#
+# How often the local stages answer, and how often they agree with the model, is measured on the model's
+# real decisions. Only requests the local stages defer reach the model, so FOLLOWUP_AUDIT_RATE of the
+# requests they do answer are sent to the model anyway (its answer is the one used) and logged next to the
+# local answer. Replaying the log reports the rules and the learned model separately (each decision is
+# predicted first, then learned, as it would have happened live), plus the live audits as they were logged:
+#
+#     python -m agent.followup_classifier                       # replays .cache/followup_decisions.jsonl
+#     python -m agent.followup_classifier --log benchmarks/followup_seed.jsonl
+#
+# benchmarks/followup_seed.jsonl holds the examples the rules were written from. Replaying it checks that
+# they still behave as intended; it is not a measure of how often they agree with the model.
+#
+# Set FOLLOWUP_FAST_PATH=0 in the .env file to always ask the model.
+
+import argparse
+import json
+import math
+import os
+import random
+import re
+import threading
+import time
+
+from agent.settings import getenv
+
+FOLLOWUP_FAST_PATH = getenv("FOLLOWUP_FAST_PATH", "1").lower() not in ("0", "false", "no")
+FOLLOWUP_LOG_PATH = getenv("FOLLOWUP_LOG_PATH", os.path.join(".cache", "followup_decisions.jsonl"))
+# The trained model answers only when it is at least this sure...
+FOLLOWUP_MODEL_CONFIDENCE = float(getenv("FOLLOWUP_MODEL_CONFIDENCE", "0.97"))
+# ...and only after it has learned from this many of the model's decisions.
+FOLLOWUP_MIN_TRAINING = int(getenv("FOLLOWUP_MIN_TRAINING", "50"))
+# The rules answer only when they score the request at least this clear-cut.
+FOLLOWUP_RULES_CONFIDENCE = float(getenv("FOLLOWUP_RULES_CONFIDENCE", "0.9"))
+# The share of locally answered requests that still go to the model, to measure the local answers against it.
+FOLLOWUP_AUDIT_RATE = float(getenv("FOLLOWUP_AUDIT_RATE", "0.05"))
+
+# Entities
+
+_MONTHS = r"january|february|march|april|june|july|august|september|october|november|december"
+_MONTH_ABBREVIATIONS = r"jan|feb|mar|apr|may|jun|jul|aug|sept?|oct|nov|dec"
+_WEEKDAYS = r"monday|tuesday|wednesday|thursday|friday|saturday|sunday"
+# Days that can be put in a calendar. Durations ("2 days", "a week") and vague spans ("next month") are not dates.
+# "12/03" and "12.03.2025" are dates; "1.5" and version or IP numbers are not.
+_DATE = re.compile(rf"""\b(?:
+      today|tonight|tomorrow|yesterday|day\ after\ tomorrow
+    | (?:this|next|coming|last)\ (?:morning|afternoon|evening|weekend|{_WEEKDAYS})
+    | {_WEEKDAYS}|{_MONTHS}
+    | (?:{_MONTH_ABBREVIATIONS})\.?\ ?\d{{1,2}}(?:st|nd|rd|th)?
+    | \d{{1,2}}(?:st|nd|rd|th)?\ (?:of\ )?(?:{_MONTHS}|{_MONTH_ABBREVIATIONS})
+    | (?:on|from|to|till|until|by)\ (?:the\ )?\d{{1,2}}(?:st|nd|rd|th)
+    | (?<![\d.])\d{{1,2}}(?:[/-]\d{{1,2}}(?:[/-]\d{{2,4}})?|\.\d{{1,2}}\.\d{{2,4}})(?!\.?\d)
+    | \d{{4}}-\d{{2}}-\d{{2}}
+)\b""", re.IGNORECASE | re.VERBOSE)
+_ID = re.compile(r"(?:\b(?:id|no|number|ref|reference|order|invoice|ticket|roll)\b\.?\s*[:#]?\s*|#)[A-Z]*\d[\w-]*"
+                 r"|\b(?=[A-Z]*\d)(?=\d*[A-Z])[A-Z0-9]{5,}\b|\b\d{5,}\b", re.IGNORECASE)
+_EMAIL_ADDRESS = re.compile(r"\b[\w.+-]+@[\w-]+\.[\w.-]+\b")
+# "Mr. Sharma", "to Priya", "for Rahul Verma", "named Alex": a capitalised word where a name would go.
+_NAME = re.compile(r"\b(?:(?:mr|mrs|ms|dr|prof|sir|madam)\.?\s+|(?:to|for|named|called|with|from|dear)\s+)([A-Z][a-z]+)")
+_NOT_NAMES = {"I", "My", "The", "A", "An", "Our", "Your", "His", "Her", "Their", "This", "That", "Me", "Him", "Them",
+              "Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday", "Manager", "Team",
+              "Hr", "Boss", "Sir", "Madam", "Everyone", "All", "Leave", "Email", "Mail"}
+# "some student", "someone", "a person": the request talks about somebody without saying who.
+_UNNAMED_PERSON = re.compile(r"\b(?:some(?:one|body)|some\s+(?:student|person|employee|candidate|client|customer|guy|girl|friend))\b", re.IGNORECASE)
+
+# Intents: (name, pattern, the entities it can't do without (any one of them is enough) or None, the question
+# to ask when they are all missing, or None when it's not clear-cut and the model should decide).
+_INTENTS = [
+    # "Leave" on its own is too common a verb ("leave the package at the desk"), and "sick" or "holiday" too
+    # common in other emails ("sick of the noise", "holiday greetings"), so only leave-request phrases count.
+    ("leave", re.compile(r"\b(?:(?:sick|casual|annual|medical|maternity|paternity|privilege|half[- ]day)\ leave"
+                         r"|leave\ (?:for|on|from|starting|till|until|application|request)"
+                         r"|(?:request(?:ing)?|apply(?:ing)?|application)\ (?:for\ )?(?:a\ )?leave|on\ leave"
+                         r"|days?\ off|time\ off|vacation\ (?:request|from|starting)|leave\ of\ absence|be\ absent"
+                         r"|out\ of\ office|wfh|work\ from\ home)\b", re.I),
+     ("date",), "For what dates will you be on leave?"),
+    ("meeting", re.compile(r"\b(?:meeting|meet|schedule|reschedule|appointment|call|catch up|sync|invite|invitation)\b", re.I),
+     ("date",), None),
+    ("order", re.compile(r"\b(?:order|invoice|refund|payment|ticket|shipment|delivery|return|bill|receipt)\b", re.I),
+     ("id",), None),
+    ("person", re.compile(r"\b(?:student|recommendation|reference letter|referral|certificate|introduc\w*)\b", re.I),
+     ("name", "id"), None),
+    # Intents that never need anything the model can't write around.
+    ("courtesy", re.compile(r"\b(?:thank\w*|congrat\w*|appreciat\w*|welcome|farewell|goodbye|apolog\w*|sorry|best wishes|happy birthday|wish\w*|greetings?|follow(?:ing)?[ -]?up|check(?:ing)? in)\b", re.I),
+     None, None),
+]
+
+def extract_entities(prompt: str) -> dict:
+    """The entities and intents found in a request, e.g. {"date": ["tomorrow"], "intents": ["leave"]}."""
+    names = [name for name in _NAME.findall(prompt) if name not in _NOT_NAMES]
+    return {
+        "words": len(prompt.split()),
+        "date": _DATE.findall(prompt),
+        "id": _ID.findall(prompt),
+        "email": _EMAIL_ADDRESS.findall(prompt),
+        "name": names,
+        "unnamed_person": bool(_UNNAMED_PERSON.search(prompt)),
+        "intents": [name for name, pattern, _, _ in _INTENTS if pattern.search(prompt)],
+    }
+
+def features_of(prompt: str, entities: dict | None = None) -> list[str]:
+    """The model's features: lowercase words and word pairs, plus one token per entity/intent found."""
+    entities = entities if entities is not None else extract_entities(prompt)
+    words = re.findall(r"[a-z']+|\d+", prompt.lower())
+    features = words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+    features += [f"__has_{kind}" for kind in ("date", "id", "email", "name") if entities[kind]]
+    features += [f"__intent_{intent}" for intent in entities["intents"]]
+    if entities["unnamed_person"]:
+        features.append("__unnamed_person")
+    features.append(f"__length_{min(len(words) // 4, 5)}")
+    return features
+
+class FollowupDecision:
+    """
+    The local answer for one request.
+
+    Args:
+        needs_followup (bool | None): True/False when answered locally, None when the model must decide.
+        question (str | None): The follow-up question, when one is needed and known.
+        source (str): "rules", "model" or "llm" (deferred).
+        confidence (float): How sure the deciding stage is (0-1).
+        reason (str): A short human-readable explanation.
+        audit (bool): Answered locally, but picked to go to the model anyway so the two can be compared.
+    """
+
+    def __init__(self, needs_followup: bool | None, question: str | None, source: str, confidence: float, reason: str,
+                 audit: bool = False):
+        self.needs_followup = needs_followup
+        self.question = question
+        self.source = source
+        self.confidence = confidence
+        self.reason = reason
+        self.audit = audit
+
+    @property
+    def is_local(self) -> bool:
+        """True when this answer is used as is; audited answers are only logged."""
+        return self.needs_followup is not None and not self.audit
+
+    def to_dict(self) -> dict:
+        return {"needs_followup": self.needs_followup, "question": self.question, "source": self.source,
+                "confidence": round(self.confidence, 4), "reason": self.reason, "audit": self.audit}
+
+class _NaiveBayes:
+    """Multinomial naive Bayes over feature counts, learned one example at a time."""
+
+    def __init__(self):
+        # Per class (True = follow-up needed): example count, feature counts, total feature count.
+        self.examples = {True: 0, False: 0}
+        self.counts = {True: {}, False: {}}
+        self.totals = {True: 0, False: 0}
+        self.vocabulary = set()
+
+    @property
+    def trained_on(self) -> int:
+        return self.examples[True] + self.examples[False]
+
+    def learn(self, features: list[str], needs_followup: bool):
+        self.examples[needs_followup] += 1
+        counts = self.counts[needs_followup]
+        for feature in features:
+            counts[feature] = counts.get(feature, 0) + 1
+            self.vocabulary.add(feature)
+        self.totals[needs_followup] += len(features)
+
+    def probability_of_followup(self, features: list[str]) -> float:
+        if not self.examples[True] or not self.examples[False]:
+            # With only one class seen so far there is nothing to compare against.
+            return 0.5
+        vocabulary = len(self.vocabulary) + 1
+        scores = {}
+        for label in (True, False):
+            counts, total = self.counts[label], self.totals[label] + vocabulary
+            score = math.log(self.examples[label] / self.trained_on)
+            for feature in features:
+                score += math.log((counts.get(feature, 0) + 1) / total)
+            scores[label] = score
+        # Softmax of the two log scores, written so it can't overflow.
+        return 1.0 / (1.0 + math.exp(max(-700.0, min(700.0, scores[False] - scores[True]))))
+
+class FollowupClassifier:
+    """
+    Rules + a small learned model in front of the follow-up analysis call.
+
+    Args:
+        log_path (str | None): The JSONL log of the model's past decisions (learned from at start-up and
+            appended to by record()), or None to keep everything in memory.
+        model_confidence (float): How sure the learned model must be before it answers.
+        min_training (int): How many decisions the learned model must have seen before it answers.
+        rules_confidence (float): How clear-cut the rules must score a request before they answer.
+        audit_rate (float): The share of local answers sent to the model anyway (0 to never audit).
+    """
+
+    def __init__(self, log_path: str | None = FOLLOWUP_LOG_PATH, model_confidence: float = FOLLOWUP_MODEL_CONFIDENCE,
+                 min_training: int = FOLLOWUP_MIN_TRAINING, rules_confidence: float = FOLLOWUP_RULES_CONFIDENCE,
+                 audit_rate: float = FOLLOWUP_AUDIT_RATE):
+        self.log_path = log_path
+        self.model_confidence = model_confidence
+        self.min_training = min_training
+        self.rules_confidence = rules_confidence
+        self.audit_rate = audit_rate
+        self._model = _NaiveBayes()
+        self._lock = threading.Lock()
+        self.stats = {"rules": 0, "model": 0, "llm": 0, "audit": 0, "recorded": 0}
+        if log_path and os.path.exists(log_path):
+            for record in load_decisions(log_path):
+                self._model.learn(features_of(record["prompt"]), record["followup"] is not None)
+
+    def classify(self, prompt: str) -> FollowupDecision:
+        """Decides locally if possible; a decision with needs_followup=None means "ask the model"."""
+        entities = extract_entities(prompt)
+        decision = self._apply_rules(entities)
+        if decision is not None and decision.confidence < self.rules_confidence:
+            # Not clear-cut enough for the rules: the learned model, or else Gemini, decides.
+            decision = None
+        if decision is None:
+            with self._lock:
+                trained_on = self._model.trained_on
+                p_followup = self._model.probability_of_followup(features_of(prompt, entities))
+            if trained_on >= self.min_training and 1.0 - p_followup >= self.model_confidence:
+                decision = FollowupDecision(False, None, "model", 1.0 - p_followup, f"learned from {trained_on} decisions")
+            else:
+                decision = FollowupDecision(None, None, "llm", max(p_followup, 1.0 - p_followup), "not sure")
+        if decision.needs_followup is not None and self.audit_rate > 0 and random.random() < self.audit_rate:
+            decision.audit = True
+        with self._lock:
+            self.stats["audit" if decision.audit else decision.source] += 1
+        return decision
+
+    def record(self, prompt: str, question: str | None, local: FollowupDecision | None = None):
+        """
+        Learns from one of the model's decisions and appends it to the log.
+
+        Args:
+            prompt (str): The request that was analyzed.
+            question (str | None): The model's follow-up question, or None for NO_FOLLOWUP_NEEDED.
+            local (FollowupDecision | None): What the local stages made of the same request (they deferred,
+                were skipped, or answered and were audited), kept in the log to measure them against the model.
+        """
+        needs_followup = question is not None
+        record = {"time": round(time.time(), 3), "prompt": prompt, "followup": question}
+        if local is not None:
+            record["local"] = local.to_dict()
+        with self._lock:
+            self._model.learn(features_of(prompt), needs_followup)
+            self.stats["recorded"] += 1
+            if self.log_path:
+                try:
+                    os.makedirs(os.path.dirname(self.log_path) or ".", exist_ok=True)
+                    with open(self.log_path, "a", encoding="utf-8") as f:
+                        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+                except OSError as e:
+                    print(f"Could not log the follow-up decision to {self.log_path}: {e}")
+
+    @staticmethod
+    def _apply_rules(entities: dict) -> FollowupDecision | None:
+        intents = entities["intents"]
+        needy = [(name, needed, question) for name, _, needed, question in _INTENTS if name in intents and needed]
+        if entities["unnamed_person"] and not entities["name"]:
+            # "Write something for some student": the model asks who; we don't know the exact wording it wants.
+            return None
+        # The rules only see keywords: a request that mixes intents, or says a lot more than they look at,
+        # is less clear-cut than it seems, and the lower score sends it to the model.
+        penalty = 0.1 * (len(intents) - 1) + (0.1 if entities["words"] > 25 else 0.0)
+        for name, needed, question in needy:
+            if not any(entities[entity] for entity in needed):
+                if question is not None:
+                    return FollowupDecision(True, question, "rules", 0.95 - penalty, f"{name} request without a {' or '.join(needed)}")
+                return None
+        if needy:
+            names = ", ".join(name for name, _, _ in needy)
+            return FollowupDecision(False, None, "rules", 0.95 - penalty, f"{names} request that already has the details")
+        if "courtesy" in intents:
+            return FollowupDecision(False, None, "rules", 0.9 - penalty, "courtesy email")
+        return None
+
+def load_decisions(path: str) -> list[dict]:
+    """The {"prompt", "followup"} records in a decision log (bad lines are skipped)."""
+    records = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if isinstance(record, dict) and isinstance(record.get("prompt"), str):
+                local = record.get("local")
+                records.append({"prompt": record["prompt"], "followup": record.get("followup"),
+                                "local": local if isinstance(local, dict) else None})
+    return records
+
+def _agreement(count: int, agreed: int) -> dict:
+    return {"answered": count, "agreement": round(agreed / count, 4) if count else None}
+
+def audit_report(records: list[dict]) -> dict:
+    """How the local answers that were audited live compared with the model's answer, per stage."""
+    by_source = {"rules": [0, 0], "model": [0, 0]}
+    for record in records:
+        local = record.get("local") or {}
+        if local.get("audit") and local.get("source") in by_source:
+            by_source[local["source"]][0] += 1
+            by_source[local["source"]][1] += local.get("needs_followup") == (record["followup"] is not None)
+    return {source: _agreement(count, agreed) for source, (count, agreed) in by_source.items()}
+
+def replay(records: list[dict], model_confidence: float = FOLLOWUP_MODEL_CONFIDENCE, min_training: int = FOLLOWUP_MIN_TRAINING,
+           rules_confidence: float = FOLLOWUP_RULES_CONFIDENCE) -> dict:
+    """
+    Replays logged decisions in order: each request is classified first, then learned from, like it would
+    have been live. Returns the skip rate (answered without the model), how often the rules and the learned
+    model each agreed with the model (they are reported separately: a stage that answered nothing has no
+    agreement figure), the live audits found in the log, and how long a local decision takes.
+    """
+    classifier = FollowupClassifier(None, model_confidence, min_training, rules_confidence, audit_rate=0.0)
+    by_source = {"rules": [0, 0], "model": [0, 0]}
+    false_skips = 0
+    timings = []
+    for record in records:
+        started = time.perf_counter()
+        decision = classifier.classify(record["prompt"])
+        timings.append(time.perf_counter() - started)
+        expected = record["followup"] is not None
+        if decision.is_local:
+            by_source[decision.source][0] += 1
+            by_source[decision.source][1] += decision.needs_followup == expected
+            false_skips += expected and not decision.needs_followup
+        classifier.record(record["prompt"], record["followup"])
+    local = sum(count for count, _ in by_source.values())
+    timings.sort()
+    return {
+        "decisions": len(records),
+        "answered_locally": local,
+        "skip_rate": round(local / len(records), 4) if records else 0.0,
+        "rules": _agreement(*by_source["rules"]),
+        "model": _agreement(*by_source["model"]),
+        # Requests the model would have asked about, but the local stages waved through.
+        "missed_followups": false_skips,
+        "audited_live": audit_report(records),
+        "median_us": round(timings[len(timings) // 2] * 1e6, 1) if timings else 0.0,
+        "p99_us": round(timings[min(len(timings) - 1, int(len(timings) * 0.99))] * 1e6, 1) if timings else 0.0,
+    }
+
+_classifier = None
+_classifier_lock = threading.Lock()
+
+def get_followup_classifier() -> FollowupClassifier:
+    """Returns the process-wide classifier, learning from the decision log on first use."""
+    global _classifier
+    with _classifier_lock:
+        if _classifier is None:
+            _classifier = FollowupClassifier()
+        return _classifier
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay logged follow-up decisions through the local classifier.")
+    parser.add_argument("--log", default=FOLLOWUP_LOG_PATH, help="A JSONL file of {\"prompt\", \"followup\"} records.")
+    parser.add_argument("--confidence", type=float, default=FOLLOWUP_MODEL_CONFIDENCE, help="The learned model's confidence threshold.")
+    parser.add_argument("--min-training", type=int, default=FOLLOWUP_MIN_TRAINING, help="Decisions the learned model needs before it answers.")
+    parser.add_argument("--rules-confidence", type=float, default=FOLLOWUP_RULES_CONFIDENCE, help="How clear-cut a request must be for the rules to answer.")
+    parser.add_argument("--explain", help="Show the local decision for one request instead.")
+    args = parser.parse_args()
+
+    if args.explain:
+        classifier = FollowupClassifier(args.log if os.path.exists(args.log) else None, args.confidence, args.min_training,
+                                        args.rules_confidence, audit_rate=0.0)
+        print(json.dumps({"entities": extract_entities(args.explain), "decision": classifier.classify(args.explain).to_dict()}, indent=2))
+        return
+    if not os.path.exists(args.log):
+        raise SystemExit(f"No decision log at {args.log} yet. It fills up as requests are analyzed.")
+    print(json.dumps(replay(load_decisions(args.log), args.confidence, args.min_training, args.rules_confidence), indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,306 @@
+# agent/hedging.py
+# Deadlines and hedged requests for model calls.
+# Most Gemini calls answer within a few seconds, but a few percent take many times longer (or never answer),
+# and those few decide how long users wait. So every call gets a deadline, and if the first request has not
+# produced a valid answer by the time most calls of the same kind have (the LLM_HEDGE_PERCENTILE of recent
+# latencies), an identical second request is sent. Whichever returns a valid result first wins; the other is
+# cancelled (async) or simply ignored (threads can't be interrupted). A request that fails or returns an
+# unusable answer sends the second one straight away. Hedges are capped at LLM_HEDGE_MAX_RATIO of all calls,
+# so a slow API is not hit with twice the traffic.
+#
+#     call = HedgedCall("generate", deadline=60)
+#     draft = call.run(lambda attempt: parse_draft(model.generate_content(prompt).text))
+#
+# Streamed answers can't be raced to the end (both would write into the same window), so for them the race
+# is only about the first chunk: the attempt that calls attempt.claim() first keeps going, the other stops.
+
+import asyncio
+import threading
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+from agent.settings import getenv
+from agent.tracing import annotate, current_context, percentile, span
+
+LLM_HEDGING = getenv("LLM_HEDGING", "1").lower() not in ("0", "false", "no")
+# Send the second request once the first has taken longer than this percentile of recent calls...
+LLM_HEDGE_PERCENTILE = float(getenv("LLM_HEDGE_PERCENTILE", "95"))
+# ...but never sooner than this, and after this long while there are too few samples to tell.
+LLM_HEDGE_MIN_DELAY = float(getenv("LLM_HEDGE_MIN_DELAY", "0.5"))
+LLM_HEDGE_DEFAULT_DELAY = float(getenv("LLM_HEDGE_DEFAULT_DELAY", "8"))
+LLM_HEDGE_MIN_SAMPLES = int(getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+# At most this share of calls may send a second request.
+LLM_HEDGE_MAX_RATIO = float(getenv("LLM_HEDGE_MAX_RATIO", "0.1"))
+LLM_HEDGE_WINDOW = int(getenv("LLM_HEDGE_WINDOW", "200"))
+
+class DeadlineExceeded(TimeoutError):
+    """No valid answer arrived before the call's deadline."""
+
+class AttemptAbandoned(Exception):
+    """Raised inside an attempt that lost the race (or outlived its call), to stop it early."""
+
+class LatencyTracker:
+    """Recent latencies per kind of call ("analyze", "generate", ...) plus the process-wide hedge budget."""
+
+    def __init__(self, window: int = LLM_HEDGE_WINDOW):
+        self._window = window
+        self._samples = {}
+        self._lock = threading.Lock()
+        self.counts = {"calls": 0, "hedges": 0, "hedge_wins": 0, "refused": 0, "deadline_exceeded": 0}
+
+    def observe(self, kind: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(kind, deque(maxlen=self._window)).append(seconds)
+
+    def hedge_delay(self, kind: str) -> float:
+        """How long the first request of this kind may take before a second one is sent."""
+        with self._lock:
+            samples = list(self._samples.get(kind, ()))
+        if len(samples) < LLM_HEDGE_MIN_SAMPLES:
+            return LLM_HEDGE_DEFAULT_DELAY
+        return max(LLM_HEDGE_MIN_DELAY, percentile(samples, LLM_HEDGE_PERCENTILE))
+
+    def count(self, what: str):
+        with self._lock:
+            self.counts[what] += 1
+
+    def take_hedge(self) -> bool:
+        """Reserves one hedge from the budget; False when hedging more would exceed LLM_HEDGE_MAX_RATIO."""
+        with self._lock:
+            # One spare hedge, so the very first slow call can already be hedged.
+            if self.counts["hedges"] >= LLM_HEDGE_MAX_RATIO * self.counts["calls"] + 1:
+                self.counts["refused"] += 1
+                return False
+            self.counts["hedges"] += 1
+            return True
+
+    def stats(self) -> dict:
+        with self._lock:
+            kinds = {kind: list(samples) for kind, samples in self._samples.items()}
+            counts = dict(self.counts)
+        for kind, samples in kinds.items():
+            counts[kind] = {"samples": len(samples), "p50": round(percentile(samples, 50), 3),
+                            "p99": round(percentile(samples, 99), 3), "hedge_after": round(self.hedge_delay(kind), 3)}
+        return counts
+
+class Attempt:
+    """One request of a HedgedCall."""
+
+    def __init__(self, call: "HedgedCall", index: int):
+        self.call = call
+        self.index = index
+        self.started = time.monotonic()
+
+    def remaining(self) -> float | None:
+        """Seconds left until the call's deadline (None without a deadline), e.g. for the request timeout."""
+        return self.call.remaining()
+
+    def claim(self) -> bool:
+        """For streamed attempts: called on the first chunk. False means another attempt got there first."""
+        return self.call._claim(self)
+
+    @property
+    def abandoned(self) -> bool:
+        """True once this attempt can no longer win; streamed attempts check it between chunks."""
+        return self.call._abandoned(self)
+
+class HedgedCall:
+    """
+    One logical model call: a first request, perhaps a hedge, and a deadline.
+
+    Args:
+        kind (str): What kind of call this is; hedge delays are learned per kind.
+        deadline (float | None): Seconds until the call gives up (None waits forever).
+        streaming (bool): Attempts stream their answer and claim() the call on their first chunk.
+        hedge (bool): Whether a second request may be sent at all.
+        tracker (LatencyTracker | None): Where latencies are learned (the process-wide tracker by default).
+    """
+
+    def __init__(self, kind: str, deadline: float | None = None, streaming: bool = False, hedge: bool = LLM_HEDGING,
+                 tracker: LatencyTracker | None = None):
+        self.kind = kind
+        self.deadline = deadline
+        self.streaming = streaming
+        self.tracker = tracker or get_latency_tracker()
+        self._may_hedge = hedge
+        self._hedge_after = self.tracker.hedge_delay(self._latency_kind())
+        self._lock = threading.Lock()
+        self._winner = None
+        self._done = False
+        self._started = time.monotonic()
+        self._launched = 0
+        self._errors = []
+
+    def remaining(self) -> float | None:
+        if self.deadline is None:
+            return None
+        return max(0.0, self.deadline - (time.monotonic() - self._started))
+
+    def run(self, attempt_fn):
+        """
+        Runs attempt_fn(attempt) on worker threads until one attempt returns. Raising inside attempt_fn
+        (e.g. because the answer could not be parsed) counts as that attempt failing.
+
+        Returns:
+            The first successful attempt's result.
+
+        Raises:
+            DeadlineExceeded: If nothing succeeded in time. Otherwise, the last attempt's own error.
+        """
+        self.tracker.count("calls")
+        if not self._may_hedge and self.deadline is None:
+            # Nothing to race and nothing to time out: no need for another thread.
+            attempt = self._next_attempt()
+            return self._finish(attempt, self._run_attempt(attempt_fn, attempt))
+        pending = {}
+
+        def launch():
+            attempt = self._next_attempt()
+            pending[_get_executor().submit(current_context().run, self._run_attempt, attempt_fn, attempt)] = attempt
+
+        launch()
+        try:
+            while True:
+                done = wait(pending, timeout=self._wait_time(), return_when=FIRST_COMPLETED)[0] if pending else ()
+                for future in done:
+                    attempt = pending.pop(future)
+                    try:
+                        result = future.result()
+                    except Exception as e:
+                        self._failed(e)
+                        continue
+                    return self._finish(attempt, result)
+                if self._should_hedge(bool(pending)):
+                    launch()
+                elif not pending or self.remaining() == 0.0:
+                    raise self._final_error()
+        finally:
+            self._done = True
+
+    async def arun(self, attempt_fn):
+        """Async version of run(): attempt_fn(attempt) returns a coroutine, and losing attempts are cancelled."""
+        self.tracker.count("calls")
+        pending = {}
+
+        def launch():
+            attempt = self._next_attempt()
+            task = asyncio.ensure_future(self._arun_attempt(attempt_fn, attempt))
+            task.add_done_callback(_consume)
+            pending[task] = attempt
+
+        launch()
+        try:
+            while True:
+                done = (await asyncio.wait(pending, timeout=self._wait_time(), return_when=asyncio.FIRST_COMPLETED))[0] if pending else ()
+                for task in done:
+                    attempt = pending.pop(task)
+                    try:
+                        result = task.result()
+                    except Exception as e:
+                        self._failed(e)
+                        continue
+                    return self._finish(attempt, result)
+                if self._should_hedge(bool(pending)):
+                    launch()
+                elif not pending or self.remaining() == 0.0:
+                    raise self._final_error()
+        finally:
+            self._done = True
+            for task in pending:
+                task.cancel()
+
+    def _next_attempt(self) -> Attempt:
+        attempt = Attempt(self, self._launched)
+        self._launched += 1
+        return attempt
+
+    def _run_attempt(self, attempt_fn, attempt: Attempt):
+        with span("llm.attempt", attempt=attempt.index):
+            return attempt_fn(attempt)
+
+    async def _arun_attempt(self, attempt_fn, attempt: Attempt):
+        async with span("llm.attempt", attempt=attempt.index):
+            return await attempt_fn(attempt)
+
+    def _latency_kind(self) -> str:
+        # Streamed calls race to the first chunk, so that is the latency that matters for them.
+        return f"{self.kind}.first_chunk" if self.streaming else self.kind
+
+    def _wait_time(self) -> float | None:
+        """How long to wait for an attempt before checking the deadline or the hedge again."""
+        waits = []
+        if self.deadline is not None:
+            waits.append(self.remaining())
+        if self._may_hedge and self._winner is None:
+            waits.append(max(0.0, self._hedge_after - (time.monotonic() - self._started)))
+        return min(waits) if waits else None
+
+    def _should_hedge(self, busy: bool) -> bool:
+        if not self._may_hedge or self._winner is not None or self.remaining() == 0.0:
+            return False
+        if busy and time.monotonic() - self._started < self._hedge_after:
+            return False
+        # Only one hedge per call, whether it was sent or refused.
+        self._may_hedge = False
+        return self.tracker.take_hedge()
+
+    def _claim(self, attempt: Attempt) -> bool:
+        with self._lock:
+            if self._winner is None and not self._done:
+                self._winner = attempt
+                self.tracker.observe(self._latency_kind(), time.monotonic() - attempt.started)
+            return self._winner is attempt
+
+    def _abandoned(self, attempt: Attempt) -> bool:
+        return self._done or (self._winner is not None and self._winner is not attempt)
+
+    def _failed(self, error: Exception):
+        if not isinstance(error, AttemptAbandoned):
+            self._errors.append(error)
+            print(f"Model request failed ({type(error).__name__}: {error}).")
+
+    def _final_error(self) -> Exception:
+        if self.remaining() == 0.0:
+            self.tracker.count("deadline_exceeded")
+            return DeadlineExceeded(f"No valid answer from the model within {self.deadline:g}s.")
+        return self._errors[-1] if self._errors else AttemptAbandoned("Every request was abandoned.")
+
+    def _finish(self, attempt: Attempt, result):
+        with self._lock:
+            self._done = True
+            if self._winner is None:
+                self._winner = attempt
+        if not self.streaming:
+            self.tracker.observe(self.kind, time.monotonic() - attempt.started)
+        if attempt.index > 0:
+            self.tracker.count("hedge_wins")
+        if self._launched > 1:
+            annotate(attempts=self._launched, hedge_won=attempt.index > 0)
+        return result
+
+def _consume(task: asyncio.Task):
+    # Retrieve the outcome of losing attempts, so asyncio doesn't warn about exceptions nobody looked at.
+    if not task.cancelled():
+        task.exception()
+
+_executor = None
+_tracker = None
+_lock = threading.Lock()
+
+def _get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(max_workers=32, thread_name_prefix="llm-request")
+    return _executor
+
+def get_latency_tracker() -> LatencyTracker:
+    """The process-wide LatencyTracker."""
+    global _tracker
+    if _tracker is None:
+        with _lock:
+            if _tracker is None:
+                _tracker = LatencyTracker()
+    return _tracker
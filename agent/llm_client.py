@@ -0,0 +1,41 @@
+# agent/llm_client.py
+# The shared Gemini client.
+# Importing google.generativeai is slow (it pulls in gRPC and protobuf), so it is only imported
+# the first time a model is actually needed, and the configured GenerativeModel is built once
+# and reused by every call instead of being recreated inside each function.
+
+import threading
+
+from agent.settings import getenv
+
+MODEL_NAME = 'gemini-1.5-flash-latest'  # gemini model used
+
+_model = None
+_lock = threading.Lock()
+
+def get_model():
+    """
+    Returns the process-wide GenerativeModel, importing and configuring the SDK on first use.
+    Safe to call from several threads at once; only one of them does the setup.
+    """
+    global _model
+    if _model is None:
+        with _lock:
+            if _model is None:
+                import google.generativeai as genai
+                genai.configure(api_key=getenv("GEMINI_API_KEY"))
+                _model = genai.GenerativeModel(MODEL_NAME)
+    return _model
+
+def use_model(model):
+    """
+    Replaces the shared model, e.g. with an offline stand-in (benchmarks/fake_model.py). Anything with
+    generate_content / generate_content_async works. None goes back to building the real one on next use.
+    """
+    global _model
+    with _lock:
+        _model = model
+
+def warm_up():
+    """Builds the client ahead of time (e.g. from a background thread right after the window appears)."""
+    get_model()
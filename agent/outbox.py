@@ -0,0 +1,346 @@
+# agent/outbox.py
+# A durable outbox: approved emails are written to an SQLite journal first and sent by background workers.
+# The UI only enqueues and returns at once. Because every step is recorded on disk:
+# - an email that was queued when the app closed (or crashed) is sent the next time the app starts,
+# - failed sends are retried with exponential backoff, and each sender is rate limited,
+# - every email carries an idempotency key, so enqueuing the same email twice sends it once, and
+# - an email that was mid-send during a crash, or whose send was ambiguous (e.g. Gmail never showed
+#   "Message sent"), is marked 'uncertain' and never retried automatically, so nothing is sent twice.
+# Passwords are never written to disk. An email whose sender's password is not known in this process (it was
+# queued before a restart) waits as 'needs_credentials' until enqueue() or set_credentials() supplies it.
+#
+# Row lifecycle: queued -> sending -> sent
+#                  |            \-> queued (retry later) -> ... -> failed
+#                  |            \-> uncertain (needs a human to check the Sent folder)
+#                  \-> needs_credentials -> queued (once the sender's password is supplied again)
+
+import hashlib
+import os
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+from agent.settings import getenv
+from agent.tracing import span
+from agent.transports import AmbiguousSendError, get_transport
+
+OUTBOX_PATH = getenv("OUTBOX_PATH", os.path.join(".cache", "outbox.sqlite3"))
+OUTBOX_WORKERS = int(getenv("OUTBOX_WORKERS", "2"))
+OUTBOX_MAX_ATTEMPTS = int(getenv("OUTBOX_MAX_ATTEMPTS", "5"))
+OUTBOX_BACKOFF_BASE = float(getenv("OUTBOX_BACKOFF_BASE", "5"))    # seconds before the first retry
+OUTBOX_BACKOFF_MAX = float(getenv("OUTBOX_BACKOFF_MAX", "600"))     # retries never wait longer than this
+OUTBOX_SENDER_PER_MINUTE = int(getenv("OUTBOX_SENDER_PER_MINUTE", "20"))
+
+def idempotency_key_for(sender_email: str, recipient: str, subject: str, body: str) -> str:
+    """The default idempotency key: the same email from the same sender is only ever sent once."""
+    raw = "\x1f".join([sender_email.lower(), recipient.lower(), subject, body])
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+class Outbox:
+    """
+    The SQLite-backed send queue and its worker threads.
+
+    Args:
+        path (str): Where the journal lives.
+        workers (int): How many worker threads drain the queue.
+        max_attempts (int): Attempts before a send is marked 'failed'.
+        sender_per_minute (int): At most this many sends per sender per minute (0 for no limit).
+    """
+
+    def __init__(self, path: str = OUTBOX_PATH, workers: int = OUTBOX_WORKERS, max_attempts: int = OUTBOX_MAX_ATTEMPTS,
+                 sender_per_minute: int = OUTBOX_SENDER_PER_MINUTE):
+        self.path = path
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.sender_per_minute = sender_per_minute
+
+        self._lock = threading.Lock()
+        self._wakeup = threading.Condition(self._lock)
+        self._stopping = False
+        self._threads = []
+        # Passwords are only ever kept in memory, never written to the journal.
+        self._credentials = {}
+        self._callbacks = {}
+        self._in_flight_senders = set()
+        self._recent_sends = {}
+        self._latencies = deque(maxlen=500)
+
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._db.row_factory = sqlite3.Row
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=FULL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " idempotency_key TEXT NOT NULL UNIQUE,"
+            " sender TEXT NOT NULL, recipient TEXT NOT NULL, subject TEXT NOT NULL, body TEXT NOT NULL,"
+            " transport TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " created_at REAL NOT NULL, updated_at REAL NOT NULL, sent_at REAL,"
+            " latency REAL, last_error TEXT)"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS outbox_due ON outbox (status, next_attempt_at)")
+
+        # Anything still 'sending' was interrupted by a crash. We can't know whether it went out,
+        # so it is parked as 'uncertain' rather than being sent a second time.
+        now = time.time()
+        recovered = self._db.execute(
+            "UPDATE outbox SET status = 'uncertain', updated_at = ?,"
+            " last_error = 'The app stopped while this email was being sent.' WHERE status = 'sending'",
+            (now,),
+        ).rowcount
+        if recovered:
+            print(f"Outbox: {recovered} email(s) were interrupted mid-send and are marked 'uncertain'.")
+
+    # Public API
+
+    def enqueue(self, recipient: str, subject: str, body: str, sender_email: str, sender_password: str,
+                transport: str | None = None, idempotency_key: str | None = None, on_done=None) -> tuple[int, bool]:
+        """
+        Durably queues one email and returns immediately.
+
+        Args:
+            recipient, subject, body (str): The email itself.
+            sender_email, sender_password (str): The account to send from (the password stays in memory only).
+            transport (str | None): "browser", "shared-browser" or "smtp" (defaults to the EMAIL_TRANSPORT setting).
+            idempotency_key (str | None): Emails with the same key are only sent once. Defaults to a hash of the email.
+            on_done (callable | None): Called as on_done(row_dict) from a worker thread when the email reaches
+                a final state ('sent', 'failed' or 'uncertain').
+
+        Returns:
+            tuple[int, bool]: The outbox id, and False if this key was already queued (nothing new was added).
+        """
+        key = idempotency_key or idempotency_key_for(sender_email, recipient, subject, body)
+        transport = transport or get_transport().name
+        now = time.time()
+        with self._lock:
+            self._remember_credentials(sender_email, sender_password, now)
+            cursor = self._db.execute(
+                "INSERT OR IGNORE INTO outbox (idempotency_key, sender, recipient, subject, body, transport, status,"
+                " next_attempt_at, created_at, updated_at) VALUES (?, ?, ?, ?, ?, ?, 'queued', ?, ?, ?)",
+                (key, sender_email, recipient, subject, body, transport, now, now, now),
+            )
+            created = cursor.rowcount == 1
+            row = self._db.execute("SELECT * FROM outbox WHERE idempotency_key = ?", (key,)).fetchone()
+            if on_done is not None:
+                if row["status"] in ("sent", "failed", "uncertain"):
+                    # Already finished earlier: report the existing outcome instead of sending again.
+                    threading.Thread(target=on_done, args=(dict(row),), daemon=True).start()
+                else:
+                    self._callbacks.setdefault(row["id"], []).append(on_done)
+            self._wakeup.notify_all()
+        if not created:
+            print(f"Outbox: this email is already in the outbox (id {row['id']}, status '{row['status']}'); not queuing it again.")
+        self.start()
+        return row["id"], created
+
+    def set_credentials(self, sender_email: str, sender_password: str) -> int:
+        """
+        Supplies a sender's password, e.g. after a restart, and resumes their emails that were waiting for it.
+
+        Returns:
+            int: How many 'needs_credentials' emails were queued again.
+        """
+        with self._lock:
+            resumed = self._remember_credentials(sender_email, sender_password, time.time())
+            self._wakeup.notify_all()
+        if resumed:
+            print(f"Outbox: resuming {resumed} email(s) from {sender_email} that were waiting for the password.")
+        self.start()
+        return resumed
+
+    def start(self):
+        """Starts the worker threads (a no-op if they are already running)."""
+        with self._lock:
+            self._stopping = False
+            self._threads = [t for t in self._threads if t.is_alive()]
+            for number in range(len(self._threads), self.workers):
+                thread = threading.Thread(target=self._work, name=f"outbox-worker-{number}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def stop(self, timeout: float = 5.0):
+        """Asks the workers to stop after their current send. Queued emails stay in the journal for next time."""
+        with self._lock:
+            self._stopping = True
+            self._wakeup.notify_all()
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(timeout=timeout)
+
+    def get(self, outbox_id: int) -> dict | None:
+        with self._lock:
+            row = self._db.execute("SELECT * FROM outbox WHERE id = ?", (outbox_id,)).fetchone()
+        return dict(row) if row else None
+
+    def resolve_uncertain(self, outbox_id: int, delivered: bool):
+        """
+        Settles an 'uncertain' email once someone has checked the Sent folder:
+        delivered=True marks it sent, delivered=False queues it to be sent again.
+        """
+        now = time.time()
+        with self._lock:
+            if delivered:
+                self._db.execute("UPDATE outbox SET status = 'sent', sent_at = ?, updated_at = ? WHERE id = ? AND status = 'uncertain'",
+                                 (now, now, outbox_id))
+            else:
+                self._db.execute("UPDATE outbox SET status = 'queued', next_attempt_at = ?, updated_at = ? WHERE id = ? AND status = 'uncertain'",
+                                 (now, now, outbox_id))
+                self._wakeup.notify_all()
+
+    def metrics(self) -> dict:
+        """Queue depth, outcome counts and recent send latency (seconds)."""
+        with self._lock:
+            counts = {row["status"]: row["n"] for row in self._db.execute("SELECT status, COUNT(*) AS n FROM outbox GROUP BY status")}
+            retries = self._db.execute("SELECT COALESCE(SUM(attempts - 1), 0) FROM outbox WHERE attempts > 1").fetchone()[0]
+            latencies = sorted(self._latencies)
+        def percentile(p):
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))] if latencies else None
+        return {
+            "queue_depth": counts.get("queued", 0),
+            "in_flight": counts.get("sending", 0),
+            "sent": counts.get("sent", 0),
+            "failed": counts.get("failed", 0),
+            "uncertain": counts.get("uncertain", 0),
+            "needs_credentials": counts.get("needs_credentials", 0),
+            "retries": retries,
+            "latency_p50": percentile(0.50),
+            "latency_p95": percentile(0.95),
+        }
+
+    # Worker internals
+
+    def _work(self):
+        while True:
+            with self._lock:
+                row = None
+                while not self._stopping:
+                    row, wait = self._claim_next()
+                    if row is not None:
+                        break
+                    self._wakeup.wait(timeout=wait)
+                if self._stopping:
+                    return
+                password = self._credentials[row["sender"]]
+            self._attempt(row, password)
+
+    def _remember_credentials(self, sender_email: str, sender_password: str, now: float) -> int:
+        """Keeps the password in memory and re-queues the sender's waiting emails. Caller holds the lock."""
+        self._credentials[sender_email] = sender_password
+        return self._db.execute(
+            "UPDATE outbox SET status = 'queued', next_attempt_at = ?, updated_at = ? WHERE sender = ? AND status = 'needs_credentials'",
+            (now, now, sender_email),
+        ).rowcount
+
+    def _claim_next(self):
+        """Picks the next due email whose sender is free and under its rate limit. Caller holds the lock."""
+        now = time.time()
+        wait = 1.0
+        # Senders that can't send right now are left out in the query itself, so however long one sender's
+        # backlog is, it never hides the emails of the others.
+        # One send at a time per sender keeps their emails in order (and one browser window busy at most).
+        blocked = set(self._in_flight_senders)
+        for sender in list(self._recent_sends):
+            limit_wait = self._rate_limit_wait(sender, now)
+            if limit_wait > 0:
+                blocked.add(sender)
+                wait = min(wait, limit_wait)
+        while True:
+            exclude = f" AND sender NOT IN ({', '.join('?' * len(blocked))})" if blocked else ""
+            row = self._db.execute(
+                f"SELECT * FROM outbox WHERE status = 'queued'{exclude} ORDER BY next_attempt_at, id LIMIT 1", tuple(blocked)
+            ).fetchone()
+            if row is None:
+                break
+            if row["next_attempt_at"] > now:
+                wait = min(wait, row["next_attempt_at"] - now)
+                break
+            if row["sender"] not in self._credentials:
+                # Queued before a restart: without the password they would only fail (or burn their retries).
+                waiting = self._db.execute(
+                    "UPDATE outbox SET status = 'needs_credentials', updated_at = ? WHERE status = 'queued' AND sender = ?",
+                    (now, row["sender"]),
+                ).rowcount
+                print(f"Outbox: {waiting} email(s) wait for the password of {row['sender']}; they are sent once that account sends again.")
+                continue
+            self._db.execute(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (now, row["id"]),
+            )
+            self._in_flight_senders.add(row["sender"])
+            self._recent_sends.setdefault(row["sender"], deque()).append(now)
+            return dict(row, attempts=row["attempts"] + 1), 0
+        return None, max(0.05, wait)
+
+    def _rate_limit_wait(self, sender, now):
+        if not self.sender_per_minute:
+            return 0
+        recent = self._recent_sends.setdefault(sender, deque())
+        while recent and now - recent[0] >= 60:
+            recent.popleft()
+        if len(recent) < self.sender_per_minute:
+            return 0
+        return 60 - (now - recent[0])
+
+    def _attempt(self, row, password):
+        started = time.perf_counter()
+        status, error, next_attempt_at = "sent", None, row["next_attempt_at"]
+        try:
+            # The idempotency key doubles as the Message-ID where the transport controls it (SMTP).
+            message_id = f"<{row['idempotency_key']}@{row['sender'].split('@')[-1]}>"
+            with span("outbox.send", transport=row["transport"], sender=row["sender"], attempt=row["attempts"],
+                      queued_ms=round(max(0.0, time.time() - row["created_at"]) * 1000, 3)):
+                get_transport(row["transport"]).send(row["recipient"], row["subject"], row["body"], row["sender"], password, message_id=message_id)
+        except AmbiguousSendError as e:
+            status, error = "uncertain", str(e)
+        except Exception as e:
+            error = str(e) or repr(e)
+            if row["attempts"] >= self.max_attempts:
+                status = "failed"
+            else:
+                status = "queued"
+                # Exponential backoff with jitter: 5s, 10s, 20s, ... capped at OUTBOX_BACKOFF_MAX.
+                delay = min(OUTBOX_BACKOFF_MAX, OUTBOX_BACKOFF_BASE * 2 ** (row["attempts"] - 1))
+                next_attempt_at = time.time() + delay * random.uniform(0.8, 1.2)
+        latency = time.perf_counter() - started
+
+        now = time.time()
+        with self._lock:
+            self._in_flight_senders.discard(row["sender"])
+            self._db.execute(
+                "UPDATE outbox SET status = ?, last_error = ?, next_attempt_at = ?, updated_at = ?, latency = ?,"
+                " sent_at = CASE WHEN ? = 'sent' THEN ? ELSE sent_at END WHERE id = ?",
+                (status, error, next_attempt_at, now, latency, status, now, row["id"]),
+            )
+            if status == "sent":
+                self._latencies.append(latency)
+            callbacks = self._callbacks.pop(row["id"], []) if status != "queued" else []
+            final_row = dict(self._db.execute("SELECT * FROM outbox WHERE id = ?", (row["id"],)).fetchone())
+            self._wakeup.notify_all()
+
+        if status == "queued":
+            print(f"Outbox: sending email {row['id']} failed (attempt {row['attempts']}/{self.max_attempts}): {error}. Retrying later.")
+        else:
+            print(f"Outbox: email {row['id']} to {row['recipient']} is now '{status}'" + (f": {error}" if error else "."))
+        for callback in callbacks:
+            try:
+                callback(final_row)
+            except Exception as e:
+                print(f"Outbox: a completion callback failed: {e}")
+
+_outbox = None
+_outbox_lock = threading.Lock()
+
+def get_outbox() -> Outbox:
+    """Returns the process-wide outbox, opening the journal (and resuming any queued emails) on first use."""
+    global _outbox
+    with _outbox_lock:
+        if _outbox is None:
+            _outbox = Outbox()
+            _outbox.start()
+        return _outbox
@@ -0,0 +1,311 @@
+# agent/profile_manager.py
+# Keeps the senders' browser profiles from growing without bound.
+# Every sender has a full Chromium profile folder (see agent/profiles.py). Besides the few files that hold the
+# login (cookies, local storage, preferences), it fills up with caches, a service worker and Gmail's offline
+# copy of the mailbox in IndexedDB. Chromium reads that folder on every launch, so a big profile makes every cold
+# send slower, and on a host with many accounts the disk fills up. This tool can:
+#
+#     python -m agent.profile_manager list                    # every profile, its size and how much is cache
+#     python -m agent.profile_manager prune --measure         # delete the caches, keep the login
+#     python -m agent.profile_manager prune --deep            # ... plus IndexedDB, service workers, file systems
+#     python -m agent.profile_manager slim --senders a@gmail.com
+#     python -m agent.profile_manager move --source .         # move ./profile_* under BROWSER_PROFILE_ROOT
+#
+# "slim" exports the login to the sender's storage_state JSON and deletes the whole folder. The next launch
+# starts from a fresh folder with the saved cookies and local storage put back in (launch_sender_context).
+# Google may treat that fresh browser as a new device and ask to confirm the login once. The shared-browser
+# transport only ever needs the JSON.
+# With --measure, each profile's launch time is measured (headless, median of --launch-runs launches) before
+# and after, next to its size. Profiles whose browser is open are skipped.
+
+import argparse
+import asyncio
+import json
+import os
+import shutil
+import socket
+import statistics
+import tempfile
+import time
+
+from agent.profiles import PROFILE_ROOT, load_storage_state, local_storage_script, safe_name
+
+PROFILE_PREFIX = "profile_"
+STORAGE_STATE_SUFFIX = ".storage_state.json"
+
+# Caches Chromium rebuilds on its own. None of them are needed to stay logged in.
+CACHE_PATHS = (
+    "Default/Cache", "Default/Code Cache", "Default/GPUCache", "Default/DawnCache", "Default/DawnGraphiteCache",
+    "Default/DawnWebGPUCache", "Default/Service Worker/CacheStorage", "Default/Service Worker/ScriptCache",
+    "Default/Shared Dictionary/cache", "Default/blob_storage", "ShaderCache", "GrShaderCache", "GraphiteDawnCache",
+    "component_crx_cache", "extensions_crx_cache", "Crashpad", "BrowserMetrics",
+)
+# Site data Gmail downloads again when it needs it (its offline mailbox, service worker and file systems).
+# The login is in the cookies and local storage, which are never touched. Only removed with deep=True.
+SITE_DATA_PATHS = ("Default/IndexedDB", "Default/Service Worker", "Default/File System")
+
+def _size(path: str) -> int:
+    """Bytes taken by a file or a folder tree (symlinks not followed)."""
+    if os.path.islink(path) or not os.path.exists(path):
+        return 0
+    if not os.path.isdir(path):
+        return os.path.getsize(path)
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.lstat(os.path.join(root, name)).st_size
+            except OSError:
+                pass
+    return total
+
+def _mb(size: int) -> float:
+    return round(size / (1024 * 1024), 1)
+
+def _prunable(profile_dir: str, deep: bool) -> list[str]:
+    paths = [os.path.join(profile_dir, *relative.split("/")) for relative in CACHE_PATHS + (SITE_DATA_PATHS if deep else ())]
+    existing = [path for path in paths if os.path.exists(path)]
+    # A folder inside one that is removed anyway (Service Worker/CacheStorage with --deep) is not counted twice.
+    return [path for path in existing if not any(path.startswith(other + os.sep) for other in existing)]
+
+def in_use(profile_dir: str) -> bool:
+    """
+    True while a Chromium has the profile open. Chromium leaves a SingletonLock link ("<host>-<pid>") in the
+    folder (a "lockfile" on Windows); a lock left behind by a crashed browser on this host is ignored.
+    """
+    lock = os.path.join(profile_dir, "SingletonLock")
+    if os.path.lexists(lock):
+        try:
+            host, _, pid = os.readlink(lock).rpartition("-")
+        except OSError:
+            return True
+        if host != socket.gethostname() or not pid.isdigit():
+            return True
+        try:
+            os.kill(int(pid), 0)
+        except ProcessLookupError:
+            return False
+        except OSError:
+            return True
+        return True
+    lockfile = os.path.join(profile_dir, "lockfile")
+    if os.path.exists(lockfile):
+        try:
+            # Windows keeps the file open (and undeletable) while the browser runs.
+            os.rename(lockfile, lockfile)
+        except OSError:
+            return True
+    return False
+
+def list_profiles(root: str = PROFILE_ROOT) -> list[dict]:
+    """
+    Every sender profile under 'root': its folder (if any), size, how much of it prune would free, and its
+    storage_state JSON (if exported). A profile slimmed down to its JSON has no folder.
+    """
+    names = set()
+    for entry in os.listdir(root) if os.path.isdir(root) else ():
+        if not entry.startswith(PROFILE_PREFIX):
+            continue
+        if entry.endswith(STORAGE_STATE_SUFFIX):
+            names.add(entry[:-len(STORAGE_STATE_SUFFIX)])
+        elif os.path.isdir(os.path.join(root, entry)):
+            names.add(entry)
+    profiles = []
+    for name in sorted(names):
+        profile_dir = os.path.join(root, name)
+        state_path = profile_dir + STORAGE_STATE_SUFFIX
+        has_dir = os.path.isdir(profile_dir)
+        profiles.append({
+            "profile": name,
+            "path": profile_dir if has_dir else None,
+            "size_mb": _mb(_size(profile_dir)),
+            "cache_mb": _mb(sum(_size(path) for path in _prunable(profile_dir, deep=False))) if has_dir else 0.0,
+            "site_data_mb": _mb(sum(_size(path) for path in _prunable(profile_dir, deep=True))) if has_dir else 0.0,
+            "storage_state": state_path if os.path.exists(state_path) else None,
+            "storage_state_kb": round(_size(state_path) / 1024, 1),
+            "in_use": has_dir and in_use(profile_dir),
+            "last_used": time.strftime("%Y-%m-%d %H:%M", time.localtime(os.path.getmtime(profile_dir))) if has_dir else None,
+        })
+    return profiles
+
+def prune(profile_dir: str, deep: bool = False) -> int:
+    """
+    Deletes the profile's caches (and with deep=True its site data too), keeping everything the login needs.
+
+    Returns:
+        int: The number of bytes freed.
+    """
+    freed = 0
+    for path in _prunable(profile_dir, deep):
+        size = _size(path)
+        try:
+            shutil.rmtree(path) if os.path.isdir(path) and not os.path.islink(path) else os.remove(path)
+        except OSError as e:
+            print(f"Could not delete {path}: {e}")
+            continue
+        freed += size
+    return freed
+
+async def _export(playwright, profile_dir: str, state_path: str):
+    context = await playwright.chromium.launch_persistent_context(user_data_dir=profile_dir, headless=True)
+    try:
+        await context.storage_state(path=state_path)
+    finally:
+        await context.close()
+
+async def _launch_seconds(playwright, profile_dir: str | None, saved_state: dict | None, runs: int) -> float:
+    """
+    Median seconds from launch to a usable page, for a profile folder, or for a fresh one with 'saved_state'
+    (cookies and local storage) put back in the way launch_sender_context does it.
+    """
+    samples = []
+    for _ in range(max(1, runs)):
+        fresh = tempfile.mkdtemp(prefix="profile_launch_") if profile_dir is None else None
+        started = time.perf_counter()
+        context = await playwright.chromium.launch_persistent_context(user_data_dir=profile_dir or fresh, headless=True)
+        try:
+            if saved_state:
+                await context.add_cookies(saved_state["cookies"])
+                script = local_storage_script(saved_state["origins"])
+                if script:
+                    await context.add_init_script(script=script)
+            page = context.pages[0] if context.pages else await context.new_page()
+            await page.goto("about:blank")
+            samples.append(time.perf_counter() - started)
+        finally:
+            await context.close()
+            if fresh:
+                shutil.rmtree(fresh, ignore_errors=True)
+    return round(statistics.median(samples), 3)
+
+async def _maintain(action: str, profiles: list[dict], deep: bool, measure: bool, runs: int) -> list[dict]:
+    from playwright.async_api import async_playwright
+
+    reports = []
+    async with async_playwright() as playwright:
+        for profile in profiles:
+            profile_dir, state_path = profile["path"], os.path.join(os.path.dirname(profile["path"]), profile["profile"] + STORAGE_STATE_SUFFIX)
+            report = {"profile": profile["profile"], "before_mb": profile["size_mb"]}
+            if measure:
+                report["launch_before_s"] = await _launch_seconds(playwright, profile_dir, None, runs)
+            if action == "prune":
+                prune(profile_dir, deep)
+                report["after_mb"] = _mb(_size(profile_dir))
+                if measure:
+                    report["launch_after_s"] = await _launch_seconds(playwright, profile_dir, None, runs)
+            else:
+                await _export(playwright, profile_dir, state_path)
+                saved_state = load_storage_state(state_path)
+                if not saved_state:
+                    report["skipped"] = "the exported storage_state has no cookies (not logged in?), so the profile was kept"
+                    reports.append(report)
+                    continue
+                shutil.rmtree(profile_dir)
+                report["after_mb"] = _mb(_size(state_path))
+                report["storage_state"] = state_path
+                if measure:
+                    report["launch_after_s"] = await _launch_seconds(playwright, None, saved_state, runs)
+            report["freed_mb"] = round(report["before_mb"] - report["after_mb"], 1)
+            reports.append(report)
+    return reports
+
+def maintain(action: str, root: str = PROFILE_ROOT, names: list[str] | None = None, deep: bool = False,
+             measure: bool = False, runs: int = 3) -> list[dict]:
+    """
+    Prunes or slims the profiles under 'root' (all of them, or just 'names').
+
+    Args:
+        action (str): "prune" (delete caches, see prune()) or "slim" (export storage_state, delete the folder).
+        root (str): Where the profiles are.
+        names (list[str] | None): Profile folder names (profile_<safe_email>) to work on; None for all.
+        deep (bool): For "prune": also delete IndexedDB, service workers and file systems.
+        measure (bool): Measure each profile's launch time before and after.
+        runs (int): Launches per measurement (the median is reported).
+
+    Returns:
+        list[dict]: Per profile: the size in MB (and launch seconds) before and after, or why it was skipped.
+    """
+    selected, reports = [], []
+    for profile in list_profiles(root):
+        if names is not None and profile["profile"] not in names:
+            continue
+        if profile["path"] is None:
+            reports.append({"profile": profile["profile"], "skipped": "already slimmed down to its storage_state JSON"})
+        elif profile["in_use"]:
+            reports.append({"profile": profile["profile"], "skipped": "its browser is open; close it first"})
+        elif action == "prune" and not measure:
+            # Nothing to launch, so no need for Playwright at all.
+            freed = prune(profile["path"], deep)
+            reports.append({"profile": profile["profile"], "before_mb": profile["size_mb"],
+                            "after_mb": _mb(_size(profile["path"])), "freed_mb": _mb(freed)})
+        else:
+            selected.append(profile)
+    if selected:
+        reports.extend(asyncio.run(_maintain(action, selected, deep, measure, runs)))
+    return sorted(reports, key=lambda report: report["profile"])
+
+def move(source: str, root: str = PROFILE_ROOT, names: list[str] | None = None) -> list[dict]:
+    """
+    Moves profile folders and their storage_state JSON files from 'source' (e.g. the old working directory)
+    to 'root'. Nothing is overwritten: a profile with either file already under 'root' stays where it is, whole.
+    """
+    if os.path.abspath(source) == os.path.abspath(root):
+        return []
+    os.makedirs(root, exist_ok=True)
+    reports = []
+    for profile in list_profiles(source):
+        name = profile["profile"]
+        if names is not None and name not in names:
+            continue
+        if profile["in_use"]:
+            reports.append({"profile": name, "skipped": "its browser is open; close it first"})
+            continue
+        moves = [(path, os.path.join(root, os.path.basename(path))) for path in (profile["path"], profile["storage_state"]) if path]
+        # Both targets are checked before anything moves, so a profile is never left half here, half there.
+        taken = [target for _, target in moves if os.path.lexists(target)]
+        if taken:
+            reports.append({"profile": name, "skipped": f"{' and '.join(taken)} already exist{'s' if len(taken) == 1 else ''}"})
+            continue
+        for path, target in moves:
+            shutil.move(path, target)
+        reports.append({"profile": name, "moved_to": [target for _, target in moves], "size_mb": profile["size_mb"]})
+    return reports
+
+def main():
+    parser = argparse.ArgumentParser(description="List, prune, slim or move the senders' browser profiles.")
+    parser.add_argument("action", choices=["list", "prune", "slim", "move"])
+    parser.add_argument("--root", default=PROFILE_ROOT, help="Where the profiles are (BROWSER_PROFILE_ROOT).")
+    parser.add_argument("--senders", help="Comma-separated sender emails to work on (default: all profiles).")
+    parser.add_argument("--deep", action="store_true", help="prune: also delete IndexedDB, service workers and file systems.")
+    parser.add_argument("--measure", action="store_true", help="prune/slim: measure launch time before and after.")
+    parser.add_argument("--launch-runs", type=int, default=3, help="Launches per measurement (the median is reported).")
+    parser.add_argument("--source", default=".", help="move: the folder the profiles are in now.")
+    parser.add_argument("--json", action="store_true", help="Print JSON instead of a table.")
+    args = parser.parse_args()
+
+    names = [PROFILE_PREFIX + safe_name(sender.strip()) for sender in args.senders.split(",")] if args.senders else None
+    if args.action == "list":
+        rows = [profile for profile in list_profiles(args.root) if names is None or profile["profile"] in names]
+    elif args.action == "move":
+        rows = move(args.source, args.root, names)
+    else:
+        rows = maintain(args.action, args.root, names, args.deep, args.measure, args.launch_runs)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    if not rows:
+        print(f"No profiles found under {os.path.abspath(args.source if args.action == 'move' else args.root)}.")
+        return
+    columns = [column for column in rows[0] if column != "path"]
+    for row in rows[1:]:
+        columns += [column for column in row if column not in columns and column != "path"]
+    widths = [max(len(column), *(len(str(row.get(column, ""))) for row in rows)) for column in columns]
+    print("  ".join(column.ljust(width) for column, width in zip(columns, widths)))
+    for row in rows:
+        print("  ".join(str(row.get(column, "")).ljust(width) for column, width in zip(columns, widths)))
+    if args.action in ("prune", "slim"):
+        freed = sum(row.get("freed_mb", 0) for row in rows)
+        print(f"\nFreed {freed:.1f} MB in total.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+# agent/profiles.py
+# Where each sender's browser data lives on disk.
+# Every sender gets their own persistent Chromium profile folder, plus (once exported) a small
+# storage_state JSON file holding just the cookies and local storage needed to stay logged in.
+# A profile slimmed down to that JSON gets both put back into a fresh folder on its next launch.
+# Both live under BROWSER_PROFILE_ROOT (the working directory by default). Listing, pruning, slimming and
+# moving them is done with agent/profile_manager.py.
+
+import json
+import os
+import re
+
+from agent.settings import getenv
+
+PROFILE_ROOT = getenv("BROWSER_PROFILE_ROOT", ".")
+
+def safe_name(sender_email: str) -> str:
+    """
+    Let's create a unique and safe folder name from the user's email address.
+    For example, 'user.name@example.com' becomes 'user_name_example_com'.
+    """
+    return re.sub(r'[^a-zA-Z0-9]', '_', sender_email)
+
+def profile_dir_for(sender_email: str) -> str:
+    """
+    Returns the persistent browser profile directory used for a sender.
+    This is the key to managing multiple accounts without them interfering with each other.
+    After that it will be accesed for further email automations.
+    """
+    return os.path.join(PROFILE_ROOT, f"profile_{safe_name(sender_email)}")
+
+def storage_state_path_for(sender_email: str) -> str:
+    """Returns where the sender's exported Playwright storage_state JSON is kept."""
+    return os.path.join(PROFILE_ROOT, f"profile_{safe_name(sender_email)}.storage_state.json")
+
+def load_storage_state(path: str) -> dict | None:
+    """The {"cookies": [...], "origins": [...]} saved in a storage_state JSON, or None if it holds no cookies."""
+    try:
+        with open(path, encoding="utf-8") as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        print(f"Could not read the saved login in {path}: {e}")
+        return None
+    if not isinstance(state, dict) or not state.get("cookies"):
+        return None
+    return {"cookies": state["cookies"], "origins": state.get("origins") or []}
+
+def slimmed_profile_state(sender_email: str) -> dict | None:
+    """
+    For a sender whose profile folder was slimmed down to its storage_state JSON (see agent/profile_manager.py):
+    the saved cookies and local storage, to put back into the fresh profile Chromium creates on the next launch.
+    None if the sender still has a profile folder or has no saved login.
+    """
+    path = storage_state_path_for(sender_email)
+    if os.path.isdir(profile_dir_for(sender_email)) or not os.path.exists(path):
+        return None
+    return load_storage_state(path)
+
+def local_storage_script(origins: list[dict]) -> str | None:
+    """
+    An init script that puts the saved local storage back (storage_state "origins"), for contexts that can't be
+    created with storage_state=, like a persistent one. It runs before the page's own scripts on every page of
+    a saved origin and only adds the keys the page doesn't have yet, so it never undoes what the site stores later.
+    None when there is nothing to restore.
+    """
+    saved = {origin["origin"]: origin.get("localStorage") or [] for origin in origins if origin.get("localStorage")}
+    if not saved:
+        return None
+    return ("(() => {\n"
+            f"  const items = ({json.dumps(saved)})[location.origin];\n"
+            "  if (!items) return;\n"
+            "  try {\n"
+            "    for (const {name, value} of items) {\n"
+            "      if (localStorage.getItem(name) === null) localStorage.setItem(name, value);\n"
+            "    }\n"
+            "  } catch (e) {}\n"
+            "})();")
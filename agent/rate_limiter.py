@@ -0,0 +1,71 @@
+# agent/rate_limiter.py
+# A small asyncio rate limiter for the Gemini API.
+# Gemini quotas are expressed as "requests per minute" and "tokens per minute", so we keep one
+# token bucket for each. A caller awaits acquire() before making a request and is only let through
+# once both buckets have room. A limit of 0 (or None) switches that bucket off.
+
+import asyncio
+import time
+
+def estimate_tokens(text: str) -> int:
+    """A rough token count (about 4 characters per token), good enough for rate limiting."""
+    return max(1, len(text) // 4)
+
+class _Bucket:
+    """A token bucket that refills continuously up to 'per_minute' units."""
+
+    def __init__(self, per_minute: float):
+        self.capacity = float(per_minute)
+        self.level = float(per_minute)
+        self.rate = per_minute / 60.0
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.level = min(self.capacity, self.level + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """How long to wait before 'amount' units are available (0 if they are available now)."""
+        self._refill()
+        # A single request bigger than the whole bucket is allowed through once the bucket is full,
+        # otherwise it would wait forever.
+        amount = min(amount, self.capacity)
+        if self.level >= amount:
+            return 0.0
+        return (amount - self.level) / self.rate
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.capacity)
+
+class AsyncRateLimiter:
+    """
+    Limits both requests per minute and (estimated) tokens per minute.
+
+    Args:
+        requests_per_minute (float | None): Max requests per minute, or 0/None for no limit.
+        tokens_per_minute (float | None): Max prompt tokens per minute, or 0/None for no limit.
+    """
+
+    def __init__(self, requests_per_minute: float | None = None, tokens_per_minute: float | None = None):
+        self._requests = _Bucket(requests_per_minute) if requests_per_minute else None
+        self._tokens = _Bucket(tokens_per_minute) if tokens_per_minute else None
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 1):
+        """Waits until one request of 'tokens' size fits inside both limits, then reserves it."""
+        # The lock keeps waiters in FIFO order so a big request can't be starved by small ones.
+        async with self._lock:
+            while True:
+                wait = 0.0
+                if self._requests:
+                    wait = max(wait, self._requests.wait_time(1))
+                if self._tokens:
+                    wait = max(wait, self._tokens.wait_time(tokens))
+                if wait <= 0:
+                    break
+                await asyncio.sleep(wait)
+            if self._requests:
+                self._requests.take(1)
+            if self._tokens:
+                self._tokens.take(tokens)
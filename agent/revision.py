@@ -0,0 +1,130 @@
+# agent/revision.py
+# The context the model gets when the user asks for changes to a draft.
+# We used to nest the whole prompt again on every "No, I need changes":
+#   "Original topic: Original topic: ... Revision feedback: ... Revision feedback: ..."
+# so each round cost more tokens and time than the last, and the model never saw the draft it was
+# supposed to change, so it rewrote everything from scratch.
+# A RevisionContext keeps the pieces apart instead: the original request (plus any follow-up answers),
+# the latest draft, and a compacted list of feedback. It stays under a token budget, and each
+# revision is sent as "edit this draft". Every round's prompt size and latency is recorded.
+
+import time
+
+from agent.settings import getenv
+from agent.rate_limiter import estimate_tokens
+
+# The most prompt tokens the revision context (request + draft + feedback) may take up.
+REVISION_TOKEN_BUDGET = int(getenv("REVISION_TOKEN_BUDGET", "1500"))
+# Older feedback is shortened to this many characters before it is dropped entirely.
+_SHORTENED_FEEDBACK_CHARS = 120
+
+class RevisionContext:
+    """
+    Everything a revision needs, kept small.
+
+    Args:
+        request (str): The user's original request for the email.
+        token_budget (int): The most tokens the context may take up in a prompt.
+    """
+
+    def __init__(self, request: str, token_budget: int = REVISION_TOKEN_BUDGET):
+        self.request = request
+        self.details = []
+        self.draft = None
+        self.feedback = []
+        # How many older feedback items were dropped to stay in budget (the draft already reflects them).
+        self.dropped_feedback = 0
+        self.token_budget = token_budget
+        # One entry per model round: {"round", "kind", "prompt_tokens", "seconds", "ok"}.
+        self.rounds = []
+
+    def request_text(self) -> str:
+        """The request with any follow-up answers, in the same form the first draft is generated from."""
+        text = self.request
+        for detail in self.details:
+            text += f". Additional details: {detail}"
+        return text
+
+    def add_detail(self, answer: str):
+        """Records the user's answer to a follow-up question."""
+        self.details.append(answer)
+
+    def set_draft(self, draft: dict):
+        """Records the latest draft. Later revisions edit this one."""
+        self.draft = dict(draft)
+
+    def add_feedback(self, feedback: str):
+        """Adds one round of the user's feedback, then compacts the context back under budget."""
+        feedback = " ".join(feedback.split())
+        # Asking for the same change twice doesn't need to be said twice.
+        self.feedback = [item for item in self.feedback if item.lower() != feedback.lower()]
+        self.feedback.append(feedback)
+        self.compact()
+
+    def token_count(self) -> int:
+        return estimate_tokens(self.render())
+
+    def compact(self):
+        """
+        Shrinks the feedback list until the context fits the token budget. The latest draft already has the
+        earlier feedback applied, so older items are shortened first and then dropped (oldest first); the
+        newest feedback, the request and the draft itself are always kept.
+        """
+        for i in range(len(self.feedback) - 1):
+            if self.token_count() <= self.token_budget:
+                return
+            if len(self.feedback[i]) > _SHORTENED_FEEDBACK_CHARS:
+                self.feedback[i] = self.feedback[i][:_SHORTENED_FEEDBACK_CHARS].rstrip() + "..."
+        while len(self.feedback) > 1 and self.token_count() > self.token_budget:
+            self.feedback.pop(0)
+            self.dropped_feedback += 1
+
+    def render(self) -> str:
+        """The context as it appears in the revision prompt."""
+        lines = [f'Original request: "{self.request_text()}"']
+        if self.draft:
+            lines.append(f'Current draft subject: "{self.draft["subject"]}"')
+            lines.append(f'Current draft body:\n"""\n{self.draft["body"]}\n"""')
+        if self.dropped_feedback:
+            lines.append(f"({self.dropped_feedback} earlier change request(s) are already applied to the current draft.)")
+        if self.feedback:
+            lines.append("Changes requested so far (the last one is the newest; earlier ones are already applied):")
+            lines.extend(f"{i}. {item}" for i, item in enumerate(self.feedback, 1))
+        return "\n".join(lines)
+
+    def record_round(self, kind: str, prompt_tokens: int, seconds: float, ok: bool, quiet: bool = False):
+        """Records one model round and (unless quiet) prints its prompt size and latency."""
+        entry = {"round": len(self.rounds) + 1, "kind": kind, "prompt_tokens": prompt_tokens, "seconds": round(seconds, 3), "ok": ok}
+        self.rounds.append(entry)
+        if not quiet:
+            print(f"Revision round {entry['round']} ({kind}): {prompt_tokens} prompt tokens, {seconds:.2f}s.")
+        return entry
+
+    def to_dict(self) -> dict:
+        return {"request": self.request_text(), "feedback": list(self.feedback), "dropped_feedback": self.dropped_feedback,
+                "context_tokens": self.token_count(), "rounds": list(self.rounds)}
+
+def prompt_tokens_of(response, prompt: str) -> int:
+    """The prompt size Gemini reports for a response, or our estimate if it doesn't say."""
+    usage = getattr(response, "usage_metadata", None)
+    count = getattr(usage, "prompt_token_count", None)
+    return int(count) if count else estimate_tokens(prompt)
+
+class RevisionTimer:
+    """Measures one model round: `with RevisionTimer(context, "revise", prompt) as timer: ...; timer.response = r`."""
+
+    def __init__(self, context: RevisionContext, kind: str, prompt: str):
+        self.context = context
+        self.kind = kind
+        self.prompt = prompt
+        self.response = None
+        self.ok = False
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.context.record_round(self.kind, prompt_tokens_of(self.response, self.prompt),
+                                  time.perf_counter() - self.started, self.ok and exc_type is None)
+        return False
@@ -0,0 +1,510 @@
+# agent/server.py
+# Server mode: the conversation engine (agent/conversation.py) served over HTTP and WebSocket,
+# so one process can look after hundreds of users and drafts at the same time.
+# Every session is its own ConversationSession; the AI calls are awaited on one asyncio event loop
+# (sharing a concurrency limit and rate limiter) instead of tying up a thread per user.
+#
+#     python -m agent.server --port 8080
+#
+# HTTP (JSON in, JSON out):
+#   POST   /sessions                   -> starts a conversation
+#   GET    /sessions/<id>              -> its current state, draft and send results
+#   POST   /sessions/<id>/messages     {"text": ...}
+#   POST   /sessions/<id>/reject       {"feedback": ...}
+#   POST   /sessions/<id>/approve      {"sender_email": ..., "sender_password": ...}
+#   DELETE /sessions/<id>
+#   GET    /health
+#   GET    /metrics                    -> per-stage latency histograms in the Prometheus text format (agent/tracing.py)
+# Every session response is {"session": {...}, "steps": [{"messages": [...], "action": ..., "accepts_input": ...}, ...]}.
+#
+# WebSocket: GET /sessions/<id>/ws. Send {"type": "message", "text": ...}, {"type": "reject", "feedback": ...}
+# or {"type": "approve", "sender_email": ..., "sender_password": ...}; every step is pushed as it happens
+# as {"type": "step", ...}, and the final outcome of a queued email as {"type": "send_result", ...}.
+#
+# The server listens on 127.0.0.1 by default because sender passwords travel in the approve request;
+# put it behind a TLS-terminating proxy before exposing it anywhere else.
+
+# Core Libraries
+# asyncio: Runs the HTTP server and every conversation on one event loop.
+# The HTTP and WebSocket handling is deliberately minimal (standard library only) so server mode
+# needs no extra dependencies.
+
+import argparse
+import asyncio
+from abc import ABC, abstractmethod
+import base64
+import hashlib
+import json
+import os
+import struct
+import time
+from urllib.parse import urlsplit
+
+from agent.settings import getenv
+from agent.conversation import ConversationSession
+from agent.email_generator import (
+    DEFAULT_CONCURRENCY, DEFAULT_REQUESTS_PER_MINUTE, DEFAULT_TOKENS_PER_MINUTE, DEFAULT_REQUEST_TIMEOUT,
+    aanalyze_prompt_for_followup, agenerate_email_content, arevise_email_content,
+)
+from agent.rate_limiter import AsyncRateLimiter
+from agent.tracing import get_tracer
+
+SERVER_HOST = getenv("SERVER_HOST", "127.0.0.1")
+SERVER_PORT = int(getenv("SERVER_PORT", "8080"))
+# New sessions are refused (503) beyond this many open ones.
+SERVER_MAX_SESSIONS = int(getenv("SERVER_MAX_SESSIONS", "1000"))
+# Sessions nobody has touched for this long are dropped (seconds).
+SERVER_SESSION_TTL = float(getenv("SERVER_SESSION_TTL", "1800"))
+MAX_BODY_BYTES = 1024 * 1024
+
+_WEBSOCKET_GUID = "258EAFA5-E914-47DA-95CA-C5AB0DC85B11"
+_REASONS = {200: "OK", 201: "Created", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+            409: "Conflict", 413: "Payload Too Large", 502: "Bad Gateway", 503: "Service Unavailable"}
+
+class HttpError(Exception):
+    def __init__(self, status: int, message: str):
+        super().__init__(message)
+        self.status = status
+
+class WebSocketError(Exception):
+    """A protocol problem on an upgraded connection; answered with a close frame carrying 'code' (RFC 6455, 7.4.1)."""
+
+    def __init__(self, code: int, message: str):
+        super().__init__(message)
+        self.code = code
+
+# Backends: where the AI answers and the sends come from
+
+class ModelBackend(ABC):
+    """The AI calls a conversation needs. The server awaits these; benchmarks swap in a fake one."""
+
+    @abstractmethod
+    async def analyze(self, prompt: str) -> str | None:
+        """The follow-up question for the prompt, or None when nothing is missing."""
+
+    @abstractmethod
+    async def generate(self, user_name: str, prompt: str, regenerate: bool = False) -> dict | None:
+        """A new draft ({"subject": ..., "body": ...}), or None on failure."""
+
+    @abstractmethod
+    async def revise(self, user_name: str, context) -> dict | None:
+        """Edits context.draft with the feedback in the RevisionContext (and records the round on it)."""
+
+class GeminiBackend(ModelBackend):
+    """The real model, through the async API in agent/email_generator.py, with one shared concurrency limit and rate limiter."""
+
+    def __init__(self, concurrency: int = DEFAULT_CONCURRENCY, requests_per_minute: float | None = DEFAULT_REQUESTS_PER_MINUTE,
+                 tokens_per_minute: float | None = DEFAULT_TOKENS_PER_MINUTE, timeout: float | None = DEFAULT_REQUEST_TIMEOUT):
+        self.limiter = AsyncRateLimiter(requests_per_minute, tokens_per_minute)
+        self.semaphore = asyncio.Semaphore(max(1, concurrency))
+        self.timeout = timeout
+
+    async def analyze(self, prompt):
+        async with self.semaphore:
+            return await aanalyze_prompt_for_followup(prompt, self.limiter, self.timeout)
+
+    async def generate(self, user_name, prompt, regenerate=False):
+        async with self.semaphore:
+            return await agenerate_email_content(user_name, prompt, self.limiter, self.timeout, regenerate=regenerate)
+
+    async def revise(self, user_name, context):
+        async with self.semaphore:
+            return await arevise_email_content(user_name, context, self.limiter, self.timeout)
+
+async def outbox_sender(session: ConversationSession, sender_email: str, sender_password: str, on_done) -> str:
+    """
+    The default way to send an approved draft: queue it in the durable outbox (agent/outbox.py).
+    The draft id is the idempotency key, so approving the same draft twice sends it once.
+    """
+    # Imported here so the outbox (and its worker threads) only start once something is actually sent.
+    from agent.outbox import get_outbox
+    draft = session.draft
+    outbox_id, _ = await asyncio.to_thread(
+        get_outbox().enqueue, session.data["recipient"], draft["subject"], draft["body"], sender_email, sender_password,
+        idempotency_key=session.draft_id, on_done=on_done,
+    )
+    return f"Perfect! Your email is queued (#{outbox_id}) and is being sent in the background."
+
+# WebSocket framing (RFC 6455), just what the server and the load test need
+
+def websocket_accept(key: str) -> str:
+    return base64.b64encode(hashlib.sha1((key + _WEBSOCKET_GUID).encode()).digest()).decode()
+
+def encode_ws_close(code: int = 1000, reason: str = "") -> bytes:
+    """A close frame with a status code and a short reason (control frames carry at most 125 bytes)."""
+    return encode_ws_frame(struct.pack("!H", code) + reason.encode("utf-8")[:123], 0x8)
+
+def encode_ws_frame(payload: bytes, opcode: int = 0x1, mask: bool = False) -> bytes:
+    """One unfragmented frame. Clients must mask their frames, servers must not."""
+    length = len(payload)
+    if length < 126:
+        header = struct.pack("!BB", 0x80 | opcode, (0x80 if mask else 0) | length)
+    elif length < 65536:
+        header = struct.pack("!BBH", 0x80 | opcode, (0x80 if mask else 0) | 126, length)
+    else:
+        header = struct.pack("!BBQ", 0x80 | opcode, (0x80 if mask else 0) | 127, length)
+    if not mask:
+        return header + payload
+    key = os.urandom(4)
+    return header + key + bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+
+async def read_ws_frame(reader: asyncio.StreamReader) -> tuple[bool, int, bytes]:
+    """Reads one frame and returns (is final fragment, opcode, unmasked payload)."""
+    first, second = await reader.readexactly(2)
+    length = second & 0x7F
+    if length == 126:
+        (length,) = struct.unpack("!H", await reader.readexactly(2))
+    elif length == 127:
+        (length,) = struct.unpack("!Q", await reader.readexactly(8))
+    if length > MAX_BODY_BYTES:
+        raise WebSocketError(1009, "WebSocket frame too large.")
+    key = await reader.readexactly(4) if second & 0x80 else None
+    payload = await reader.readexactly(length)
+    if key:
+        payload = bytes(b ^ key[i % 4] for i, b in enumerate(payload))
+    return bool(first & 0x80), first & 0x0F, payload
+
+async def read_ws_message(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> str | None:
+    """Reads one complete text message (joining fragments and answering pings). None when the peer closes."""
+    parts, size = [], 0
+    while True:
+        fin, opcode, payload = await read_ws_frame(reader)
+        if opcode == 0x8:
+            return None
+        if opcode == 0x9:
+            writer.write(encode_ws_frame(payload, 0xA))
+            continue
+        if opcode == 0xA:
+            continue
+        # Text (or binary) frames, possibly followed by continuation frames until the final one.
+        # Each frame is under MAX_BODY_BYTES on its own; the whole message has to be too.
+        size += len(payload)
+        if size > MAX_BODY_BYTES:
+            raise WebSocketError(1009, "WebSocket message too large.")
+        parts.append(payload)
+        if fin:
+            return b"".join(parts).decode("utf-8", "replace")
+
+class _ServedSession:
+    """A conversation plus what the server keeps next to it."""
+
+    def __init__(self, session: ConversationSession):
+        self.session = session
+        # One event at a time per conversation; different conversations run concurrently.
+        self.lock = asyncio.Lock()
+        self.subscribers = set()
+        self.send_results = []
+
+class ConversationServer:
+    """
+    Serves many independent conversations over HTTP and WebSocket.
+
+    Args:
+        backend (ModelBackend | None): Where drafts come from (defaults to GeminiBackend).
+        sender (callable | None): async sender(session, sender_email, sender_password, on_done) -> message.
+            Defaults to queueing in the outbox; on_done(row) may be called later from any thread.
+        max_sessions (int): The most sessions open at once.
+        session_ttl (float): Idle sessions are dropped after this many seconds.
+    """
+
+    def __init__(self, backend: ModelBackend | None = None, sender=None, max_sessions: int = SERVER_MAX_SESSIONS,
+                 session_ttl: float = SERVER_SESSION_TTL):
+        self.backend = backend or GeminiBackend()
+        self.sender = sender or outbox_sender
+        self.max_sessions = max_sessions
+        self.session_ttl = session_ttl
+        self.sessions = {}
+        self.stats = {"sessions_started": 0, "sessions_expired": 0, "requests": 0, "model_calls": 0, "drafts": 0, "sends": 0}
+        self._server = None
+        self._loop = None
+        self._sweeper = None
+
+    async def start(self, host: str = SERVER_HOST, port: int = SERVER_PORT) -> int:
+        """Starts listening and returns the port (useful with port=0)."""
+        self._loop = asyncio.get_running_loop()
+        # A generous listen backlog: with the default (100), a burst of new clients waits out TCP's 1 s SYN retry.
+        self._server = await asyncio.start_server(self._handle_connection, host, port, limit=MAX_BODY_BYTES, backlog=1024)
+        self._sweeper = asyncio.create_task(self._sweep_idle())
+        return self._server.sockets[0].getsockname()[1]
+
+    async def stop(self):
+        if self._sweeper:
+            self._sweeper.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    # The conversation side
+
+    def create_session(self) -> tuple[_ServedSession, dict]:
+        if len(self.sessions) >= self.max_sessions:
+            raise HttpError(503, "Too many open sessions, please try again later.")
+        served = _ServedSession(ConversationSession())
+        self.sessions[served.session.session_id] = served
+        self.stats["sessions_started"] += 1
+        return served, served.session.start().to_dict()
+
+    def get_session(self, session_id: str) -> _ServedSession:
+        served = self.sessions.get(session_id)
+        if served is None:
+            raise HttpError(404, f"No session '{session_id}'.")
+        return served
+
+    async def handle_event(self, served: _ServedSession, kind: str, payload: dict) -> list[dict]:
+        """Applies one user event to a session and runs the resulting actions. Returns every step taken."""
+        async with served.lock:
+            session = served.session
+            if kind == "message":
+                step = session.submit(str(payload.get("text", "")))
+            elif kind == "reject":
+                step = session.reject(payload.get("feedback"))
+            elif kind == "approve":
+                if session.state != "awaiting_decision":
+                    raise HttpError(409, f"There is no draft to approve (the conversation is '{session.state}').")
+                if not payload.get("sender_email") or not payload.get("sender_password"):
+                    raise HttpError(400, "'sender_email' and 'sender_password' are required.")
+                step = session.approve()
+            else:
+                raise HttpError(400, f"Unknown event '{kind}'.")
+            return await self._run_steps(served, step, payload)
+
+    async def _run_steps(self, served: _ServedSession, step, payload: dict) -> list[dict]:
+        """Carries out the actions a step asks for until the conversation waits on the user again."""
+        session = served.session
+        steps = []
+        while True:
+            steps.append(self._publish(served, step))
+            if step.action == "analyze":
+                question = await self._call_model(self.backend.analyze, session.data["prompt"])
+                step = session.on_analysis(question)
+            elif step.action == "generate":
+                draft = await self._call_model(self.backend.generate, session.data["user_name"], session.data["prompt"], step.regenerate)
+                if draft:
+                    self.stats["drafts"] += 1
+                step = session.on_draft(draft)
+            elif step.action == "revise":
+                draft = await self._call_model(self.backend.revise, session.data["user_name"], session.revision)
+                if draft:
+                    self.stats["drafts"] += 1
+                step = session.on_revision(draft)
+            elif step.action == "send":
+                try:
+                    message = await self.sender(session, payload["sender_email"], payload["sender_password"],
+                                                self._send_result_callback(served))
+                except Exception as e:
+                    print(f"Could not hand off the email for session {session.session_id}: {e}")
+                    self._publish(served, session.cancel_send())
+                    raise HttpError(502, f"The email could not be queued: {e}")
+                self.stats["sends"] += 1
+                step = session.on_sent(message)
+            else:
+                return steps
+
+    async def _call_model(self, call, *args):
+        self.stats["model_calls"] += 1
+        try:
+            return await call(*args)
+        except Exception as e:
+            # The engine treats a missing answer as "no follow-up" or "no draft" and tells the user.
+            print(f"Model call failed: {e!r}")
+            return None
+
+    def _publish(self, served: _ServedSession, step) -> dict:
+        data = step.to_dict()
+        if step.action == "review":
+            data["draft"] = served.session.draft
+        self._broadcast(served, {"type": "step", **data})
+        return data
+
+    def _send_result_callback(self, served: _ServedSession):
+        def on_done(row):
+            result = {"type": "send_result", "status": row["status"], "recipient": row["recipient"],
+                      "attempts": row["attempts"], "last_error": row["last_error"]}
+            # The outbox reports from its worker thread; everything else about the session lives on the loop.
+            self._loop.call_soon_threadsafe(self._record_send_result, served, result)
+        return on_done
+
+    def _record_send_result(self, served: _ServedSession, result: dict):
+        served.send_results.append(result)
+        self._broadcast(served, result)
+
+    def _broadcast(self, served: _ServedSession, message: dict):
+        frame = encode_ws_frame(json.dumps(message).encode("utf-8"))
+        for writer in list(served.subscribers):
+            if writer.is_closing():
+                served.subscribers.discard(writer)
+            else:
+                writer.write(frame)
+
+    def _session_view(self, served: _ServedSession) -> dict:
+        view = served.session.to_dict()
+        view["send_results"] = served.send_results
+        return view
+
+    async def _sweep_idle(self):
+        while True:
+            await asyncio.sleep(min(60.0, max(1.0, self.session_ttl / 4)))
+            cutoff = time.monotonic() - self.session_ttl
+            for session_id, served in list(self.sessions.items()):
+                if served.session.last_active < cutoff and not served.lock.locked() and not served.subscribers:
+                    del self.sessions[session_id]
+                    self.stats["sessions_expired"] += 1
+
+    # The HTTP side
+
+    async def _handle_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    return
+                method, path, headers, body = request
+                if headers.get("upgrade", "").lower() == "websocket":
+                    await self._handle_websocket(path, headers, reader, writer)
+                    return
+                self.stats["requests"] += 1
+                try:
+                    status, payload = await self._route(method, path, body)
+                except HttpError as e:
+                    status, payload = e.status, {"error": str(e)}
+                keep_alive = headers.get("connection", "").lower() != "close"
+                self._write_response(writer, status, payload, keep_alive)
+                await writer.drain()
+                if not keep_alive:
+                    return
+        except (asyncio.IncompleteReadError, ConnectionError):
+            return
+        except HttpError as e:
+            self._write_response(writer, e.status, {"error": str(e)}, keep_alive=False)
+        finally:
+            writer.close()
+
+    @staticmethod
+    async def _read_request(reader: asyncio.StreamReader):
+        request_line = await reader.readline()
+        if not request_line.strip():
+            return None
+        try:
+            method, target, _ = request_line.decode("latin-1").split(" ", 2)
+        except ValueError:
+            raise HttpError(400, "Malformed request line.")
+        headers = {}
+        while True:
+            line = await reader.readline()
+            if line in (b"\r\n", b"\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip()
+        try:
+            length = int(headers.get("content-length", "0") or 0)
+        except ValueError:
+            raise HttpError(400, "Malformed Content-Length header.")
+        if length < 0:
+            raise HttpError(400, "Malformed Content-Length header.")
+        if length > MAX_BODY_BYTES:
+            raise HttpError(413, "Request body too large.")
+        body = await reader.readexactly(length) if length else b""
+        return method.upper(), urlsplit(target).path, headers, body
+
+    @staticmethod
+    def _write_response(writer: asyncio.StreamWriter, status: int, payload: dict | str, keep_alive: bool = True):
+        # Everything is JSON except /metrics, which is already rendered as text.
+        if isinstance(payload, str):
+            body, content_type = payload.encode("utf-8"), "text/plain; version=0.0.4"
+        else:
+            body, content_type = json.dumps(payload).encode("utf-8"), "application/json"
+        head = (f"HTTP/1.1 {status} {_REASONS.get(status, 'Error')}\r\n"
+                f"Content-Type: {content_type}\r\n"
+                f"Content-Length: {len(body)}\r\n"
+                f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n")
+        writer.write(head.encode("latin-1") + body)
+
+    async def _route(self, method: str, path: str, body: bytes) -> tuple[int, dict | str]:
+        parts = [part for part in path.split("/") if part]
+        if parts == ["health"] and method == "GET":
+            return 200, {"sessions": len(self.sessions), "stats": self.stats}
+        if parts == ["metrics"] and method == "GET":
+            return 200, get_tracer().prometheus_text()
+        if parts == ["sessions"] and method == "POST":
+            served, step = self.create_session()
+            return 201, {"session": self._session_view(served), "steps": [step]}
+        if len(parts) < 2 or parts[0] != "sessions":
+            raise HttpError(404, f"No route for {path}.")
+        served = self.get_session(parts[1])
+        if len(parts) == 2:
+            if method == "GET":
+                return 200, {"session": self._session_view(served), "steps": []}
+            if method == "DELETE":
+                # Waits for an event that is still running on the session, so it isn't dropped halfway through.
+                async with served.lock:
+                    self.sessions.pop(parts[1], None)
+                return 200, {"deleted": parts[1]}
+            raise HttpError(405, f"{method} is not allowed on {path}.")
+        if len(parts) == 3 and method == "POST" and parts[2] in ("messages", "reject", "approve"):
+            try:
+                payload = json.loads(body or b"{}")
+            except ValueError:
+                raise HttpError(400, "The request body must be JSON.")
+            if not isinstance(payload, dict):
+                raise HttpError(400, "The request body must be a JSON object.")
+            kind = "message" if parts[2] == "messages" else parts[2]
+            steps = await self.handle_event(served, kind, payload)
+            return 200, {"session": self._session_view(served), "steps": steps}
+        raise HttpError(404, f"No route for {method} {path}.")
+
+    async def _handle_websocket(self, path: str, headers: dict, reader, writer):
+        parts = [part for part in path.split("/") if part]
+        if len(parts) != 3 or parts[0] != "sessions" or parts[2] != "ws" or "sec-websocket-key" not in headers:
+            raise HttpError(404, f"No WebSocket endpoint at {path}.")
+        served = self.get_session(parts[1])
+        writer.write(("HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                      f"Sec-WebSocket-Accept: {websocket_accept(headers['sec-websocket-key'])}\r\n\r\n").encode("latin-1"))
+        served.subscribers.add(writer)
+        try:
+            # A client that connects mid-conversation first gets where things stand.
+            writer.write(encode_ws_frame(json.dumps({"type": "session", **self._session_view(served)}).encode("utf-8")))
+            while True:
+                try:
+                    text = await read_ws_message(reader, writer)
+                except WebSocketError as e:
+                    # The connection is no longer HTTP, so the error goes out as a close frame.
+                    writer.write(encode_ws_close(e.code, str(e)))
+                    await writer.drain()
+                    return
+                if text is None:
+                    writer.write(encode_ws_frame(b"", 0x8))
+                    return
+                self.stats["requests"] += 1
+                try:
+                    event = json.loads(text)
+                    # Steps reach this socket through _broadcast as they happen, so the return value isn't needed.
+                    await self.handle_event(served, str(event.get("type")), event)
+                except HttpError as e:
+                    writer.write(encode_ws_frame(json.dumps({"type": "error", "status": e.status, "error": str(e)}).encode("utf-8")))
+                except (ValueError, AttributeError):
+                    writer.write(encode_ws_frame(json.dumps({"type": "error", "status": 400, "error": "Send JSON objects."}).encode("utf-8")))
+                await writer.drain()
+        finally:
+            served.subscribers.discard(writer)
+
+async def serve(host: str = SERVER_HOST, port: int = SERVER_PORT):
+    server = ConversationServer()
+    port = await server.start(host, port)
+    print(f"Email assistant server listening on http://{host}:{port}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the email assistant conversation over HTTP and WebSocket.")
+    parser.add_argument("--host", default=SERVER_HOST)
+    parser.add_argument("--port", type=int, default=SERVER_PORT)
+    args = parser.parse_args()
+    try:
+        asyncio.run(serve(args.host, args.port))
+    except KeyboardInterrupt:
+        pass
+
+if __name__ == "__main__":
+    main()
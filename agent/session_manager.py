@@ -0,0 +1,214 @@
+# agent/session_manager.py
+# This file keeps Chromium warm between sends.
+# Instead of launching a fresh persistent context (and loading Gmail) for every single email,
+# we keep one context + one inbox page open per sender profile and reuse it for the next send.
+# Idle sessions are closed automatically after a configurable time-to-live.
+
+# Core Libraries
+# threading / queue: Playwright's sync API is bound to the thread that started it, so one dedicated
+#                    worker thread owns the browser and every send is handed to it through a queue.
+# concurrent.futures.Future: Lets the calling thread (e.g. the UI's background thread) wait for its result.
+
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+from playwright.sync_api import sync_playwright, Error as PlaywrightError
+
+from agent.settings import getenv
+from agent.browser_automation import GMAIL_URL, launch_sender_context, ensure_logged_in, compose_and_send
+from agent.capture import SendCapture
+from agent.tracing import current_context, span
+
+# How long an unused browser window is kept open before we close it (seconds).
+DEFAULT_IDLE_TTL = float(getenv("BROWSER_SESSION_IDLE_TTL", "600"))
+# How often the worker wakes up to look for idle sessions when there is nothing to send.
+SWEEP_INTERVAL = 5.0
+
+class BrowserSession:
+    """One sender's warm browser: the persistent context plus its inbox page."""
+
+    def __init__(self, sender_email, context, page):
+        self.sender_email = sender_email
+        self.context = context
+        self.page = page
+        self.created_at = time.monotonic()
+        self.last_used = self.created_at
+        self.sends = 0
+
+    def is_healthy(self) -> bool:
+        """
+        A cheap health check: the page must still be open, responsive, and sitting on Gmail
+        with the Compose button available. Anything else means the session should be rebuilt.
+        """
+        try:
+            if self.page.is_closed():
+                return False
+            self.page.evaluate("1")
+            if not self.page.url.startswith(GMAIL_URL):
+                return False
+            return self.page.locator('div[gh="cm"]').count() > 0
+        except PlaywrightError:
+            return False
+
+    def close(self):
+        try:
+            self.context.close()
+        except PlaywrightError:
+            # The user may have closed the window by hand. That's fine, it's gone either way.
+            pass
+
+class BrowserSessionManager:
+    """
+    Owns a long-lived Playwright instance on a dedicated thread and keeps one warm
+    session per sender. Call send() from any thread; it blocks until the email is sent.
+    """
+
+    def __init__(self, idle_ttl: float = DEFAULT_IDLE_TTL):
+        self.idle_ttl = idle_ttl
+        self._sessions = {}
+        self._jobs = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+        # Per-send latency samples, split by whether the session was cold or warm.
+        self.latencies = {"cold": [], "warm": []}
+
+    # Public API (safe to call from any thread)
+
+    def send(self, recipient: str, subject: str, body: str, sender_email: str, sender_password: str) -> float:
+        """
+        Sends one email through the sender's warm session, creating it if needed.
+
+        Returns:
+            float: The wall-clock latency of this send in seconds.
+        """
+        return self.submit(self._send, recipient, subject, body, sender_email, sender_password).result()
+
+    def submit(self, fn, *args) -> Future:
+        """
+        Runs fn(manager, *args) on the browser thread and returns a Future for its result.
+        send() goes through here; anything else that needs a session page must too, because Playwright's
+        sync API may only be used from the thread that started it.
+        """
+        self._ensure_worker()
+        future = Future()
+        # The job runs in the caller's tracing context, so its spans are children of the caller's span.
+        self._jobs.put((fn, args, future, current_context(), time.perf_counter()))
+        return future
+
+    def session_for(self, sender_email: str, sender_password: str) -> BrowserSession:
+        """Returns a healthy, logged-in session. Must only be called on the browser thread."""
+        session = self._sessions.get(sender_email)
+        if session and not session.is_healthy():
+            print(f"Browser session for {sender_email} failed its health check. Rebuilding it...")
+            session.close()
+            session = None
+            del self._sessions[sender_email]
+
+        if session is None:
+            context = launch_sender_context(self._playwright, sender_email)
+            page = context.pages[0] if context.pages else context.new_page()
+            capture = SendCapture(page, f"login_{sender_email}")
+            try:
+                ensure_logged_in(page, sender_email, sender_password, capture)
+            except Exception as e:
+                capture.failure(e)
+                context.close()
+                raise
+            capture.success()
+            session = BrowserSession(sender_email, context, page)
+            self._sessions[sender_email] = session
+
+        session.last_used = time.monotonic()
+        return session
+
+    def close(self):
+        """Closes every session and stops the browser thread."""
+        with self._lock:
+            if self._thread is None:
+                return
+            thread = self._thread
+            self._thread = None
+        self._jobs.put(None)
+        thread.join(timeout=30)
+
+    # Browser-thread internals
+
+    def _ensure_worker(self):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="browser-sessions", daemon=True)
+                self._thread.start()
+
+    def _run(self):
+        with sync_playwright() as playwright:
+            self._playwright = playwright
+            try:
+                while True:
+                    try:
+                        job = self._jobs.get(timeout=SWEEP_INTERVAL)
+                    except queue.Empty:
+                        self._evict_idle()
+                        continue
+                    if job is None:
+                        break
+                    fn, args, future, context, queued = job
+                    if not future.set_running_or_notify_cancel():
+                        continue
+                    try:
+                        future.set_result(context.run(self._call, fn, args, queued))
+                    except BaseException as e:
+                        future.set_exception(e)
+                    self._evict_idle()
+            finally:
+                for session in self._sessions.values():
+                    session.close()
+                self._sessions.clear()
+
+    def _call(self, fn, args, queued):
+        with span("browser.job", job=getattr(fn, "__name__", "job"), queue_wait_ms=round((time.perf_counter() - queued) * 1000, 3)):
+            return fn(self, *args)
+
+    def _evict_idle(self):
+        now = time.monotonic()
+        for sender_email, session in list(self._sessions.items()):
+            if now - session.last_used > self.idle_ttl:
+                print(f"Closing idle browser session for {sender_email}.")
+                session.close()
+                del self._sessions[sender_email]
+
+    @staticmethod
+    def _send(manager, recipient, subject, body, sender_email, sender_password):
+        started = time.perf_counter()
+        kind = "warm" if sender_email in manager._sessions else "cold"
+        with span("send", transport="browser", sender=sender_email, warm=kind == "warm"):
+            session = manager.session_for(sender_email, sender_password)
+            capture = SendCapture(session.page, f"send_{sender_email}")
+            try:
+                compose_and_send(session.page, recipient, subject, body, capture)
+            except Exception as e:
+                print(f"An error occurred during the browser automation: {e}")
+                capture.failure(e)
+                # A failed send may leave a half-filled Compose window behind, so we start fresh next time.
+                session.close()
+                manager._sessions.pop(sender_email, None)
+                raise
+            capture.success()
+        session.sends += 1
+        session.last_used = time.monotonic()
+        latency = time.perf_counter() - started
+        manager.latencies[kind].append(latency)
+        print(f"Email sent via {kind} browser session in {latency:.2f}s.")
+        return latency
+
+_manager = None
+_manager_lock = threading.Lock()
+
+def get_session_manager() -> BrowserSessionManager:
+    """Returns the process-wide session manager, creating it on first use."""
+    global _manager
+    with _manager_lock:
+        if _manager is None:
+            _manager = BrowserSessionManager()
+        return _manager
@@ -0,0 +1,165 @@
+# agent/session_probe.py
+# Cheap login-state detection for a sender.
+# Before this, every send loaded the full Gmail inbox and then waited up to 7 seconds for the
+# Compose button just to find out whether we were logged in; logged-out senders always paid the
+# whole timeout. Now we:
+# 1. Look at the profile's stored Google session cookies on disk (no browser needed at all).
+# 2. Remember senders that recently reached the inbox ("known good") for a while.
+# 3. Once a page is open, race the inbox and login-form selectors instead of waiting on one of them.
+
+# Core Libraries
+# sqlite3: Chromium keeps its cookies in an SQLite file inside the profile directory. We only read the
+#          cookie names and expiry dates, which are stored unencrypted (the values themselves are not needed).
+
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from playwright.sync_api import Page, TimeoutError as PlaywrightTimeoutError
+
+from agent.settings import getenv
+from agent.profiles import profile_dir_for, storage_state_path_for
+
+# The cookies Google sets for a signed-in account. Any one of them (unexpired) means a session exists.
+SESSION_COOKIE_NAMES = ("SID", "__Secure-1PSID", "__Secure-3PSID", "SAPISID", "OSID")
+# Chromium stores cookie expiry as microseconds since 1601-01-01.
+_CHROME_EPOCH_OFFSET = 11644473600
+
+# How long a sender stays "known good" after reaching the inbox (seconds).
+KNOWN_GOOD_TTL = float(getenv("SESSION_KNOWN_GOOD_TTL", "1800"))
+KNOWN_GOOD_PATH = getenv("SESSION_KNOWN_GOOD_PATH", os.path.join(".cache", "known_good_sessions.json"))
+
+# Racing these tells us which page we landed on as soon as either one renders.
+INBOX_SELECTOR = 'div[gh="cm"]'
+LOGIN_SELECTOR = 'input[type="email"], input[type="password"]'
+# The Send button of an open compose window (the direct compose view has no inbox behind it).
+COMPOSE_SELECTOR = '[role="button"][aria-label^="Send"]'
+_READY_SELECTORS = {"inbox": INBOX_SELECTOR, "compose": COMPOSE_SELECTOR}
+
+def _chrome_cookie_files(profile_dir: str) -> list[str]:
+    # Newer Chromium builds keep the cookie file under Network/, older ones directly under Default/.
+    candidates = [os.path.join(profile_dir, "Default", "Network", "Cookies"), os.path.join(profile_dir, "Default", "Cookies")]
+    return [path for path in candidates if os.path.exists(path)]
+
+def stored_session_expiry(sender_email: str) -> float | None:
+    """
+    Returns when the sender's stored Google session cookie expires (a Unix timestamp, or
+    float('inf') for a browser-session cookie), or None if no session cookie is stored.
+    Checks the exported storage_state JSON first, then the Chromium profile's cookie database.
+    """
+    names = ",".join("?" * len(SESSION_COOKIE_NAMES))
+    best = None
+
+    state_path = storage_state_path_for(sender_email)
+    if os.path.exists(state_path):
+        try:
+            with open(state_path, encoding="utf-8") as f:
+                for cookie in json.load(f).get("cookies", []):
+                    if cookie.get("name") in SESSION_COOKIE_NAMES and cookie.get("domain", "").endswith("google.com"):
+                        expires = cookie.get("expires", -1)
+                        expires = float("inf") if expires is None or expires < 0 else float(expires)
+                        best = expires if best is None else max(best, expires)
+        except (OSError, ValueError) as e:
+            print(f"Could not read stored session state for {sender_email}: {e}")
+
+    for path in _chrome_cookie_files(profile_dir_for(sender_email)):
+        try:
+            # immutable=1 lets us read the file even while Chromium has it open, without taking any locks.
+            uri = f"file:{os.path.abspath(path)}?mode=ro&immutable=1"
+            with sqlite3.connect(uri, uri=True) as db:
+                rows = db.execute(
+                    f"SELECT expires_utc FROM cookies WHERE host_key LIKE '%google.com' AND name IN ({names})",
+                    SESSION_COOKIE_NAMES,
+                ).fetchall()
+        except sqlite3.Error as e:
+            print(f"Could not read the cookie store in {path}: {e}")
+            continue
+        for (expires_utc,) in rows:
+            expires = float("inf") if not expires_utc else expires_utc / 1_000_000 - _CHROME_EPOCH_OFFSET
+            best = expires if best is None else max(best, expires)
+    return best
+
+def has_stored_session(sender_email: str) -> bool:
+    """True if the sender's profile holds an unexpired Google session cookie."""
+    expiry = stored_session_expiry(sender_email)
+    return expiry is not None and expiry > time.time()
+
+class KnownGoodSessions:
+    """Remembers, per sender, that a send recently reached the inbox. Persisted to a small JSON file."""
+
+    def __init__(self, path: str | None = KNOWN_GOOD_PATH, ttl: float = KNOWN_GOOD_TTL):
+        self.path = path
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._until = {}
+        if path and os.path.exists(path):
+            try:
+                with open(path, encoding="utf-8") as f:
+                    self._until = json.load(f)
+            except (OSError, ValueError):
+                self._until = {}
+
+    def is_known_good(self, sender_email: str) -> bool:
+        with self._lock:
+            return self._until.get(sender_email, 0) > time.time()
+
+    def mark_good(self, sender_email: str):
+        with self._lock:
+            self._until[sender_email] = time.time() + self.ttl
+            self._save()
+
+    def forget(self, sender_email: str):
+        with self._lock:
+            if self._until.pop(sender_email, None) is not None:
+                self._save()
+
+    def _save(self):
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump(self._until, f)
+
+known_good_sessions = KnownGoodSessions()
+
+def expect_logged_in(sender_email: str) -> bool:
+    """Our best guess, without touching the browser, of whether this sender is already signed in."""
+    return known_good_sessions.is_known_good(sender_email) or has_stored_session(sender_email)
+
+# Timing of every login-state check (measured).
+# The old check waited a fixed 7 s for the Compose button whenever the sender was logged out. For a check that
+# did not end in the inbox, 7 s minus this check's time is therefore the most it can have saved. That is an
+# estimate against a constant, not a measurement of the old flow (which also loaded the full inbox first), so
+# it is kept and reported separately as an upper bound.
+OLD_FIXED_WAIT_SECONDS = 7.0
+probe_stats = {"checks": 0, "seconds": 0.0, "saved_seconds_upper_bound": 0.0}
+
+def record_check(state: str, seconds: float):
+    """Records how long one login-state check took, plus the upper-bound estimate of the time saved."""
+    bound = max(0.0, OLD_FIXED_WAIT_SECONDS - seconds) if state != "inbox" else 0.0
+    probe_stats["checks"] += 1
+    probe_stats["seconds"] += seconds
+    probe_stats["saved_seconds_upper_bound"] += bound
+    print(f"Login state '{state}' detected in {seconds:.2f}s"
+          + (f" (at most {bound:.2f}s less than the old fixed {OLD_FIXED_WAIT_SECONDS:g}s wait; an estimate, not measured)." if bound else "."))
+
+def detect_page_state(page: Page, timeout: float, target: str = "inbox") -> str:
+    """
+    Waits until either the inbox (or the compose view) or a login form renders, whichever comes first.
+
+    Args:
+        page (Page): The page that is loading Gmail (or the Google sign-in page).
+        timeout (float): The most we'll wait, in milliseconds.
+        target (str): What a logged-in page should show: "inbox" or "compose".
+
+    Returns:
+        str: 'target', "login" or "unknown" (neither appeared in time, e.g. a CAPTCHA or chooser page).
+    """
+    ready = _READY_SELECTORS[target]
+    try:
+        page.wait_for_selector(f"{ready}, {LOGIN_SELECTOR}", state="visible", timeout=timeout)
+    except PlaywrightTimeoutError:
+        return "unknown"
+    return target if page.locator(ready).count() > 0 else "login"
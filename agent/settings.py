@@ -0,0 +1,21 @@
+# agent/settings.py
+# One place to read configuration from the environment.
+# The .env file is loaded the first time any setting is read, so every module sees the same
+# values no matter which one happens to be imported first (the app, the bulk sender, a benchmark...).
+
+import os
+import threading
+
+_loaded = False
+_lock = threading.Lock()
+
+def getenv(name: str, default: str | None = None) -> str | None:
+    """Like os.getenv, but makes sure the project's .env file has been loaded first."""
+    global _loaded
+    if not _loaded:
+        with _lock:
+            if not _loaded:
+                from dotenv import load_dotenv
+                load_dotenv()
+                _loaded = True
+    return os.getenv(name, default)
@@ -0,0 +1,261 @@
+# agent/shared_browser.py
+# Sending from many accounts at once with ONE Chromium process.
+# The default browser transport gives every sender its own persistent profile, which means one full
+# Chromium per account, and Playwright's sync API only lets one flow run per thread. Here instead:
+# 1. Each sender's login is exported once from their ./profile_<safe_email> folder into a small
+#    storage_state JSON file (cookies + local storage), see export_storage_state.
+# 2. A single browser is launched with async Playwright, and each sender is restored into their own
+#    lightweight new_context(storage_state=...), which costs a few tabs' worth of memory instead of a browser.
+# 3. Sends for different senders run concurrently (up to a configurable limit); sends for the same
+#    sender run one after another on that sender's page.
+#
+# The first login of a new account still needs the normal visible browser flow (2FA/CAPTCHA are never
+# automated), so a sender without a stored session is reported as an error here instead of prompting.
+#
+# Use it with EMAIL_TRANSPORT=shared-browser in the .env file.
+
+# Core Libraries
+# playwright.async_api: The asyncio flavour of Playwright; one event loop can drive many pages at once.
+
+import asyncio
+import os
+import threading
+import time
+
+from playwright.async_api import async_playwright, Browser, BrowserContext, Page, Playwright, TimeoutError as PlaywrightTimeoutError, Error as PlaywrightError
+
+from agent.settings import getenv
+from agent.profiles import profile_dir_for, storage_state_path_for
+from agent.browser_automation import GMAIL_URL
+from agent.session_probe import INBOX_SELECTOR, LOGIN_SELECTOR, known_good_sessions
+from agent.transports import AmbiguousSendError, Transport
+from agent.tracing import span
+
+# How many sends (across all senders) may be in progress at the same time.
+SHARED_BROWSER_MAX_PARALLEL = int(getenv("SHARED_BROWSER_MAX_PARALLEL", "4"))
+# The shared browser is headless by default; set to 0 to watch it work.
+SHARED_BROWSER_HEADLESS = getenv("SHARED_BROWSER_HEADLESS", "1") != "0"
+
+class NotLoggedInError(Exception):
+    """The sender has no usable stored session, so they need to log in once with the visible browser flow."""
+
+async def export_storage_state(playwright: Playwright, sender_email: str, force: bool = False) -> str:
+    """
+    Exports the sender's login from their persistent profile folder into a storage_state JSON file.
+    Done once per sender; later runs reuse the file (and refresh it after sending).
+
+    Args:
+        playwright (Playwright): The running async Playwright instance.
+        sender_email (str): The account whose profile should be exported.
+        force (bool): Export again even if the file already exists.
+
+    Returns:
+        str: The path of the storage_state file.
+    """
+    path = storage_state_path_for(sender_email)
+    if os.path.exists(path) and not force:
+        return path
+    profile_dir = profile_dir_for(sender_email)
+    if not os.path.isdir(profile_dir):
+        raise NotLoggedInError(f"{sender_email} has no browser profile yet. Send once with EMAIL_TRANSPORT=browser to log in.")
+    print(f"Exporting the stored session of {sender_email} from {profile_dir}...")
+    context = await playwright.chromium.launch_persistent_context(user_data_dir=profile_dir, headless=True)
+    try:
+        await context.storage_state(path=path)
+    finally:
+        await context.close()
+    return path
+
+async def open_inbox(page: Page, sender_email: str):
+    """Opens Gmail and checks that the restored session lands in the inbox (not on a login form)."""
+    await page.goto(GMAIL_URL, wait_until="domcontentloaded", timeout=60000)
+    try:
+        await page.wait_for_selector(f"{INBOX_SELECTOR}, {LOGIN_SELECTOR}", state="visible", timeout=30000)
+    except PlaywrightTimeoutError:
+        pass
+    if await page.locator(INBOX_SELECTOR).count() == 0:
+        known_good_sessions.forget(sender_email)
+        raise NotLoggedInError(f"The stored session of {sender_email} is no longer valid. Send once with EMAIL_TRANSPORT=browser to log in again.")
+    known_good_sessions.mark_good(sender_email)
+
+async def compose_and_send(page: Page, recipient: str, subject: str, body: str):
+    """The async twin of browser_automation.compose_and_send (same locators, same confirmation check)."""
+    await page.get_by_role("button", name="Compose").click()
+    to_field = page.get_by_role("combobox", name="Recipients")
+    await to_field.wait_for(timeout=15000)
+    await to_field.fill(recipient)
+    await page.get_by_placeholder("Subject").fill(subject)
+    await page.get_by_role("textbox", name="Message Body").fill(body)
+    await page.get_by_role("button", name="Send ‪(Ctrl-Enter)‬").click()
+    try:
+        await page.get_by_text("Message sent").wait_for(timeout=15000)
+    except PlaywrightTimeoutError as e:
+        # Send was clicked, so the email may well be on its way. Retrying blindly could send it twice.
+        raise AmbiguousSendError("Send was clicked but Gmail never confirmed 'Message sent'.") from e
+
+class _AccountContext:
+    """One sender inside the shared browser: their context, their inbox page and a lock so sends take turns."""
+
+    def __init__(self, sender_email: str, context: BrowserContext, page: Page):
+        self.sender_email = sender_email
+        self.context = context
+        self.page = page
+        self.lock = asyncio.Lock()
+        self.sends = 0
+        self.last_used = time.monotonic()
+
+class SharedBrowserEngine:
+    """
+    One Chromium process, one lightweight context per sender, concurrent sends across senders.
+    All methods are coroutines and must run on the same event loop.
+
+    Args:
+        max_parallel (int): How many sends may be in progress at once (across all senders).
+        headless (bool): Whether the shared browser is hidden.
+    """
+
+    def __init__(self, max_parallel: int = SHARED_BROWSER_MAX_PARALLEL, headless: bool = SHARED_BROWSER_HEADLESS):
+        self.max_parallel = max_parallel
+        self.headless = headless
+        self._playwright = None
+        self._browser = None
+        self._accounts = {}
+        self._opening = {}
+        self._semaphore = None
+        self._start_lock = None
+        self.stats = {"contexts_opened": 0, "sends": 0, "failures": 0, "send_seconds": 0.0}
+
+    async def start(self) -> Browser:
+        if self._start_lock is None:
+            self._start_lock = asyncio.Lock()
+        async with self._start_lock:
+            if self._browser is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=self.headless)
+                self._semaphore = asyncio.Semaphore(max(1, self.max_parallel))
+        return self._browser
+
+    async def account(self, sender_email: str) -> _AccountContext:
+        """Returns the sender's context in the shared browser, restoring it from storage_state on first use."""
+        await self.start()
+        if sender_email in self._accounts:
+            return self._accounts[sender_email]
+        # Two sends for a new sender at the same moment must not open two contexts.
+        opening = self._opening.setdefault(sender_email, asyncio.Lock())
+        async with opening:
+            if sender_email not in self._accounts:
+                async with span("browser.new_context", sender=sender_email, shared=True):
+                    path = await export_storage_state(self._playwright, sender_email)
+                    context = await self._browser.new_context(storage_state=path)
+                    page = await context.new_page()
+                    try:
+                        await open_inbox(page, sender_email)
+                    except BaseException:
+                        await context.close()
+                        raise
+                self._accounts[sender_email] = _AccountContext(sender_email, context, page)
+                self.stats["contexts_opened"] += 1
+        return self._accounts[sender_email]
+
+    async def send(self, recipient: str, subject: str, body: str, sender_email: str) -> float:
+        """Sends one email from the sender's context and returns its latency in seconds."""
+        started = time.perf_counter()
+        async with span("send", transport="shared-browser", sender=sender_email, warm=sender_email in self._accounts):
+            await self.start()
+            # The sender's turn first, then a slot: sends queued behind one busy sender must not hold
+            # slots that other senders could use.
+            while True:
+                account = await self.account(sender_email)
+                async with account.lock:
+                    if self._accounts.get(sender_email) is not account:
+                        continue  # dropped after a failed send while this one waited; open it again
+                    async with self._semaphore:
+                        try:
+                            async with span("browser.compose_and_send", sender=sender_email):
+                                await compose_and_send(account.page, recipient, subject, body)
+                        except BaseException:
+                            self.stats["failures"] += 1
+                            # A failed send may leave a half-filled Compose window behind, so the context is rebuilt next time.
+                            await self._drop(sender_email)
+                            raise
+                    account.sends += 1
+                    account.last_used = time.monotonic()
+                    break
+        latency = time.perf_counter() - started
+        self.stats["sends"] += 1
+        self.stats["send_seconds"] += latency
+        print(f"Email from {sender_email} sent via the shared browser in {latency:.2f}s.")
+        return latency
+
+    async def send_many(self, jobs: list[dict]) -> list:
+        """
+        Sends many emails concurrently. Each job is {"recipient", "subject", "body", "sender_email"}.
+        Returns one latency (float) or exception per job, in order.
+        """
+        return await asyncio.gather(
+            *(self.send(job["recipient"], job["subject"], job["body"], job["sender_email"]) for job in jobs),
+            return_exceptions=True,
+        )
+
+    def open_accounts(self) -> list[str]:
+        return list(self._accounts)
+
+    async def close(self):
+        """Saves each sender's refreshed cookies back to storage_state, then shuts the browser down."""
+        for sender_email in list(self._accounts):
+            await self._drop(sender_email, save=True)
+        if self._browser is not None:
+            await self._browser.close()
+            self._browser = None
+        if self._playwright is not None:
+            await self._playwright.stop()
+            self._playwright = None
+
+    async def _drop(self, sender_email: str, save: bool = False):
+        account = self._accounts.pop(sender_email, None)
+        if account is None:
+            return
+        try:
+            if save:
+                await account.context.storage_state(path=storage_state_path_for(sender_email))
+            await account.context.close()
+        except PlaywrightError:
+            pass
+
+class SharedBrowserTransport(Transport):
+    """
+    The shared-browser engine behind the ordinary (blocking) Transport interface.
+    The engine lives on its own event loop thread; send() can be called from many threads at once
+    (e.g. the outbox workers), and sends for different senders then overlap in the one browser.
+    """
+
+    name = "shared-browser"
+
+    def __init__(self, max_parallel: int = SHARED_BROWSER_MAX_PARALLEL, headless: bool = SHARED_BROWSER_HEADLESS):
+        self.engine = SharedBrowserEngine(max_parallel, headless)
+        self._loop = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def _ensure_loop(self) -> asyncio.AbstractEventLoop:
+        with self._lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._thread = threading.Thread(target=self._loop.run_forever, name="shared-browser", daemon=True)
+                self._thread.start()
+            return self._loop
+
+    def send(self, recipient, subject, body, sender_email, sender_password, message_id=None):
+        # The password is not needed: the session comes from the stored storage_state.
+        future = asyncio.run_coroutine_threadsafe(self.engine.send(recipient, subject, body, sender_email), self._ensure_loop())
+        return future.result()
+
+    def close(self):
+        with self._lock:
+            loop, thread = self._loop, self._thread
+            self._loop = self._thread = None
+        if loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self.engine.close(), loop).result(timeout=60)
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join(timeout=10)
@@ -0,0 +1,95 @@
+# agent/speculation.py
+# Speculative drafting: run the follow-up analysis and the draft generation at the same time.
+# On the common path the analysis says NO_FOLLOWUP_NEEDED, and the draft is then already
+# (or almost) finished, which saves one full model round-trip before the user sees the draft.
+# If the analysis comes back with a question, the speculative draft is thrown away
+# (cancelled if it hasn't started yet) and we ask the question as before.
+# When the local follow-up classifier (agent/followup_classifier.py) already knows the answer, neither the
+# analysis call nor a doomed speculative draft is started.
+
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+from agent.settings import getenv
+from agent.email_generator import analyze_prompt_for_followup, generate_email_content, stream_email_content
+from agent.followup_classifier import FOLLOWUP_FAST_PATH, get_followup_classifier
+
+# Speculation is on by default. Set SPECULATIVE_GENERATION=0 in the .env file to turn it off
+# (it costs one wasted generation call whenever a follow-up question turns out to be needed).
+SPECULATION_ENABLED = getenv("SPECULATIVE_GENERATION", "1").lower() not in ("0", "false", "no")
+
+class SpeculativeDrafter:
+    """Runs analysis and generation in parallel and keeps track of how often the guess pays off."""
+
+    def __init__(self, max_workers: int = 4):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="speculative-draft")
+        self._lock = threading.Lock()
+        # hits: the speculative draft was used. misses: a follow-up was needed and the draft was discarded.
+        # cancelled: misses where the draft was cancelled before it cost a model call.
+        # local: requests the local classifier answered, so there was nothing to guess.
+        self.stats = {"hits": 0, "misses": 0, "cancelled": 0, "local": 0}
+
+    def analyze_and_draft(self, user_name: str, prompt: str, on_delta=None) -> tuple[str | None, Future | None]:
+        """
+        Starts generating the draft in the background, then runs the analysis in the calling thread.
+
+        Args:
+            user_name (str): The name of the user for the signature.
+            prompt (str): The user's raw request for the email.
+            on_delta (callable | None): If given, the draft is streamed and each piece of text is passed
+                to on_delta(field, text). Deltas from a discarded draft simply go nowhere useful.
+
+        Returns:
+            tuple: (follow_up_question, draft_future). When a question is needed the future is None,
+            otherwise the future resolves to the same value generate_email_content would return.
+        """
+        started = time.perf_counter()
+        local = get_followup_classifier().classify(prompt) if FOLLOWUP_FAST_PATH else None
+        if local is not None and local.is_local and local.needs_followup:
+            with self._lock:
+                self.stats["local"] += 1
+            print(f"Follow-up needed, answered locally ({local.reason}).")
+            return local.question, None
+        if on_delta is not None:
+            draft_future = self._executor.submit(stream_email_content, user_name, prompt, on_delta)
+        else:
+            draft_future = self._executor.submit(generate_email_content, user_name, prompt)
+        if local is not None and local.is_local:
+            with self._lock:
+                self.stats["local"] += 1
+            print(f"No follow-up needed, answered locally ({local.reason}).")
+            return None, draft_future
+        follow_up_question = analyze_prompt_for_followup(prompt)
+
+        with self._lock:
+            if follow_up_question:
+                self.stats["misses"] += 1
+                if draft_future.cancel():
+                    self.stats["cancelled"] += 1
+                draft_future = None
+            else:
+                self.stats["hits"] += 1
+                # Report how much of the draft was already done when the analysis finished.
+                analysis_time = time.perf_counter() - started
+                draft_future.add_done_callback(
+                    lambda _: print(f"Speculative draft ready {time.perf_counter() - started:.2f}s after the request "
+                                    f"(analysis took {analysis_time:.2f}s).")
+                )
+            print(f"Speculation hit rate so far: {self.hit_rate():.0%} ({self.stats})")
+        return follow_up_question, draft_future
+
+    def hit_rate(self) -> float:
+        total = self.stats["hits"] + self.stats["misses"]
+        return self.stats["hits"] / total if total else 0.0
+
+_drafter = None
+_drafter_lock = threading.Lock()
+
+def get_speculative_drafter() -> SpeculativeDrafter:
+    """Returns the process-wide drafter, creating it on first use."""
+    global _drafter
+    with _drafter_lock:
+        if _drafter is None:
+            _drafter = SpeculativeDrafter()
+        return _drafter
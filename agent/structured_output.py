@@ -0,0 +1,237 @@
+# agent/structured_output.py
+# Getting a clean {"subject", "body"} object out of the model.
+# Drafts are requested in Gemini's JSON mode with a response schema, so the model can only answer with
+# that object. For the times it still doesn't (structured output switched off, an older SDK, a model
+# that ignores it, or a streamed answer cut off by a deadline), parse_draft() repairs almost-valid JSON
+# locally instead of throwing the whole answer away: code fences, text around the object, trailing commas,
+# raw line breaks and unescaped quotes inside the body, and missing closing braces are all fixed up.
+# An answer that stops in the middle of the body is still rejected: that email would end mid-sentence.
+#
+#     parse_draft('```json\n{"subject": "Hi", "body": "Line one\nline two",}\n```')
+#     -> {"subject": "Hi", "body": "Line one\nline two"}
+
+import ast
+import json
+import threading
+
+from agent.settings import getenv
+from agent.tracing import annotate
+
+# Set to 0 to ask for plain text again (e.g. for a model that doesn't support JSON mode).
+STRUCTURED_OUTPUT = getenv("GEMINI_STRUCTURED_OUTPUT", "1").lower() not in ("0", "false", "no")
+
+# The shape of every draft, in the schema format the Gemini API expects.
+DRAFT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "subject": {"type": "STRING"},
+        "body": {"type": "STRING"},
+    },
+    "required": ["subject", "body"],
+}
+
+# Flipped off for the rest of the process the first time the API rejects structured output.
+_structured = STRUCTURED_OUTPUT
+_stats = {"strict": 0, "repaired": 0, "failed": 0}
+_stats_lock = threading.Lock()
+
+def draft_generation_config() -> dict | None:
+    """The generation_config for draft requests: JSON mode with DRAFT_SCHEMA, or None for plain text."""
+    if not _structured:
+        return None
+    return {"response_mime_type": "application/json", "response_schema": DRAFT_SCHEMA}
+
+def structured_output_rejected(error: BaseException) -> bool:
+    """
+    Whether 'error' is the API (or SDK) refusing the JSON-mode settings. If so, structured output is
+    switched off for the rest of the process and the caller should simply ask again without it.
+    """
+    global _structured
+    message = str(error).lower()
+    if not _structured or not any(word in message for word in ("response_mime_type", "response_schema", "mime type")):
+        return False
+    print(f"Structured output is not supported here, asking for plain JSON text instead ({error}).")
+    _structured = False
+    return True
+
+def parse_stats() -> dict:
+    """How many drafts parsed as-is, needed a repair, or could not be parsed at all."""
+    with _stats_lock:
+        return dict(_stats)
+
+def _count(outcome: str):
+    with _stats_lock:
+        _stats[outcome] += 1
+
+def parse_draft(response_text: str) -> dict:
+    """
+    Turns the model's answer into {"subject": ..., "body": ...}, repairing it if it is almost valid JSON.
+
+    Args:
+        response_text (str): The complete text of the model's answer.
+
+    Returns:
+        dict: The draft.
+
+    Raises:
+        ValueError: If there is no usable draft in the answer.
+    """
+    text = response_text.strip()
+    try:
+        draft = _as_draft(json.loads(text))
+        _count("strict")
+    except ValueError:
+        try:
+            draft = _as_draft(_load_repaired(text))
+        except ValueError:
+            _count("failed")
+            raise
+        _count("repaired")
+        annotate(repaired=True)
+    print("Draft generation successful.")
+    return draft
+
+def _load_repaired(text: str):
+    repaired, cut_off = _repair(text)
+    if cut_off:
+        # Closing the string would send an email that stops mid-sentence.
+        raise ValueError("The AI's response was cut off in the middle of the draft.")
+    try:
+        return json.loads(repaired)
+    except ValueError as e:
+        # Last resort: a Python-style dict with single quotes.
+        start, end = text.find("{"), text.rfind("}")
+        if start >= 0 and end > start:
+            try:
+                return ast.literal_eval(text[start:end + 1])
+            except (ValueError, SyntaxError, MemoryError, RecursionError):
+                pass
+        raise ValueError(f"No valid JSON object found in the AI's response ({e}).") from None
+
+def _as_draft(data) -> dict:
+    if isinstance(data, str):
+        # JSON that was encoded twice.
+        data = json.loads(data)
+    if isinstance(data, list) and data and isinstance(data[0], dict):
+        data = data[0]
+    if not isinstance(data, dict):
+        raise ValueError("The AI's response is not a JSON object.")
+    fields = {str(key).strip().lower(): value for key, value in data.items()}
+    subject, body = fields.get("subject"), fields.get("body")
+    if not isinstance(subject, str) or not isinstance(body, str) or not subject.strip() or not body.strip():
+        raise ValueError("Generated JSON is missing 'subject' or 'body'.")
+    return {"subject": subject.strip(), "body": body}
+
+def repair_json(text: str) -> str:
+    """
+    Best-effort repair of the first JSON object in 'text'. Everything before the first "{" (code fences,
+    "Here is your email:") and after the matching "}" is dropped. The result is not guaranteed to be valid.
+
+    Args:
+        text (str): The model's answer.
+
+    Returns:
+        str: The repaired JSON text.
+    """
+    return _repair(text)[0]
+
+def _repair(text: str) -> tuple[str, bool]:
+    """repair_json, plus whether the text ended in the middle of a string."""
+    start = text.find("{")
+    if start < 0:
+        raise ValueError("No JSON object found in the AI's response.")
+    out = []
+    closers = []
+    in_string = escaped = False
+    for i in range(start, len(text)):
+        ch = text[i]
+        if in_string:
+            if escaped:
+                out.append(ch)
+                escaped = False
+            elif ch == "\\":
+                out.append(ch)
+                escaped = True
+            elif ch == '"':
+                if _closes_string(text, i + 1):
+                    in_string = False
+                    out.append(ch)
+                else:
+                    out.append('\\"')  # A quotation inside the email text.
+            elif ch == "\n":
+                out.append("\\n")
+            elif ch == "\r":
+                out.append("\\r")
+            elif ch == "\t":
+                out.append("\\t")
+            elif ch < " ":
+                out.append(f"\\u{ord(ch):04x}")
+            else:
+                out.append(ch)
+        elif ch == '"':
+            if _last_token(out) in ('"', "}", "]"):
+                out.append(",")  # A missing comma between two fields.
+            in_string = True
+            out.append(ch)
+        elif ch in "{[":
+            closers.append("}" if ch == "{" else "]")
+            out.append(ch)
+        elif ch in "}]":
+            _drop_trailing_comma(out)
+            if closers:
+                out.append(closers.pop())
+            if not closers:
+                break
+        else:
+            out.append(ch)
+
+    cut_off = in_string
+    if in_string:
+        if escaped:
+            out.pop()
+        out.append('"')
+    repaired = "".join(out)
+    if not closers:
+        return repaired, cut_off
+    # Cut off in the middle of the object: close it in whichever way gives valid JSON.
+    tail = "".join(reversed(closers))
+    base = repaired.rstrip()
+    candidates = [base + tail, base.rstrip(",") + tail, base + ' ""' + tail, base + ': ""' + tail]
+    if base.endswith('"'):
+        # Drop a key that never got its value.
+        candidates.append(base[:base.rstrip('"').rfind('"')].rstrip().rstrip(",") + tail)
+    for candidate in candidates:
+        try:
+            json.loads(candidate)
+            return candidate, cut_off
+        except ValueError:
+            continue
+    return candidates[0], cut_off
+
+def _closes_string(text: str, i: int) -> bool:
+    """Whether the quote just before position i ends the string, judging by what follows it."""
+    j = i
+    while j < len(text) and text[j] in " \t\r\n":
+        j += 1
+    if j == len(text) or text[j] in ":}]":
+        return True
+    if text[j] == ",":
+        k = j + 1
+        while k < len(text) and text[k] in " \t\r\n":
+            k += 1
+        return k == len(text) or text[k] in '"}'
+    # The next field on a new line, without a comma in between.
+    return text[j] == '"' and "\n" in text[i:j]
+
+def _last_token(out: list[str]) -> str | None:
+    for token in reversed(out):
+        if not token.isspace():
+            return token
+    return None
+
+def _drop_trailing_comma(out: list[str]):
+    j = len(out) - 1
+    while j >= 0 and out[j].isspace():
+        j -= 1
+    if j >= 0 and out[j] == ",":
+        del out[j]
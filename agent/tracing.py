@@ -0,0 +1,343 @@
+# agent/tracing.py
+# Stage-level timing for everything that can make an email slow.
+# Each stage (follow-up analysis, generation, Chromium launch, the login-state probe, compose, waiting for
+# "Message sent", the whole send...) is recorded as a span with a duration and a few attributes
+# (sender, model, prompt size, cache hit...). Spans started inside another span become its children,
+# so one slow send can be taken apart stage by stage.
+#
+# Finished spans are handed to a background thread, which
+# - appends them to a JSONL file (TRACE_PATH, default .cache/traces/spans.jsonl), and
+# - keeps a per-stage latency histogram, written in the Prometheus text format to METRICS_PATH
+#   (default .cache/traces/metrics.prom) and served at /metrics in server mode.
+#
+# Summarize the recorded spans with:
+#
+#     python -m agent.tracing                       # p50/p95/p99 per stage
+#     python -m agent.tracing --by cache_hit        # ... split by an attribute
+#
+# Set TRACING=0 in the .env file to switch it all off.
+
+import argparse
+import asyncio
+import atexit
+import contextvars
+import functools
+import json
+import math
+import os
+import queue
+import threading
+import time
+import uuid
+
+from agent.settings import getenv
+
+TRACING_ENABLED = getenv("TRACING", "1").lower() not in ("0", "false", "no")
+TRACE_PATH = getenv("TRACE_PATH", os.path.join(".cache", "traces", "spans.jsonl"))
+METRICS_PATH = getenv("METRICS_PATH", os.path.join(".cache", "traces", "metrics.prom"))
+# The metrics file is rewritten at most this often (seconds).
+METRICS_INTERVAL = 5.0
+# Histogram bucket upper bounds, in seconds.
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 180.0)
+
+_current_span = contextvars.ContextVar("current_span", default=None)
+
+class Span:
+    """One timed stage. Use it through span(); set() adds attributes while it runs."""
+
+    def __init__(self, name: str, attributes: dict, parent=None):
+        self.name = name
+        self.attributes = dict(attributes)
+        self.trace_id = parent.trace_id if parent else uuid.uuid4().hex
+        self.span_id = uuid.uuid4().hex[:16]
+        self.parent_id = parent.span_id if parent else None
+        self.start_time = time.time()
+        self._started = time.perf_counter()
+        self.duration = None
+        self.status = "ok"
+        self.error = None
+
+    def set(self, **attributes):
+        self.attributes.update(attributes)
+        return self
+
+    def finish(self, error: BaseException | None = None):
+        self.duration = time.perf_counter() - self._started
+        if error is not None:
+            self.status = "error"
+            self.error = f"{type(error).__name__}: {error}"
+
+    def to_dict(self) -> dict:
+        return {"name": self.name, "trace_id": self.trace_id, "span_id": self.span_id, "parent_id": self.parent_id,
+                "start": round(self.start_time, 6), "duration_ms": round(self.duration * 1000, 3),
+                "status": self.status, "error": self.error, "attributes": self.attributes}
+
+class _NoSpan:
+    """What span() yields when tracing is off: accepts attributes and ignores them."""
+
+    def set(self, **attributes):
+        return self
+
+_NO_SPAN = _NoSpan()
+
+class span:
+    """
+    Records one stage: `with span("llm.generate", model=MODEL_NAME) as s: ...; s.set(cache_hit=True)`.
+    An exception inside the block marks the span as failed (and is re-raised).
+    """
+
+    def __init__(self, name: str, **attributes):
+        self.name = name
+        self.attributes = attributes
+        self._span = None
+        self._token = None
+
+    def __enter__(self):
+        if not TRACING_ENABLED:
+            return _NO_SPAN
+        self._span = Span(self.name, self.attributes, _current_span.get())
+        self._token = _current_span.set(self._span)
+        return self._span
+
+    def __exit__(self, exc_type, exc, tb):
+        if self._span is None:
+            return False
+        _current_span.reset(self._token)
+        self._span.finish(exc)
+        get_tracer().record(self._span)
+        return False
+
+    # The same object also works as "async with" for coroutines.
+    async def __aenter__(self):
+        return self.__enter__()
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return self.__exit__(exc_type, exc, tb)
+
+def traced(name: str, **attributes):
+    """Decorator form of span() for a whole function (sync or async)."""
+    def decorate(fn):
+        if asyncio.iscoroutinefunction(fn):
+            @functools.wraps(fn)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, **attributes):
+                    return await fn(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def annotate(**attributes):
+    """Adds attributes to the span that is currently running (if any)."""
+    current = _current_span.get()
+    if current is not None:
+        current.set(**attributes)
+
+def mark_failed(error: BaseException):
+    """Marks the current span as failed, for code that handles the error itself instead of raising it."""
+    current = _current_span.get()
+    if current is not None:
+        current.status = "error"
+        current.error = f"{type(error).__name__}: {error}"
+
+def current_context() -> contextvars.Context:
+    """A copy of the current context, to run work on another thread as a child of the current span."""
+    return contextvars.copy_context()
+
+class _Histogram:
+    def __init__(self):
+        self.buckets = [0] * len(LATENCY_BUCKETS)
+        self.count = 0
+        self.errors = 0
+        self.sum = 0.0
+
+    def observe(self, seconds: float, failed: bool):
+        self.count += 1
+        self.sum += seconds
+        self.errors += failed
+        for i, bound in enumerate(LATENCY_BUCKETS):
+            if seconds <= bound:
+                self.buckets[i] += 1
+
+class Tracer:
+    """Collects finished spans and writes them out on a background thread."""
+
+    def __init__(self, trace_path: str | None = TRACE_PATH, metrics_path: str | None = METRICS_PATH):
+        self.trace_path = trace_path
+        self.metrics_path = metrics_path
+        self._queue = queue.Queue()
+        self._histograms = {}
+        self._lock = threading.Lock()
+        self._thread = None
+        self._metrics_written = 0.0
+        self._dirty = False
+
+    def record(self, finished: Span):
+        """Queues a finished span; never blocks on disk."""
+        with self._lock:
+            self._histograms.setdefault(finished.name, _Histogram()).observe(finished.duration, finished.status != "ok")
+            self._dirty = True
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="tracing-writer", daemon=True)
+                self._thread.start()
+        self._queue.put(finished.to_dict())
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """Waits until every span recorded so far is written, and rewrites the metrics file."""
+        if self._thread is None or not self._thread.is_alive():
+            return True
+        done = threading.Event()
+        self._queue.put(done)
+        return done.wait(timeout)
+
+    def prometheus_text(self) -> str:
+        """The per-stage histograms in the Prometheus text exposition format."""
+        with self._lock:
+            snapshot = {name: (list(h.buckets), h.count, h.sum, h.errors) for name, h in sorted(self._histograms.items())}
+        lines = ["# HELP email_assistant_stage_duration_seconds How long each stage took.",
+                 "# TYPE email_assistant_stage_duration_seconds histogram"]
+        for name, (buckets, count, total, _) in snapshot.items():
+            for bound, value in zip(LATENCY_BUCKETS, buckets):
+                lines.append(f'email_assistant_stage_duration_seconds_bucket{{stage="{name}",le="{bound}"}} {value}')
+            lines.append(f'email_assistant_stage_duration_seconds_bucket{{stage="{name}",le="+Inf"}} {count}')
+            lines.append(f'email_assistant_stage_duration_seconds_sum{{stage="{name}"}} {total:.6f}')
+            lines.append(f'email_assistant_stage_duration_seconds_count{{stage="{name}"}} {count}')
+        lines.append("# HELP email_assistant_stage_errors_total Stages that ended with an error.")
+        lines.append("# TYPE email_assistant_stage_errors_total counter")
+        for name, (_, _, _, errors) in snapshot.items():
+            lines.append(f'email_assistant_stage_errors_total{{stage="{name}"}} {errors}')
+        return "\n".join(lines) + "\n"
+
+    def _run(self):
+        while True:
+            try:
+                items = [self._queue.get(timeout=METRICS_INTERVAL)]
+            except queue.Empty:
+                items = []
+            # Write everything that is waiting in one go.
+            while True:
+                try:
+                    items.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            spans = [item for item in items if isinstance(item, dict)]
+            waiters = [item for item in items if isinstance(item, threading.Event)]
+            if spans and self.trace_path:
+                try:
+                    os.makedirs(os.path.dirname(self.trace_path) or ".", exist_ok=True)
+                    with open(self.trace_path, "a", encoding="utf-8") as f:
+                        f.write("".join(json.dumps(s) + "\n" for s in spans))
+                except OSError as e:
+                    print(f"Could not write spans to {self.trace_path}: {e}")
+            if self._dirty and self.metrics_path and (waiters or time.monotonic() - self._metrics_written >= METRICS_INTERVAL):
+                self._write_metrics()
+            for waiter in waiters:
+                waiter.set()
+
+    def _write_metrics(self):
+        self._dirty = False
+        self._metrics_written = time.monotonic()
+        try:
+            os.makedirs(os.path.dirname(self.metrics_path) or ".", exist_ok=True)
+            temporary = self.metrics_path + ".tmp"
+            with open(temporary, "w", encoding="utf-8") as f:
+                f.write(self.prometheus_text())
+            # Replaced in one step, so a scraper never reads a half-written file.
+            os.replace(temporary, self.metrics_path)
+        except OSError as e:
+            print(f"Could not write metrics to {self.metrics_path}: {e}")
+
+_tracer = None
+_tracer_lock = threading.Lock()
+
+def get_tracer() -> Tracer:
+    """Returns the process-wide tracer, creating it on first use."""
+    global _tracer
+    with _tracer_lock:
+        if _tracer is None:
+            _tracer = Tracer()
+            atexit.register(_tracer.flush, 5.0)
+        return _tracer
+
+# The summary CLI
+
+def load_spans(path: str, since: float | None = None) -> list[dict]:
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue
+            if since is None or record.get("start", 0) >= since:
+                spans.append(record)
+    return spans
+
+def percentile(values: list[float], pct: float) -> float:
+    """The pct-th percentile (nearest rank) of a list of numbers."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, max(0, math.ceil(pct / 100 * len(ordered)) - 1))]
+
+def summarize(spans: list[dict], by: str | None = None, stage: str | None = None) -> list[dict]:
+    """Per-stage (and optionally per-attribute-value) count, error count and latency percentiles, in milliseconds."""
+    groups = {}
+    for record in spans:
+        if stage and not record["name"].startswith(stage):
+            continue
+        key = (record["name"], str(record.get("attributes", {}).get(by)) if by else None)
+        groups.setdefault(key, []).append(record)
+    rows = []
+    for (name, value), records in sorted(groups.items()):
+        durations = [r["duration_ms"] for r in records]
+        row = {"stage": name, "count": len(records), "errors": sum(r.get("status") != "ok" for r in records),
+               "p50_ms": round(percentile(durations, 50), 1), "p95_ms": round(percentile(durations, 95), 1),
+               "p99_ms": round(percentile(durations, 99), 1), "max_ms": round(max(durations), 1)}
+        if by:
+            row = {"stage": name, by: value, **{k: v for k, v in row.items() if k != "stage"}}
+        rows.append(row)
+    return rows
+
+def main():
+    parser = argparse.ArgumentParser(description="Summarize recorded spans: p50/p95/p99 latency per stage.")
+    parser.add_argument("--path", default=TRACE_PATH, help="The spans JSONL file.")
+    parser.add_argument("--by", help="Also split each stage by this attribute (e.g. cache_hit, sender, transport).")
+    parser.add_argument("--stage", help="Only stages whose name starts with this (e.g. llm. or browser.).")
+    parser.add_argument("--last-hours", type=float, help="Only spans from the last N hours.")
+    parser.add_argument("--json", action="store_true", help="Print the summary as JSON.")
+    parser.add_argument("--prometheus", action="store_true", help="Print the recorded spans as Prometheus histograms instead.")
+    args = parser.parse_args()
+
+    if not os.path.exists(args.path):
+        raise SystemExit(f"No spans recorded yet at {args.path}.")
+    since = time.time() - args.last_hours * 3600 if args.last_hours else None
+    spans = load_spans(args.path, since)
+    if args.prometheus:
+        tracer = Tracer(None, None)
+        for record in spans:
+            tracer._histograms.setdefault(record["name"], _Histogram()).observe(record["duration_ms"] / 1000, record.get("status") != "ok")
+        print(tracer.prometheus_text(), end="")
+        return
+    rows = summarize(spans, args.by, args.stage)
+    if args.json:
+        print(json.dumps(rows, indent=2))
+        return
+    if not rows:
+        print("No matching spans.")
+        return
+    columns = list(rows[0])
+    widths = {c: max(len(c), *(len(str(r[c])) for r in rows)) for c in columns}
+    print("  ".join(c.ljust(widths[c]) for c in columns))
+    for row in rows:
+        print("  ".join(str(row[c]).ljust(widths[c]) for c in columns))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,340 @@
+# agent/transports.py
+# How an approved email actually gets delivered.
+# Every transport has the same small interface: send(recipient, subject, body, sender_email, sender_password).
+# 1. BrowserTransport: the original Playwright flow (through the warm BrowserSessionManager).
+# 2. SharedBrowserTransport (agent/shared_browser.py): one headless Chromium for all senders, each in its own
+#    lightweight context, so sends from different accounts run in parallel.
+# 3. SmtpTransport: plain SMTP (e.g. smtp.gmail.com with an App Password). It keeps authenticated
+#    connections open per sender in a small pool, sends many messages over each connection, and
+#    reconnects transparently when a connection drops. No browser is involved at all.
+#
+# The app picks one with EMAIL_TRANSPORT=browser (the default), shared-browser or smtp in the .env file.
+#
+# A transport raises AmbiguousSendError when it cannot tell whether the email went out (for example the
+# "Message sent" confirmation never appeared). Those must never be retried automatically, or the
+# recipient could get the same email twice.
+
+# Core Libraries
+# smtplib / email.message: The standard library's SMTP client and message builder.
+
+import queue
+import smtplib
+import ssl
+import threading
+import time
+from abc import ABC, abstractmethod
+from email.message import EmailMessage
+from email.utils import formatdate, make_msgid
+
+from agent.settings import getenv
+from agent.tracing import span
+
+DEFAULT_TRANSPORT = getenv("EMAIL_TRANSPORT", "browser").lower()
+SMTP_HOST = getenv("SMTP_HOST", "smtp.gmail.com")
+SMTP_PORT = int(getenv("SMTP_PORT", "587"))
+# "starttls" (port 587), "ssl" (port 465) or "none" (only for local test servers).
+SMTP_SECURITY = getenv("SMTP_SECURITY", "starttls").lower()
+SMTP_POOL_SIZE = int(getenv("SMTP_POOL_SIZE", "2"))
+# Servers limit how many messages one connection may carry, so we recycle connections before that.
+SMTP_MAX_MESSAGES_PER_CONNECTION = int(getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", "50"))
+# A connection idle for longer than this is checked with NOOP before it is reused (seconds).
+SMTP_IDLE_CHECK_AFTER = float(getenv("SMTP_IDLE_CHECK_AFTER", "30"))
+
+# The server answered and refused: the message was definitely not delivered, and sending it again won't help.
+_REJECTIONS = (smtplib.SMTPResponseException, smtplib.SMTPRecipientsRefused)
+
+def _connection_lost(error: BaseException) -> bool:
+    """
+    True when 'error' means the connection dropped or timed out. Every SMTPException is an OSError too,
+    but of those only SMTPServerDisconnected says the connection is gone.
+    """
+    if isinstance(error, smtplib.SMTPException):
+        return isinstance(error, smtplib.SMTPServerDisconnected)
+    return isinstance(error, OSError)
+
+class AmbiguousSendError(Exception):
+    """The send may or may not have been delivered, so it must not be retried blindly."""
+
+def build_message(recipient: str, subject: str, body: str, sender_email: str, message_id: str | None = None) -> EmailMessage:
+    """Builds a plain-text email ready for SMTP delivery."""
+    message = EmailMessage()
+    message["From"] = sender_email
+    message["To"] = recipient
+    message["Subject"] = subject
+    message["Date"] = formatdate(localtime=True)
+    message["Message-ID"] = message_id or make_msgid(domain=sender_email.split("@")[-1] or None)
+    message.set_content(body)
+    return message
+
+class Transport(ABC):
+    """The interface every delivery method implements."""
+
+    name = "base"
+
+    @abstractmethod
+    def send(self, recipient: str, subject: str, body: str, sender_email: str, sender_password: str, message_id: str | None = None) -> float:
+        """
+        Delivers one email and returns how long it took (seconds). Raises on failure, and raises
+        AmbiguousSendError if the email may have been delivered anyway. 'message_id' is used as the
+        Message-ID header where the transport controls it, so duplicates can be recognised downstream.
+        """
+
+    def close(self):
+        """Releases any open browsers or connections."""
+
+class BrowserTransport(Transport):
+    """Sends through Gmail's web UI with Playwright, reusing the warm per-sender browser sessions."""
+
+    name = "browser"
+
+    def send(self, recipient, subject, body, sender_email, sender_password, message_id=None):
+        # Gmail's web UI picks its own Message-ID, so 'message_id' is not used here.
+        # Imported here so Playwright is only loaded when the browser transport is actually used.
+        from agent.session_manager import get_session_manager
+        return get_session_manager().send(recipient, subject, body, sender_email, sender_password)
+
+    def close(self):
+        import sys
+        if "agent.session_manager" in sys.modules:
+            from agent.session_manager import get_session_manager
+            get_session_manager().close()
+
+class _PooledConnection:
+    def __init__(self, smtp):
+        self.smtp = smtp
+        self.messages_sent = 0
+        self.last_used = time.monotonic()
+
+class SmtpConnectionPool:
+    """
+    A pool of authenticated SMTP connections for one sender.
+    Connections are created lazily (up to 'size' at once) and handed back after each use.
+    """
+
+    def __init__(self, transport, sender_email: str, sender_password: str, size: int):
+        self.transport = transport
+        self.sender_email = sender_email
+        self.sender_password = sender_password
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(max(1, size))
+
+    def acquire(self) -> _PooledConnection:
+        """Returns a healthy connection, blocking while all 'size' connections are busy."""
+        self._slots.acquire()
+        try:
+            while True:
+                try:
+                    conn = self._idle.get_nowait()
+                except queue.Empty:
+                    return _PooledConnection(self.transport.connect(self.sender_email, self.sender_password))
+                if time.monotonic() - conn.last_used < SMTP_IDLE_CHECK_AFTER or self._is_alive(conn):
+                    return conn
+                self._discard(conn)
+        except BaseException:
+            self._slots.release()
+            raise
+
+    def release(self, conn: _PooledConnection, broken: bool = False):
+        """Gives a connection back to the pool (or closes it if it is broken or worn out)."""
+        try:
+            if broken or conn.messages_sent >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+                self._discard(conn)
+            else:
+                conn.last_used = time.monotonic()
+                self._idle.put(conn)
+        finally:
+            self._slots.release()
+
+    def close(self):
+        while True:
+            try:
+                self._discard(self._idle.get_nowait())
+            except queue.Empty:
+                return
+
+    @staticmethod
+    def _is_alive(conn) -> bool:
+        try:
+            return conn.smtp.noop()[0] == 250
+        except OSError:
+            # Dropped, timed out, or an error reply (SMTPException is an OSError): either way, don't reuse it.
+            return False
+
+    @staticmethod
+    def _discard(conn):
+        try:
+            conn.smtp.quit()
+        except OSError:
+            conn.smtp.close()
+
+class SmtpTransport(Transport):
+    """
+    Sends over SMTP with pooled, reused connections.
+
+    Args:
+        host (str): The SMTP server (smtp.gmail.com by default).
+        port (int): The SMTP port (587 for STARTTLS, 465 for SSL).
+        security (str): "starttls", "ssl" or "none".
+        pool_size (int): How many connections each sender may have open at once.
+        timeout (float): Socket timeout in seconds.
+    """
+
+    name = "smtp"
+
+    def __init__(self, host: str = SMTP_HOST, port: int = SMTP_PORT, security: str = SMTP_SECURITY,
+                 pool_size: int = SMTP_POOL_SIZE, timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.security = security
+        self.pool_size = pool_size
+        self.timeout = timeout
+        self._pools = {}
+        self._lock = threading.Lock()
+        self.stats = {"connections_opened": 0, "messages_sent": 0, "reconnects": 0}
+
+    def connect(self, sender_email: str, sender_password: str) -> smtplib.SMTP:
+        """Opens and authenticates one new connection."""
+        with span("smtp.connect", sender=sender_email, host=self.host, security=self.security):
+            if self.security == "ssl":
+                smtp = smtplib.SMTP_SSL(self.host, self.port, timeout=self.timeout, context=ssl.create_default_context())
+            else:
+                smtp = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+                if self.security == "starttls":
+                    smtp.starttls(context=ssl.create_default_context())
+            smtp.ehlo()
+            # Local test servers often don't offer AUTH at all, in which case there is nothing to log in to.
+            if sender_password and smtp.has_extn("auth"):
+                smtp.login(sender_email, sender_password)
+        with self._lock:
+            self.stats["connections_opened"] += 1
+        return smtp
+
+    def pool_for(self, sender_email: str, sender_password: str) -> SmtpConnectionPool:
+        with self._lock:
+            pool = self._pools.get(sender_email)
+            if pool is None or pool.sender_password != sender_password:
+                if pool is not None:
+                    pool.close()
+                pool = SmtpConnectionPool(self, sender_email, sender_password, self.pool_size)
+                self._pools[sender_email] = pool
+            return pool
+
+    def send(self, recipient, subject, body, sender_email, sender_password, message_id=None):
+        started = time.perf_counter()
+        with span("send", transport="smtp", sender=sender_email):
+            self.send_messages([build_message(recipient, subject, body, sender_email, message_id)], sender_email, sender_password)
+        return time.perf_counter() - started
+
+    def send_messages(self, messages: list[EmailMessage], sender_email: str, sender_password: str):
+        """
+        Sends several messages back-to-back over one pooled connection, which saves a
+        connect + TLS + AUTH handshake for every message after the first.
+        If the connection drops part-way through, the remaining messages are retried once on a fresh connection.
+        A message the server refuses (sender, recipients or content) is a definite failure and is raised as is.
+        """
+        pool = self.pool_for(sender_email, sender_password)
+        remaining = list(messages)
+        retried = False
+        while remaining:
+            conn = pool.acquire()
+            try:
+                while remaining:
+                    self._deliver(conn.smtp, remaining[0])
+                    conn.messages_sent += 1
+                    remaining.pop(0)
+                    with self._lock:
+                        self.stats["messages_sent"] += 1
+                    if conn.messages_sent >= SMTP_MAX_MESSAGES_PER_CONNECTION:
+                        break
+            except AmbiguousSendError:
+                pool.release(conn, broken=True)
+                raise
+            except _REJECTIONS:
+                pool.release(conn, broken=True)
+                raise
+            except OSError as e:
+                pool.release(conn, broken=True)
+                # A connection lost during DATA was raised as AmbiguousSendError above, so this one broke before
+                # the message content was handed over: it was not sent, and one retry on a fresh connection is safe.
+                if retried or not _connection_lost(e):
+                    raise
+                retried = True
+                with self._lock:
+                    self.stats["reconnects"] += 1
+                print(f"SMTP connection for {sender_email} dropped ({e}). Reconnecting...")
+                continue
+            except BaseException:
+                pool.release(conn, broken=True)
+                raise
+            pool.release(conn)
+
+    @staticmethod
+    def _deliver(smtp: smtplib.SMTP, message: EmailMessage):
+        """
+        One SMTP transaction (MAIL, RCPT, DATA), done step by step instead of with send_message so we know
+        where a failure happened: before DATA nothing was delivered, but a connection lost during DATA
+        leaves us unable to tell whether the server accepted the message.
+        """
+        smtp.ehlo_or_helo_if_needed()
+        code, response = smtp.mail(message["From"])
+        if code != 250:
+            smtp.rset()
+            raise smtplib.SMTPSenderRefused(code, response, message["From"])
+        recipients = [address.strip() for address in message["To"].split(",") if address.strip()]
+        refused = {}
+        for address in recipients:
+            code, response = smtp.rcpt(address)
+            if code not in (250, 251):
+                refused[address] = (code, response)
+        if len(refused) == len(recipients):
+            smtp.rset()
+            raise smtplib.SMTPRecipientsRefused(refused)
+        content = message.as_bytes(policy=message.policy.clone(linesep="\r\n"))
+        try:
+            code, response = smtp.data(content)
+        except _REJECTIONS:
+            # The server refused DATA outright (SMTPDataError): nothing was delivered.
+            raise
+        except OSError as e:
+            if not _connection_lost(e):
+                raise
+            raise AmbiguousSendError(f"The connection was lost while sending the message content: {e}") from e
+        if code != 250:
+            smtp.rset()
+            raise smtplib.SMTPDataError(code, response)
+
+    def close(self):
+        with self._lock:
+            pools, self._pools = list(self._pools.values()), {}
+        for pool in pools:
+            pool.close()
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+def get_transport(name: str | None = None) -> Transport:
+    """
+    Returns the process-wide transport with the given name ("browser", "shared-browser" or "smtp"),
+    defaulting to the EMAIL_TRANSPORT setting.
+    """
+    name = (name or DEFAULT_TRANSPORT).lower()
+    with _transports_lock:
+        if name not in _transports:
+            if name == "browser":
+                _transports[name] = BrowserTransport()
+            elif name == "shared-browser":
+                # Imported here so async Playwright is only loaded when this transport is actually used.
+                from agent.shared_browser import SharedBrowserTransport
+                _transports[name] = SharedBrowserTransport()
+            elif name == "smtp":
+                _transports[name] = SmtpTransport()
+            else:
+                raise ValueError(f"Unknown EMAIL_TRANSPORT '{name}'. Use 'browser', 'shared-browser' or 'smtp'.")
+        return _transports[name]
+
+def close_transports():
+    """Closes every transport that has been created."""
+    with _transports_lock:
+        transports = list(_transports.values())
+    for transport in transports:
+        transport.close()
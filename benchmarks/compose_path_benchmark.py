@@ -0,0 +1,87 @@
+# benchmarks/compose_path_benchmark.py
+# Compares the browser send paths of send_email_with_browser against the local Gmail stand-in
+# (benchmarks/fake_gmail.py), so no real account is needed and no email leaves the machine:
+#
+#   steps-debug  the old behaviour: inbox render, Compose click, typed fields, slow_mo=50, 2 s pause at the end
+#   steps        the same flow without slow motion and pause (BROWSER_SEND_PATH=steps)
+#   direct-all   the pre-filled compose view, every request allowed
+#   direct       the pre-filled compose view with images, fonts and analytics blocked (the default)
+#
+# Every send is a cold one-shot send (launch, send, close), like send_email_with_browser in the app.
+# It runs in a temporary folder, so the benchmark sender's profile never mixes with real ones.
+#
+#     python -m benchmarks.compose_path_benchmark --count 5
+#
+# Needs Playwright's Chromium (python -m playwright install chromium).
+
+import argparse
+import json
+import os
+import shutil
+import statistics
+import tempfile
+import time
+
+from benchmarks.fake_gmail import FakeGmail
+
+SENDER = "benchmark.sender@example.com"
+VARIANTS = {
+    # name: (BROWSER_SEND_PATH, BROWSER_BLOCK_RESOURCES, BROWSER_DEBUG)
+    "steps-debug": ("steps", False, True),
+    "steps": ("steps", False, False),
+    "direct-all": ("direct", False, False),
+    "direct": ("direct", True, False),
+}
+
+def run(count: int, variants: list[str], asset_delay: float) -> dict:
+    gmail = FakeGmail(asset_delay=asset_delay).start()
+    workdir = tempfile.mkdtemp(prefix="compose_bench_")
+    home = os.getcwd()
+    # The agent modules read these once, at import.
+    os.environ["GMAIL_BASE_URL"] = gmail.base_url
+    os.environ["BROWSER_HEADLESS"] = "1"
+    os.environ.setdefault("CAPTURE_MODE", "off")
+    os.environ.setdefault("TRACING", "0")
+    os.chdir(workdir)
+    try:
+        from playwright.sync_api import sync_playwright
+        from agent import browser_automation, session_probe
+        from agent.tracing import percentile
+
+        # The stand-in needs no login, so the sender counts as signed in.
+        session_probe.known_good_sessions.mark_good(SENDER)
+        results = {}
+        for name in variants:
+            browser_automation.SEND_PATH, browser_automation.BLOCK_RESOURCES, browser_automation.BROWSER_DEBUG = VARIANTS[name]
+            before = dict(gmail.requests)
+            latencies = []
+            for i in range(count):
+                started = time.perf_counter()
+                with sync_playwright() as playwright:
+                    browser_automation.send_email_with_browser(
+                        playwright, "you@example.com", f"{name} benchmark #{i + 1}",
+                        f"Hello,\n\nThis is benchmark email {i + 1}.\n\nBest regards", SENDER, "unused")
+                latencies.append(time.perf_counter() - started)
+            results[name] = {
+                "mean_s": round(statistics.mean(latencies), 3),
+                "p50_s": round(percentile(latencies, 50), 3),
+                "max_s": round(max(latencies), 3),
+                "asset_requests_per_send": round((gmail.requests["asset"] - before["asset"]) / count, 1),
+            }
+        delivered = [email["subject"] for email in gmail.sent]
+        return {"sends_per_variant": count, "delivered": len(delivered), "expected": count * len(variants), "variants": results}
+    finally:
+        os.chdir(home)
+        shutil.rmtree(workdir, ignore_errors=True)
+        gmail.close()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the direct compose send path against the step-by-step flow.")
+    parser.add_argument("--count", type=int, default=5, help="Sends per variant.")
+    parser.add_argument("--variants", default=",".join(VARIANTS), help="Comma-separated subset of: " + ", ".join(VARIANTS))
+    parser.add_argument("--asset-delay", type=float, default=0.15, help="Seconds the stand-in takes per image/font/analytics request.")
+    args = parser.parse_args()
+    print(json.dumps(run(args.count, args.variants.split(","), args.asset_delay), indent=2))
+
+if __name__ == "__main__":
+    main()
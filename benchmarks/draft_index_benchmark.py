@@ -0,0 +1,100 @@
+# benchmarks/draft_index_benchmark.py
+# Measures the approved-draft similarity index (agent/draft_index.py) at scale, with synthetic drafts:
+# how long adding, reloading from disk and looking up take with e.g. 100k stored drafts.
+# Everything happens in a temporary folder, so the real index is never touched.
+#
+#     python -m benchmarks.draft_index_benchmark --drafts 100000 --queries 500
+
+import argparse
+import json
+import random
+import shutil
+import tempfile
+import time
+
+from agent.draft_index import DraftIndex
+from agent.tracing import percentile
+
+_TEMPLATES = [
+    ("sick leave for {when} because of {reason}", "Leave request: {when}"),
+    ("request {n} days off {when} for {reason}", "Time off request for {when}"),
+    ("thank {name} for the {event} yesterday", "Thank you for the {event}"),
+    ("follow up with {name} about the {topic} proposal", "Following up on the {topic} proposal"),
+    ("schedule a meeting with {name} {when} to discuss {topic}", "Meeting to discuss {topic}"),
+    ("refund request for order {order} because it arrived {problem}", "Refund request for order {order}"),
+    ("congratulate {name} on the {event}", "Congratulations on the {event}"),
+    ("recommendation letter for {name} who worked on {topic}", "Recommendation for {name}"),
+    ("apologize to {name} for missing the {event}", "Apologies for missing the {event}"),
+    ("ask {name} for feedback on my {topic} presentation", "Feedback on the {topic} presentation"),
+]
+_VALUES = {
+    "when": ["tomorrow", "next monday", "friday", "the 12th", "next week", "today and tomorrow", "3rd to 5th june"],
+    "reason": ["a fever", "a family wedding", "a doctor's appointment", "moving house", "a personal emergency"],
+    "name": ["Priya", "Alex", "Rahul", "Maria", "Chen", "Fatima", "the hiring team", "my manager", "the client"],
+    "event": ["interview", "workshop", "promotion", "product launch", "team offsite", "webinar", "hackathon"],
+    "topic": ["Q3 budget", "marketing", "data pipeline", "pricing", "onboarding", "security audit", "roadmap"],
+    "order": [str(n) for n in range(10000, 10050)],
+    "problem": ["damaged", "late", "incomplete", "in the wrong size"],
+    "n": ["two", "three", "5"],
+}
+
+def synthetic_request(rng: random.Random) -> tuple[str, dict]:
+    prompt_template, subject_template = rng.choice(_TEMPLATES)
+    values = {key: rng.choice(options) for key, options in _VALUES.items()}
+    prompt = prompt_template.format(**values)
+    subject = subject_template.format(**values)
+    body = f"Hello,\n\n{prompt.capitalize()}. " + " ".join(rng.choice(_VALUES["topic"]) for _ in range(40)) + "\n\nBest regards"
+    return prompt, {"subject": subject, "body": body}
+
+def run(drafts: int, queries: int, seed: int) -> dict:
+    rng = random.Random(seed)
+    folder = tempfile.mkdtemp(prefix="draft_index_")
+    try:
+        index = DraftIndex(folder)
+        started = time.perf_counter()
+        for i in range(drafts):
+            prompt, draft = synthetic_request(rng)
+            index.add(prompt, draft, user_name=f"user{i % 20}")
+        add_seconds = time.perf_counter() - started
+        index.save()
+
+        started = time.perf_counter()
+        reloaded = DraftIndex(folder)
+        reload_seconds = time.perf_counter() - started
+
+        latencies, hits = [], 0
+        for _ in range(queries):
+            prompt, _ = synthetic_request(rng)
+            started = time.perf_counter()
+            matches = reloaded.search(prompt, k=3)
+            latencies.append((time.perf_counter() - started) * 1000)
+            hits += bool(matches) and matches[0]["score"] >= 0.5
+        filtered = []
+        for _ in range(min(queries, 100)):
+            prompt, _ = synthetic_request(rng)
+            started = time.perf_counter()
+            reloaded.search(prompt, k=2, user_name="user3", min_score=0.3)
+            filtered.append((time.perf_counter() - started) * 1000)
+        return {
+            "drafts": len(reloaded),
+            "add_ms_per_draft": round(add_seconds / max(1, drafts) * 1000, 3),
+            "reload_ms": round(reload_seconds * 1000, 1),
+            "search_p50_ms": round(percentile(latencies, 50), 3),
+            "search_p95_ms": round(percentile(latencies, 95), 3),
+            "search_p99_ms": round(percentile(latencies, 99), 3),
+            "per_user_search_p95_ms": round(percentile(filtered, 95), 3),
+            "suggestion_rate": round(hits / max(1, queries), 3),
+        }
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the approved-draft similarity index.")
+    parser.add_argument("--drafts", type=int, default=100000, help="How many synthetic drafts to index.")
+    parser.add_argument("--queries", type=int, default=500, help="How many lookups to time.")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    print(json.dumps(run(args.drafts, args.queries, args.seed), indent=2))
+
+if __name__ == "__main__":
+    main()
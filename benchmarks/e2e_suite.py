@@ -0,0 +1,291 @@
+# benchmarks/e2e_suite.py
+# Offline end-to-end benchmarks: the app's own code from typed request to delivered email, with Gemini replaced
+# by benchmarks/fake_model.py and Gmail by benchmarks/fake_gmail.py, so no API key or account is needed.
+#
+#   single    full conversations (recipient, name, request, follow-up answer when asked, draft, approve) each
+#             sent with a cold one-shot send_email_with_browser; the first one also signs in
+#   revision  one draft, then --rounds rounds of feedback and revision
+#   batch     --batch drafts generated at once (agenerate_many), then sent through the warm BrowserSessionManager
+#
+# Each scenario reports throughput, latency percentiles, the per-stage span summary (agent/tracing.py) and the
+# peak RSS of this process plus its Playwright driver and Chromium. The whole run is written to JSON (by default
+# .cache/benchmarks/e2e_<time>_<commit>.json), and two such files can be compared:
+#
+#     python -m benchmarks.e2e_suite --time-scale 0.1
+#     python -m benchmarks.e2e_suite --scenarios single,revision --no-browser
+#     python -m benchmarks.e2e_suite --compare .cache/benchmarks/e2e_a.json .cache/benchmarks/e2e_b.json
+#
+# --time-scale shrinks every simulated delay (model latency, Gmail's asset and boot times) alike; latencies are
+# reported in real seconds, so only compare runs made with the same settings. Everything runs in a temporary
+# folder (caches, outbox, traces, browser profiles), so nothing mixes with real data.
+# The browser parts need Playwright's Chromium (python -m playwright install chromium).
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import os
+import shutil
+import subprocess
+import tempfile
+import time
+
+from benchmarks.fake_gmail import FakeGmail
+from benchmarks.fake_model import FakeGenerativeModel
+from benchmarks.memory import PeakRssSampler, mb
+
+SCENARIOS = ("single", "revision", "batch")
+SENDER = "benchmark.sender@example.com"
+PASSWORD = "benchmark-password"
+REQUESTS = [
+    "ask my manager for two days of leave next week",
+    "thank the hiring team for yesterday's interview and ask about next steps",
+    "tell the client the delivery of order 4471 slips by one week and apologise",
+    "invite the team to a project retrospective on Friday afternoon",
+    "remind the landlord that the kitchen tap is still leaking",
+    "follow up with the vendor about the missing invoice for March",
+]
+FEEDBACK = ["Make it shorter.", "Sound a bit more formal.", "Mention that I'm happy to call.", "Add a clear deadline."]
+
+def _request(scenario: str, i: int) -> str:
+    # Numbered per scenario, so no scenario gets another one's drafts from the draft cache.
+    return f"{REQUESTS[i % len(REQUESTS)]} ({scenario} #{i + 1})"
+
+def _latency_stats(latencies: list[float], elapsed: float, done: int) -> dict:
+    from agent.tracing import percentile
+
+    return {
+        "completed": done,
+        "elapsed_s": round(elapsed, 3),
+        "throughput_per_min": round(done / elapsed * 60, 2) if elapsed else None,
+        "p50_s": round(percentile(latencies, 50), 3),
+        "p95_s": round(percentile(latencies, 95), 3),
+        "p99_s": round(percentile(latencies, 99), 3),
+        "max_s": round(max(latencies), 3) if latencies else 0.0,
+    }
+
+def _until_review(scenario: str, i: int):
+    """Starts a conversation, the way the desktop app drives one, and runs it until a draft is up for review."""
+    from agent.conversation import ConversationSession
+    from agent.email_generator import analyze_prompt_for_followup, generate_email_content
+
+    session = ConversationSession()
+    session.start()
+    session.submit("you@example.com")
+    session.submit("Alex Morgan")
+    step = session.submit(_request(scenario, i))
+    while step.action != "review":
+        if step.action == "analyze":
+            step = session.on_analysis(analyze_prompt_for_followup(session.data["prompt"]))
+        elif step.action == "generate":
+            step = session.on_draft(generate_email_content(session.data["user_name"], session.data["prompt"], step.regenerate))
+        elif session.state == "asking_followup":
+            step = session.submit("Next Monday and Tuesday, 10:00 in room 4.")
+        else:
+            raise RuntimeError(f"The conversation stopped in state '{session.state}'.")
+    return session
+
+def _cold_send(recipient: str, subject: str, body: str):
+    from playwright.sync_api import sync_playwright
+    from agent.browser_automation import send_email_with_browser
+
+    with sync_playwright() as playwright:
+        send_email_with_browser(playwright, recipient, subject, body, SENDER, PASSWORD)
+
+def single(count: int, browser: bool) -> dict:
+    latencies, done = [], 0
+    started = time.perf_counter()
+    for i in range(count):
+        began = time.perf_counter()
+        try:
+            session = _until_review("single", i)
+            session.approve()
+            if browser:
+                _cold_send(session.data["recipient"], session.draft["subject"], session.draft["body"])
+            session.on_sent("Sent.")
+            done += 1
+        except Exception as e:
+            print(f"Conversation {i + 1} failed: {e!r}")
+        latencies.append(time.perf_counter() - began)
+    return _latency_stats(latencies, time.perf_counter() - started, done)
+
+def revision(rounds: int) -> dict:
+    from agent.email_generator import revise_email_content
+
+    started = time.perf_counter()
+    session = _until_review("revision", 0)
+    first_draft = time.perf_counter() - started
+    latencies, done = [], 0
+    for i in range(rounds):
+        began = time.perf_counter()
+        session.reject(f"{FEEDBACK[i % len(FEEDBACK)]} (round {i + 1})")
+        before = session.draft_id
+        session.on_revision(revise_email_content(session.data["user_name"], session.revision))
+        latencies.append(time.perf_counter() - began)
+        done += session.draft_id != before
+    result = _latency_stats(latencies, time.perf_counter() - started - first_draft, done)
+    result["first_draft_s"] = round(first_draft, 3)
+    return result
+
+def batch(count: int, concurrency: int, browser: bool, spans_since: float) -> dict:
+    from agent.email_generator import agenerate_many
+    from agent.tracing import TRACE_PATH, get_tracer, load_spans
+
+    requests = [{"user_name": "Alex Morgan", "prompt": f"{_request('batch', i)}. Additional details: see the attached plan"}
+                for i in range(count)]
+    started = time.perf_counter()
+    drafts = asyncio.run(agenerate_many(requests, concurrency))
+    elapsed = time.perf_counter() - started
+    # Per-draft latencies (from its turn coming up to the parsed draft) come from the llm.generate spans.
+    get_tracer().flush(10)
+    latencies = [record["duration_ms"] / 1000 for record in load_spans(TRACE_PATH, spans_since) if record["name"] == "llm.generate"]
+    result = {"generation": _latency_stats(latencies, elapsed, sum(draft is not None for draft in drafts))}
+    if browser:
+        from agent.session_manager import BrowserSessionManager
+
+        manager = BrowserSessionManager()
+        sends, done = [], 0
+        started = time.perf_counter()
+        try:
+            for draft in drafts:
+                if draft is None:
+                    continue
+                try:
+                    sends.append(manager.send("you@example.com", draft["subject"], draft["body"], SENDER, PASSWORD))
+                    done += 1
+                except Exception as e:
+                    print(f"Batch send failed: {e!r}")
+        finally:
+            manager.close()
+        result["sending"] = _latency_stats(sends, time.perf_counter() - started, done)
+    return result
+
+def _commit() -> str:
+    try:
+        sha = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, timeout=10).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--untracked-files=no"], capture_output=True, text=True, timeout=10).stdout.strip()
+    except (OSError, subprocess.SubprocessError):
+        return "unknown"
+    return (sha or "unknown") + ("-dirty" if dirty else "")
+
+def run(scenarios: list[str], count: int, rounds: int, batch_size: int, concurrency: int, browser: bool,
+        time_scale: float, seed: int, verbose: bool = False) -> dict:
+    config = {"scenarios": scenarios, "count": count, "rounds": rounds, "batch": batch_size, "concurrency": concurrency,
+              "browser": browser, "time_scale": time_scale, "seed": seed}
+    commit = _commit()
+    gmail = FakeGmail(asset_delay=0.15 * time_scale, inbox_boot=1.2 * time_scale, compose_boot=0.3 * time_scale,
+                      compose_open=0.4 * time_scale, login_step=0.3 * time_scale, require_login=True, password=PASSWORD).start()
+    workdir = tempfile.mkdtemp(prefix="e2e_bench_")
+    home = os.getcwd()
+    # The agent modules read these once, at import. Deadlines and hedge delays shrink with the simulated time.
+    os.environ.update({
+        "GMAIL_BASE_URL": gmail.base_url,
+        "GMAIL_LOGIN_URL": gmail.login_url,
+        "BROWSER_HEADLESS": "1",
+        "TRACING": "1",
+        "GEMINI_REQUEST_TIMEOUT": str(60 * time_scale),
+        "GEMINI_ANALYSIS_TIMEOUT": str(20 * time_scale),
+        "LLM_HEDGE_DEFAULT_DELAY": str(8 * time_scale),
+        "LLM_HEDGE_MIN_DELAY": str(0.5 * time_scale),
+    })
+    os.environ.setdefault("CAPTURE_MODE", "off")
+    os.chdir(workdir)
+    try:
+        from agent.llm_client import use_model
+        from agent.tracing import TRACE_PATH, get_tracer, load_spans, summarize
+
+        model = FakeGenerativeModel(seed=seed, time_scale=time_scale)
+        use_model(model)
+        results = {}
+        for name in scenarios:
+            print(f"Running the '{name}' scenario...")
+            since = time.time()
+            calls_before = dict(model.calls)
+            sent_before = len(gmail.sent)
+            output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+            with PeakRssSampler() as memory, output:
+                if name == "single":
+                    result = single(count, browser)
+                elif name == "revision":
+                    result = revision(rounds)
+                else:
+                    result = batch(batch_size, concurrency, browser, since)
+            get_tracer().flush(10)
+            spans = load_spans(TRACE_PATH, since) if os.path.exists(TRACE_PATH) else []
+            result.update({
+                "peak_rss_mb": mb(memory.peak),
+                "model_calls": {kind: model.calls[kind] - calls_before[kind] for kind in model.calls},
+                "delivered": len(gmail.sent) - sent_before,
+                "stages": summarize(spans),
+            })
+            results[name] = result
+        return {"commit": commit, "started": time.strftime("%Y-%m-%dT%H:%M:%S"), "config": config, "scenarios": results}
+    finally:
+        os.chdir(home)
+        shutil.rmtree(workdir, ignore_errors=True)
+        gmail.close()
+
+def _flatten(value, prefix: str = "") -> dict:
+    """Numeric leaves by dotted path; stage rows are keyed by their stage name."""
+    if isinstance(value, dict):
+        items = value.items()
+    elif isinstance(value, list) and all(isinstance(row, dict) and "stage" in row for row in value):
+        items = ((row["stage"], {k: v for k, v in row.items() if k != "stage"}) for row in value)
+    else:
+        return {prefix: value} if isinstance(value, (int, float)) and not isinstance(value, bool) else {}
+    flat = {}
+    for key, item in items:
+        flat.update(_flatten(item, f"{prefix}.{key}" if prefix else str(key)))
+    return flat
+
+def compare(before: dict, after: dict) -> dict:
+    """The metrics of two runs side by side, with the relative change."""
+    if before.get("config") != after.get("config"):
+        print("Warning: the two runs used different settings; the numbers are not directly comparable.")
+    old, new = _flatten(before.get("scenarios", {})), _flatten(after.get("scenarios", {}))
+    rows = {}
+    for key in sorted(old.keys() | new.keys()):
+        a, b = old.get(key), new.get(key)
+        change = f"{(b - a) / a * 100:+.1f}%" if a and b is not None else None
+        rows[key] = {"before": a, "after": b, "change": change}
+    return {"before": before.get("commit"), "after": after.get("commit"), "metrics": rows}
+
+def main():
+    parser = argparse.ArgumentParser(description="Offline end-to-end benchmarks with a fake model and a fake Gmail.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS), help="Comma-separated subset of: " + ", ".join(SCENARIOS))
+    parser.add_argument("--count", type=int, default=5, help="Conversations in the 'single' scenario.")
+    parser.add_argument("--rounds", type=int, default=5, help="Revision rounds in the 'revision' scenario.")
+    parser.add_argument("--batch", type=int, default=500, help="Emails in the 'batch' scenario.")
+    parser.add_argument("--concurrency", type=int, default=8, help="Drafts generated at the same time in the 'batch' scenario.")
+    parser.add_argument("--no-browser", action="store_true", help="Skip the browser sends (no Chromium needed).")
+    parser.add_argument("--time-scale", type=float, default=1.0, help="Real seconds per simulated second (0.1 is 10x faster).")
+    parser.add_argument("--seed", type=int, default=0, help="Seed of the fake model's answers and latencies.")
+    parser.add_argument("--output", help="Where to write the results (default .cache/benchmarks/e2e_<time>_<commit>.json).")
+    parser.add_argument("--verbose", action="store_true", help="Show the app's own log output.")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files instead of running.")
+    args = parser.parse_args()
+
+    if args.compare:
+        runs = []
+        for path in args.compare:
+            with open(path, encoding="utf-8") as f:
+                runs.append(json.load(f))
+        print(json.dumps(compare(*runs), indent=2))
+        return
+
+    scenarios = [name for name in args.scenarios.split(",") if name]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        raise SystemExit(f"Unknown scenario(s): {', '.join(sorted(unknown))}.")
+    results = run(scenarios, args.count, args.rounds, args.batch, args.concurrency, not args.no_browser,
+                  args.time_scale, args.seed, args.verbose)
+    output = args.output or os.path.join(".cache", "benchmarks", f"e2e_{time.strftime('%Y%m%d_%H%M%S')}_{results['commit']}.json")
+    os.makedirs(os.path.dirname(output) or ".", exist_ok=True)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(json.dumps(results, indent=2))
+    print(f"Results written to {output}.")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,248 @@
+# benchmarks/fake_gmail.py
+# A local stand-in for the parts of Gmail the browser automation touches, for offline benchmarks.
+# It serves a two-step sign-in page (with require_login), an inbox with a Compose button, the Compose
+# window, and the full-page compose view (/mail/?view=cm&to=...&su=...&body=...), using the same roles,
+# labels and texts as Google, so agent/browser_automation.py drives it unchanged once GMAIL_BASE_URL
+# (and GMAIL_LOGIN_URL, for the sign-in page) point here. Signing in sets a session cookie; there is no
+# 2FA or CAPTCHA, so the assisted login's autofill completes it on its own.
+# Like the real thing, the pages pull in images, web fonts and a render-blocking analytics script,
+# served with a configurable delay, and the app "boots" a little while after the HTML arrives.
+# Every email that gets sent is recorded (FakeGmail.sent, or GET /sent).
+#
+#     python -m benchmarks.fake_gmail --port 8765 --require-login
+#     GMAIL_BASE_URL=http://127.0.0.1:8765/ GMAIL_LOGIN_URL=http://127.0.0.1:8765/ServiceLogin python app.py
+
+import argparse
+import json
+import secrets
+import threading
+import time
+from http.cookies import SimpleCookie
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+# A 1x1 transparent PNG.
+_PIXEL = bytes.fromhex("89504e470d0a1a0a0000000d4948445200000001000000010806000000"
+                       "1f15c4890000000d49444154789c6300010000050001a5f645400000000049454e44ae426082")
+
+_PAGE = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>{title} - Gmail</title>
+<script src="/analytics/gtag.js"></script>
+<style>
+@font-face {{ font-family: "Product Sans"; src: url("/fonts/product-sans.woff2"); }}
+@font-face {{ font-family: "Roboto"; src: url("/fonts/roboto.woff2"); }}
+body {{ font-family: "Roboto", "Product Sans", sans-serif; }}
+[hidden] {{ display: none !important; }}
+</style></head>
+<body>
+{content}
+<div id="compose" hidden>
+  <input role="combobox" aria-label="Recipients" id="to">
+  <input placeholder="Subject" name="subjectbox" id="subject">
+  <div role="textbox" aria-label="Message Body" contenteditable="true" id="body" style="min-height: 4em"></div>
+  <div role="button" tabindex="0" aria-label="Send &#8234;(Ctrl-Enter)&#8236;" id="send">Send</div>
+</div>
+<span id="sent" hidden>Message sent</span>
+<script>
+const params = new URLSearchParams(location.search);
+function openCompose() {{
+  document.getElementById("to").value = params.get("to") || "";
+  document.getElementById("subject").value = params.get("su") || "";
+  document.getElementById("body").innerText = params.get("body") || "";
+  document.getElementById("compose").hidden = false;
+}}
+document.getElementById("send").addEventListener("click", async () => {{
+  const email = {{to: document.getElementById("to").value, subject: document.getElementById("subject").value,
+                  body: document.getElementById("body").innerText}};
+  await fetch("/mail/send", {{method: "POST", body: JSON.stringify(email)}});
+  fetch("/gen_204?event=send").catch(() => {{}});
+  document.getElementById("compose").hidden = true;
+  document.getElementById("sent").hidden = false;
+}});
+// The app boots once its web fonts are in (or failed to load), plus its own start-up work.
+document.fonts.ready.then(() => setTimeout(() => {{ {boot} }}, {boot_ms}));
+</script>
+</body></html>"""
+
+_INBOX = """<div gh="cm" role="button" tabindex="0" aria-label="Compose" id="compose-button" hidden>Compose</div>
+<table id="threads">{rows}</table>
+<script>
+document.getElementById("compose-button").addEventListener("click", () => setTimeout(openCompose, {open_ms}));
+</script>"""
+
+_LOGIN = """<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Gmail - Sign in</title></head>
+<body>
+<div id="identifier">
+  <input type="email" aria-label="Email or phone" id="email">
+  <button type="button" id="identifier-next">Next</button>
+</div>
+<div id="challenge" hidden>
+  <input type="password" aria-label="Enter your password" id="password">
+  <button type="button" id="password-next">Next</button>
+  <span id="error" hidden>Wrong password. Try again.</span>
+</div>
+<script>
+document.getElementById("identifier-next").addEventListener("click", () => setTimeout(() => {{
+  document.getElementById("identifier").hidden = true;
+  document.getElementById("challenge").hidden = false;
+}}, {step_ms}));
+document.getElementById("password-next").addEventListener("click", async () => {{
+  const response = await fetch("/signin", {{method: "POST", body: JSON.stringify({{
+    email: document.getElementById("email").value, password: document.getElementById("password").value}})}});
+  if (response.ok) {{ location.href = "/mail/"; }} else {{ document.getElementById("error").hidden = false; }}
+}});
+</script>
+</body></html>"""
+
+_ROW = '<tr><td><img src="/static/avatar_{i}.png" width="24" height="24"></td><td>Conversation {i}</td></tr>'
+
+class FakeGmail:
+    """
+    The stand-in server, running on a background thread.
+
+    Args:
+        port (int): Where to listen (0 picks a free port).
+        asset_delay (float): Seconds before each image, font or analytics response.
+        inbox_boot (float): Seconds the inbox takes to show up once its fonts are in.
+        compose_boot (float): The same for the full-page compose view (a much smaller app).
+        compose_open (float): Seconds between clicking Compose and the window being ready.
+        threads (int): How many conversations (each with an avatar image) the inbox lists.
+        require_login (bool): Send visitors without a session cookie to the sign-in page first.
+        password (str | None): The only password accepted by the sign-in page (None accepts any).
+        login_step (float): Seconds the sign-in page takes to move from the email to the password step.
+    """
+
+    def __init__(self, port: int = 0, asset_delay: float = 0.15, inbox_boot: float = 1.2, compose_boot: float = 0.3,
+                 compose_open: float = 0.4, threads: int = 50, require_login: bool = False, password: str | None = None,
+                 login_step: float = 0.3):
+        self.asset_delay = asset_delay
+        self.inbox_boot = inbox_boot
+        self.compose_boot = compose_boot
+        self.compose_open = compose_open
+        self.threads = threads
+        self.require_login = require_login
+        self.password = password
+        self.login_step = login_step
+        self.sent = []
+        self.requests = {"page": 0, "asset": 0, "send": 0, "login": 0}
+        self._sessions = set()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def base_url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}/"
+
+    @property
+    def login_url(self) -> str:
+        return self.base_url + "ServiceLogin"
+
+    def start(self) -> "FakeGmail":
+        self._thread = threading.Thread(target=self._server.serve_forever, name="fake-gmail", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _count(self, kind: str):
+        with self._lock:
+            self.requests[kind] += 1
+
+    def page(self, path: str, query: dict) -> str:
+        """The HTML for a GET of 'path' (inbox or compose view)."""
+        if query.get("view") == ["cm"]:
+            return _PAGE.format(title="Compose", content="", boot="openCompose()", boot_ms=int(self.compose_boot * 1000))
+        rows = "".join(_ROW.format(i=i) for i in range(self.threads))
+        content = _INBOX.format(rows=rows, open_ms=int(self.compose_open * 1000))
+        return _PAGE.format(title="Inbox", content=content, boot_ms=int(self.inbox_boot * 1000),
+                            boot='document.getElementById("compose-button").hidden = false')
+
+    def _handler(self):
+        gmail = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                url = urlsplit(self.path)
+                if url.path.startswith(("/static/", "/fonts/", "/analytics/", "/gen_204")):
+                    gmail._count("asset")
+                    time.sleep(gmail.asset_delay)
+                    if url.path.startswith("/static/"):
+                        return self._reply(200, _PIXEL, "image/png")
+                    if url.path.startswith("/fonts/"):
+                        # Not a real font: the browser drops it and falls back, after the same wait.
+                        return self._reply(200, b"\0" * 2048, "font/woff2")
+                    if url.path.startswith("/analytics/"):
+                        return self._reply(200, b"window.dataLayer = [];", "text/javascript")
+                    return self._reply(204, b"", "text/plain")
+                if url.path == "/sent":
+                    with gmail._lock:
+                        return self._reply(200, json.dumps(gmail.sent).encode(), "application/json")
+                if url.path == "/ServiceLogin":
+                    return self._reply(200, _LOGIN.format(step_ms=int(gmail.login_step * 1000)).encode(), "text/html; charset=utf-8")
+                if url.path in ("/", "/mail", "/mail/") or url.path.startswith("/mail/u/"):
+                    gmail._count("page")
+                    if gmail.require_login and not self._signed_in():
+                        return self._reply(302, b"", "text/plain", {"Location": "/ServiceLogin"})
+                    return self._reply(200, gmail.page(url.path, parse_qs(url.query)).encode(), "text/html; charset=utf-8")
+                self._reply(404, b"Not found", "text/plain")
+
+            def do_POST(self):
+                path = urlsplit(self.path).path
+                length = int(self.headers.get("Content-Length") or 0)
+                payload = json.loads(self.rfile.read(length) or b"{}")
+                if path == "/signin":
+                    gmail._count("login")
+                    if gmail.password is not None and payload.get("password") != gmail.password:
+                        return self._reply(401, b"{}", "application/json")
+                    token = secrets.token_hex(16)
+                    with gmail._lock:
+                        gmail._sessions.add(token)
+                    return self._reply(200, b"{}", "application/json", {"Set-Cookie": f"SID={token}; Path=/; Max-Age=2592000"})
+                if path != "/mail/send":
+                    return self._reply(404, b"Not found", "text/plain")
+                gmail._count("send")
+                with gmail._lock:
+                    gmail.sent.append(payload)
+                self._reply(200, b"{}", "application/json")
+
+            def _signed_in(self) -> bool:
+                cookie = SimpleCookie(self.headers.get("Cookie") or "")
+                with gmail._lock:
+                    return "SID" in cookie and cookie["SID"].value in gmail._sessions
+
+            def _reply(self, status: int, payload: bytes, content_type: str, headers: dict | None = None):
+                self.send_response(status)
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.send_header("Cache-Control", "no-store")
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve a local stand-in of Gmail's inbox and compose views.")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--asset-delay", type=float, default=0.15, help="Seconds before each image/font/analytics response.")
+    parser.add_argument("--require-login", action="store_true", help="Ask for a sign-in before showing the inbox.")
+    args = parser.parse_args()
+    gmail = FakeGmail(args.port, asset_delay=args.asset_delay, require_login=args.require_login).start()
+    print(f"Fake Gmail listening on {gmail.base_url} (Ctrl+C to stop).")
+    try:
+        while True:
+            time.sleep(3600)
+    except KeyboardInterrupt:
+        gmail.close()
+
+if __name__ == "__main__":
+    main()
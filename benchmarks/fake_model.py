@@ -0,0 +1,142 @@
+# benchmarks/fake_model.py
+# A deterministic, offline stand-in for genai.GenerativeModel.
+# It answers the three prompts agent/email_generator.py sends (follow-up analysis, draft, revision) the way
+# Gemini would, after a simulated latency, so the whole app can be exercised without an API key:
+#
+#     from agent.llm_client import use_model
+#     use_model(FakeGenerativeModel(seed=1, latency=2.0, time_scale=0.1))
+#
+# Answers and latencies come from a random generator seeded with (seed, prompt, how many times that prompt
+# was asked), so the same run produces the same results no matter how the calls interleave. A retried or
+# hedged request is a new draw, like a real second request would be.
+
+import asyncio
+import json
+import random
+import re
+import threading
+import time
+
+from agent.rate_limiter import estimate_tokens
+
+_ANALYSIS_REQUEST = re.compile(r'\*\*Analyze the user\'s request:\*\* "(.*?)"\s*\n', re.DOTALL)
+_GENERATION_REQUEST = re.compile(r'(?:User\'s Request \(now including any necessary details\)|Original request): "(.*?)"\s*\n', re.DOTALL)
+_SIGNATURE = re.compile(r'(?:User\'s Name \(for signature\): |Sign the email as )"(.*?)"')
+_FOLLOWUP_QUESTIONS = ["For what dates will you be on leave?", "What is the name of the person this is about?",
+                       "Which date and time should the meeting be?", "What is the order number?"]
+
+class _Usage:
+    def __init__(self, prompt_token_count: int):
+        self.prompt_token_count = prompt_token_count
+
+class FakeResponse:
+    """What generate_content returns: .text, plus usage_metadata like the real response."""
+
+    def __init__(self, text: str, prompt: str):
+        self.text = text
+        self.usage_metadata = _Usage(estimate_tokens(prompt))
+
+class FakeGenerativeModel:
+    """
+    Stands in for genai.GenerativeModel.
+
+    Args:
+        seed (int): Same seed, same prompts: same answers and latencies.
+        latency (float): Median seconds for a draft; the follow-up analysis takes about a third of that.
+        jitter (float): Spread of the latency (sigma of a lognormal distribution).
+        tail_rate (float): Share of calls that are tail_factor times slower.
+        tail_factor (float): How much slower those calls are.
+        followup_rate (float): Share of requests (without added details) that get a follow-up question.
+        malformed_rate (float): Share of drafts in almost-valid JSON (code fences, a trailing comma).
+        error_rate (float): Share of calls that fail with an error, like a 500 or a quota error.
+        chunks (int): How many pieces a streamed answer arrives in.
+        time_scale (float): Real seconds slept per simulated second (0.1 makes everything 10x faster).
+    """
+
+    def __init__(self, seed: int = 0, latency: float = 2.5, jitter: float = 0.3, tail_rate: float = 0.02,
+                 tail_factor: float = 5.0, followup_rate: float = 0.3, malformed_rate: float = 0.03,
+                 error_rate: float = 0.0, chunks: int = 8, time_scale: float = 1.0):
+        self.seed = seed
+        self.latency = latency
+        self.jitter = jitter
+        self.tail_rate = tail_rate
+        self.tail_factor = tail_factor
+        self.followup_rate = followup_rate
+        self.malformed_rate = malformed_rate
+        self.error_rate = error_rate
+        self.chunks = max(1, chunks)
+        self.time_scale = time_scale
+        self.calls = {"analyze": 0, "generate": 0, "revise": 0}
+        self._asked = {}
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, stream: bool = False, generation_config=None, request_options=None):
+        seconds, text = self._answer(prompt, request_options)
+        if stream:
+            return self._stream(seconds, text, prompt)
+        time.sleep(seconds)
+        return self._finish(text, prompt)
+
+    async def generate_content_async(self, prompt, generation_config=None, request_options=None):
+        seconds, text = self._answer(prompt, request_options)
+        await asyncio.sleep(seconds)
+        return self._finish(text, prompt)
+
+    def _finish(self, text: str | None, prompt: str) -> FakeResponse:
+        if text is None:
+            raise RuntimeError("500 Internal error encountered (fake model).")
+        return FakeResponse(text, prompt)
+
+    def _stream(self, seconds: float, text: str | None, prompt: str):
+        # The first chunk takes most of the time (like the real time to first token), the rest trickle in.
+        time.sleep(seconds * 0.6)
+        if text is None:
+            raise RuntimeError("500 Internal error encountered (fake model).")
+        size = -(-len(text) // self.chunks)
+        for start in range(0, len(text), size):
+            yield FakeResponse(text[start:start + size], prompt)
+            time.sleep(seconds * 0.4 / self.chunks)
+
+    def _answer(self, prompt: str, request_options) -> tuple[float, str | None]:
+        """The simulated latency (already scaled, and cut at the request timeout) and the answer text (None: an error)."""
+        kind = "analyze" if "NO_FOLLOWUP_NEEDED" in prompt else "revise" if "editing an email draft" in prompt else "generate"
+        with self._lock:
+            self.calls[kind] += 1
+            asked = self._asked.get(prompt, 0)
+            self._asked[prompt] = asked + 1
+        rng = random.Random(f"{self.seed}|{asked}|{prompt}")
+        seconds = self.latency * rng.lognormvariate(0, self.jitter) * (0.35 if kind == "analyze" else 1.0)
+        if rng.random() < self.tail_rate:
+            seconds *= self.tail_factor
+        seconds *= self.time_scale
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and seconds > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("504 Deadline Exceeded (fake model).")
+        if rng.random() < self.error_rate:
+            return seconds, None
+        if kind == "analyze":
+            return seconds, self._analysis(prompt, rng)
+        return seconds, self._draft(prompt, kind, rng)
+
+    def _analysis(self, prompt: str, rng: random.Random) -> str:
+        match = _ANALYSIS_REQUEST.search(prompt)
+        request = match.group(1) if match else prompt
+        if "Additional details" in request or rng.random() >= self.followup_rate:
+            return "NO_FOLLOWUP_NEEDED"
+        return rng.choice(_FOLLOWUP_QUESTIONS)
+
+    def _draft(self, prompt: str, kind: str, rng: random.Random) -> str:
+        match = _GENERATION_REQUEST.search(prompt)
+        request = " ".join((match.group(1) if match else "the requested changes").split())
+        signature = _SIGNATURE.search(prompt)
+        name = signature.group(1) if signature else "Alex"
+        subject = ("Revised: " if kind == "revise" else "") + request[:60].rstrip(" .").capitalize()
+        paragraphs = [f"I am writing regarding {request[:200]}.",
+                      "I have made sure the key details are covered and I am happy to share anything else you need.",
+                      "Thank you for your time and consideration."]
+        body = "Hello,\n\n" + "\n\n".join(paragraphs[:rng.randint(2, 3)]) + f"\n\nBest regards,\n{name}"
+        text = json.dumps({"subject": subject, "body": body})
+        if rng.random() < self.malformed_rate:
+            text = rng.choice(["```json\n" + text + "\n```", text[:-1] + ",}", "Here is the email:\n" + text])
+        return text
@@ -0,0 +1,168 @@
+# benchmarks/llm_hedging_benchmark.py
+# Replays model answers through the old and the new draft generation path, fully offline.
+# The old path: one request, no deadline, a greedy regex plus json.loads on the answer.
+# The new path: generate_email_content() with its deadline, hedged second request and local JSON repair
+# (agent/hedging.py, agent/structured_output.py).
+# Both see the same sequence of answers, each with its recorded latency. By default the answers are synthetic,
+# with the failure modes seen in practice (a heavy latency tail, a few hung requests, JSON in code fences,
+# trailing commas, raw line breaks or unescaped quotes inside the body, answers cut off mid-body). Real
+# answers can be replayed from a JSONL file with one {"seconds": ..., "text": ...} object per line.
+# The fake model ignores JSON mode, so the gain from structured output itself is not part of the numbers.
+#
+#     python -m benchmarks.llm_hedging_benchmark --calls 500 --time-scale 0.02
+#
+# Latencies are reported in replayed seconds: a 3 s answer sleeps 0.06 s with --time-scale 0.02.
+
+import argparse
+import contextlib
+import io
+import itertools
+import json
+import os
+import random
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+_CLEAN = '{{"subject": "{subject}", "body": "Hello,\\n\\n{text}\\n\\nBest regards,\\nAlex"}}'
+_FAILURE_MODES = [
+    # (share of answers, how the answer looks)
+    (0.05, lambda subject, text: "```json\n" + _CLEAN.format(subject=subject, text=text) + "\n```"),
+    (0.03, lambda subject, text: "Here is your email:\n" + _CLEAN.format(subject=subject, text=text) + "\nLet me know!"),
+    (0.02, lambda subject, text: _CLEAN.format(subject=subject, text=text)[:-1] + ",}"),
+    (0.03, lambda subject, text: _CLEAN.format(subject=subject, text=text).replace("\\n", "\n")),
+    (0.015, lambda subject, text: _CLEAN.format(subject=subject, text=text.replace("review", '"review"'))),
+    (0.01, lambda subject, text: _CLEAN.format(subject=subject, text=text)[:60]),
+    (0.005, lambda subject, text: "I'm sorry, I can't help with that."),
+]
+
+def synthetic_records(count: int, seed: int) -> list[dict]:
+    """Answers with a lognormal latency around 2.5 s, a 4% slow tail and 1% of requests that hang."""
+    rng = random.Random(seed)
+    records = []
+    for i in range(count):
+        seconds = rng.lognormvariate(0.9, 0.3)
+        roll = rng.random()
+        if roll < 0.01:
+            seconds = 120.0
+        elif roll < 0.05:
+            seconds *= rng.uniform(4, 12)
+        subject, text = f"Project update {i}", "Thanks for the quick review of the proposal. I will send the numbers by Friday."
+        answer, roll = None, rng.random()
+        for share, shape in _FAILURE_MODES:
+            if roll < share:
+                answer = shape(subject, text)
+                break
+            roll -= share
+        records.append({"seconds": seconds, "text": answer or _CLEAN.format(subject=subject, text=text)})
+    return records
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+class ReplayModel:
+    """Stands in for genai.GenerativeModel: every request gets the next recorded answer after its recorded delay."""
+
+    def __init__(self, records: list[dict], time_scale: float):
+        self._records = records
+        self._next = itertools.count()
+        self._time_scale = time_scale
+        self.requests = 0
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt, generation_config=None, request_options=None, stream=False):
+        with self._lock:
+            record = self._records[next(self._next) % len(self._records)]
+            self.requests += 1
+        delay = record["seconds"] * self._time_scale
+        timeout = (request_options or {}).get("timeout")
+        if timeout is not None and delay > timeout:
+            time.sleep(timeout)
+            raise TimeoutError("Deadline exceeded while waiting for the model.")
+        time.sleep(delay)
+        return _Response(record["text"])
+
+def old_generate(model, prompt: str) -> dict:
+    """The draft path before hedging and repair."""
+    response = model.generate_content(prompt)
+    json_match = re.search(r'\{.*\}', response.text, re.DOTALL)
+    if not json_match:
+        raise ValueError("No valid JSON object found in the AI's response.")
+    draft = json.loads(json_match.group(0))
+    if not draft.get("subject") or not draft.get("body"):
+        raise ValueError("Generated JSON is missing 'subject' or 'body'.")
+    return draft
+
+def _measure(fn, calls: int, workers: int, time_scale: float) -> dict:
+    from agent.tracing import percentile
+
+    def one(i):
+        started = time.perf_counter()
+        try:
+            ok = fn(i) is not None
+        except Exception:
+            ok = False
+        return ok, (time.perf_counter() - started) / time_scale
+
+    with contextlib.redirect_stdout(io.StringIO()), ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(one, range(calls)))
+    latencies = [seconds for _, seconds in results]
+    return {
+        "failure_rate": round(sum(not ok for ok, _ in results) / max(1, calls), 4),
+        "p50_s": round(percentile(latencies, 50), 2),
+        "p95_s": round(percentile(latencies, 95), 2),
+        "p99_s": round(percentile(latencies, 99), 2),
+        "max_s": round(max(latencies), 2),
+    }
+
+def run(records: list[dict], calls: int, workers: int, time_scale: float, deadline: float) -> dict:
+    # The hedging settings are read at import time, in replayed seconds scaled down like the latencies.
+    for name, default in (("LLM_HEDGE_DEFAULT_DELAY", 8.0), ("LLM_HEDGE_MIN_DELAY", 0.5)):
+        os.environ[name] = str(float(os.environ.get(name, default)) * time_scale)
+    os.environ.setdefault("DRAFT_CACHE_DISABLED", "1")
+    os.environ.setdefault("DRAFT_INDEX", "0")
+    os.environ.setdefault("TRACING", "0")
+    from agent.llm_client import use_model
+    from agent.email_generator import generate_email_content
+    from agent.hedging import get_latency_tracker
+    from agent.structured_output import parse_stats
+
+    old_model = ReplayModel(records, time_scale)
+    old = _measure(lambda i: old_generate(old_model, f"request {i}"), calls, workers, time_scale)
+    old["requests"] = old_model.requests
+
+    new_model = ReplayModel(records, time_scale)
+    use_model(new_model)
+    new = _measure(lambda i: generate_email_content("Alex", f"request {i}", regenerate=True, timeout=deadline * time_scale),
+                   calls, workers, time_scale)
+    counts = get_latency_tracker().stats()
+    new.update({
+        "requests": new_model.requests,
+        "hedges": counts["hedges"],
+        "hedge_wins": counts["hedge_wins"],
+        "hedges_refused": counts["refused"],
+        "deadline_exceeded": counts["deadline_exceeded"],
+        "parsing": parse_stats(),
+    })
+    return {"calls": calls, "old": old, "new": new}
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare draft generation with and without hedging and JSON repair.")
+    parser.add_argument("--calls", type=int, default=500, help="How many drafts to generate with each path.")
+    parser.add_argument("--workers", type=int, default=16, help="Drafts generated at the same time.")
+    parser.add_argument("--time-scale", type=float, default=0.02, help="Real seconds slept per replayed second.")
+    parser.add_argument("--deadline", type=float, default=30.0, help="Per-call deadline of the new path, in replayed seconds.")
+    parser.add_argument("--replay", help="JSONL file of recorded answers ({\"seconds\", \"text\"} per line).")
+    parser.add_argument("--seed", type=int, default=7)
+    args = parser.parse_args()
+    if args.replay:
+        with open(args.replay, encoding="utf-8") as f:
+            records = [json.loads(line) for line in f if line.strip()]
+    else:
+        records = synthetic_records(max(args.calls * 2, 1000), args.seed)
+    print(json.dumps(run(records, args.calls, args.workers, args.time_scale, args.deadline), indent=2))
+
+if __name__ == "__main__":
+    main()
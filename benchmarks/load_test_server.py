@@ -0,0 +1,216 @@
+# benchmarks/load_test_server.py
+# Load test for server mode (agent/server.py), fully offline.
+# It starts the conversation server in-process with a fake model backend (random, realistic latencies and
+# an occasional follow-up question) and a fake sender, then runs many simulated users at once. Each one
+# goes through a whole conversation over HTTP (or, for a share of them, over a WebSocket):
+# recipient -> name -> prompt -> (follow-up answer) -> draft -> (one round of changes) -> approve.
+#
+#     python -m benchmarks.load_test_server --sessions 500 --concurrency 200
+#
+# It reports finished conversations per second and the latency percentiles of the individual requests.
+
+import argparse
+import asyncio
+import json
+import random
+import statistics
+import time
+
+from agent.server import ConversationServer, ModelBackend, encode_ws_frame, read_ws_message
+
+class FakeModelBackend(ModelBackend):
+    """Answers like the model would, after a random delay, without any network calls."""
+
+    def __init__(self, latency: float, followup_rate: float):
+        self.latency = latency
+        self.followup_rate = followup_rate
+        self.calls = 0
+
+    async def analyze(self, prompt):
+        self.calls += 1
+        await asyncio.sleep(random.uniform(0.5, 1.5) * self.latency)
+        if "Additional details" not in prompt and random.random() < self.followup_rate:
+            return "What date should the email mention?"
+        return None
+
+    async def generate(self, user_name, prompt, regenerate=False):
+        self.calls += 1
+        await asyncio.sleep(random.uniform(1.0, 3.0) * self.latency)
+        return {"subject": f"About: {prompt[:40]}", "body": f"Hello,\n\n{prompt}\n\nBest regards,\n{user_name}"}
+
+    async def revise(self, user_name, context):
+        self.calls += 1
+        prompt = context.render()
+        started = time.perf_counter()
+        await asyncio.sleep(random.uniform(1.0, 3.0) * self.latency)
+        draft = {"subject": context.draft["subject"], "body": context.draft["body"] + f"\n(Revised: {context.feedback[-1]})"}
+        context.record_round("revise", len(prompt) // 4, time.perf_counter() - started, True, quiet=True)
+        context.set_draft(draft)
+        return draft
+
+async def fake_sender(session, sender_email, sender_password, on_done):
+    return f"Queued the email to {session.data['recipient']} (load test, nothing is sent)."
+
+class HttpClient:
+    """A tiny keep-alive JSON client for one simulated user."""
+
+    def __init__(self, host: str, port: int):
+        self.host = host
+        self.port = port
+        self.reader = None
+        self.writer = None
+
+    async def request(self, method: str, path: str, payload: dict | None = None) -> dict:
+        if self.writer is None:
+            self.reader, self.writer = await asyncio.open_connection(self.host, self.port)
+        body = json.dumps(payload).encode("utf-8") if payload is not None else b""
+        self.writer.write((f"{method} {path} HTTP/1.1\r\nHost: {self.host}\r\nContent-Type: application/json\r\n"
+                           f"Content-Length: {len(body)}\r\n\r\n").encode("latin-1") + body)
+        await self.writer.drain()
+        status = int((await self.reader.readline()).split()[1])
+        length = 0
+        while True:
+            line = await self.reader.readline()
+            if line in (b"\r\n", b""):
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            if name.strip().lower() == "content-length":
+                length = int(value)
+        data = json.loads(await self.reader.readexactly(length))
+        if status >= 400:
+            raise RuntimeError(f"{method} {path} -> {status}: {data.get('error')}")
+        return data
+
+    async def close(self):
+        if self.writer is not None:
+            self.writer.close()
+
+def last_step(response: dict) -> dict:
+    return response["steps"][-1]
+
+async def run_http_user(client: HttpClient, index: int, reject_rate: float, latencies: list) -> None:
+    async def call(method, path, payload=None):
+        started = time.perf_counter()
+        response = await client.request(method, path, payload)
+        latencies.append(time.perf_counter() - started)
+        return response
+
+    created = await call("POST", "/sessions")
+    base = f"/sessions/{created['session']['session_id']}"
+    await call("POST", f"{base}/messages", {"text": f"recipient{index}@example.com"})
+    await call("POST", f"{base}/messages", {"text": f"User {index}"})
+    response = await call("POST", f"{base}/messages", {"text": f"Thank the team for the offsite, note #{index}"})
+    if response["session"]["state"] == "asking_followup":
+        response = await call("POST", f"{base}/messages", {"text": "Next Friday"})
+    assert last_step(response)["action"] == "review", response
+    if random.random() < reject_rate:
+        response = await call("POST", f"{base}/reject", {"feedback": "Make it shorter."})
+        assert last_step(response)["action"] == "review", response
+    response = await call("POST", f"{base}/approve", {"sender_email": "me@example.com", "sender_password": "x"})
+    assert response["session"]["state"] == "asking_recipient", response
+    await call("DELETE", base)
+
+async def run_websocket_user(host: str, port: int, index: int, reject_rate: float, latencies: list) -> None:
+    client = HttpClient(host, port)
+    created = await client.request("POST", "/sessions")
+    await client.close()
+    session_id = created["session"]["session_id"]
+    reader, writer = await asyncio.open_connection(host, port)
+    writer.write((f"GET /sessions/{session_id}/ws HTTP/1.1\r\nHost: {host}\r\nUpgrade: websocket\r\nConnection: Upgrade\r\n"
+                  "Sec-WebSocket-Key: bG9hZC10ZXN0LWtleS0xMg==\r\nSec-WebSocket-Version: 13\r\n\r\n").encode("latin-1"))
+    while (await reader.readline()) not in (b"\r\n", b""):
+        pass
+    await read_ws_message(reader, writer)  # The current session state.
+
+    async def send_and_wait(event: dict) -> dict:
+        """Sends one event and waits for the step that hands control back to the user."""
+        started = time.perf_counter()
+        writer.write(encode_ws_frame(json.dumps(event).encode("utf-8"), mask=True))
+        while True:
+            message = json.loads(await read_ws_message(reader, writer))
+            if message["type"] == "error":
+                raise RuntimeError(message["error"])
+            if message["type"] == "step" and (message["accepts_input"] or message["action"] == "review"):
+                latencies.append(time.perf_counter() - started)
+                return message
+
+    await send_and_wait({"type": "message", "text": f"recipient{index}@example.com"})
+    await send_and_wait({"type": "message", "text": f"User {index}"})
+    step = await send_and_wait({"type": "message", "text": f"Thank the team for the offsite, note #{index}"})
+    if step["action"] != "review":
+        step = await send_and_wait({"type": "message", "text": "Next Friday"})
+    if random.random() < reject_rate:
+        await send_and_wait({"type": "reject", "feedback": "Make it shorter."})
+    step = await send_and_wait({"type": "approve", "sender_email": "me@example.com", "sender_password": "x"})
+    assert step["accepts_input"], step
+    writer.write(encode_ws_frame(b"", 0x8, mask=True))
+    writer.close()
+
+def percentile(values: list, pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))] if ordered else 0.0
+
+async def run(args) -> dict:
+    backend = FakeModelBackend(args.model_latency, args.followup_rate)
+    server = ConversationServer(backend=backend, sender=fake_sender, max_sessions=args.sessions + 10)
+    port = await server.start("127.0.0.1", 0)
+    latencies = []
+    failures = []
+    limit = asyncio.Semaphore(args.concurrency)
+    peak = {"sessions": 0}
+
+    async def user(index):
+        async with limit:
+            try:
+                if random.random() < args.websocket_share:
+                    await run_websocket_user("127.0.0.1", port, index, args.reject_rate, latencies)
+                else:
+                    client = HttpClient("127.0.0.1", port)
+                    try:
+                        await run_http_user(client, index, args.reject_rate, latencies)
+                    finally:
+                        await client.close()
+            except Exception as e:
+                failures.append(repr(e))
+            peak["sessions"] = max(peak["sessions"], len(server.sessions))
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user(i) for i in range(args.sessions)))
+    elapsed = time.perf_counter() - started
+    await server.stop()
+    return {
+        "sessions": args.sessions,
+        "concurrency": args.concurrency,
+        "failures": len(failures),
+        "first_failures": failures[:5],
+        "seconds": round(elapsed, 2),
+        "conversations_per_second": round((args.sessions - len(failures)) / elapsed, 1),
+        "requests": len(latencies),
+        "model_calls": backend.calls,
+        "peak_open_sessions": peak["sessions"],
+        "latency_ms": {
+            "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "p99": round(percentile(latencies, 99) * 1000, 1),
+        },
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive many simulated conversations against server mode with a fake model.")
+    parser.add_argument("--sessions", type=int, default=500, help="Conversations to run in total.")
+    parser.add_argument("--concurrency", type=int, default=200, help="Conversations in progress at the same time.")
+    parser.add_argument("--model-latency", type=float, default=0.2, help="Typical fake model latency in seconds.")
+    parser.add_argument("--followup-rate", type=float, default=0.3, help="Share of prompts that get a follow-up question.")
+    parser.add_argument("--reject-rate", type=float, default=0.3, help="Share of drafts that get one round of changes.")
+    parser.add_argument("--websocket-share", type=float, default=0.2, help="Share of users that talk over a WebSocket.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+    random.seed(args.seed)
+    result = asyncio.run(run(args))
+    print(json.dumps(result, indent=2))
+    if result["failures"]:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
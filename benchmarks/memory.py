@@ -0,0 +1,84 @@
+# benchmarks/memory.py
+# Memory measurements shared by the benchmarks: the resident memory of this process plus everything it
+# started (the Playwright driver, Chromium and its renderers), and the peak of it over a stretch of work.
+
+import os
+import threading
+
+def process_tree_rss(pid: int | None = None) -> int | None:
+    """Resident memory (bytes) of a process and all its descendants, i.e. us plus the Playwright driver and Chromium."""
+    pid = pid or os.getpid()
+    try:
+        import psutil
+    except ImportError:
+        psutil = None
+    if psutil is not None:
+        root = psutil.Process(pid)
+        total = 0
+        for process in [root] + root.children(recursive=True):
+            try:
+                total += process.memory_info().rss
+            except psutil.NoSuchProcess:
+                pass
+        return total
+    if not os.path.isdir("/proc"):
+        return None
+    # Without psutil (Linux only): walk /proc for the children of each process.
+    children = {}
+    for entry in os.listdir("/proc"):
+        if entry.isdigit():
+            try:
+                with open(f"/proc/{entry}/stat") as f:
+                    parent = int(f.read().rsplit(")", 1)[1].split()[1])
+                children.setdefault(parent, []).append(int(entry))
+            except (OSError, ValueError, IndexError):
+                pass
+    total, stack = 0, [pid]
+    while stack:
+        current = stack.pop()
+        stack.extend(children.get(current, []))
+        try:
+            with open(f"/proc/{current}/statm") as f:
+                total += int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+        except (OSError, ValueError):
+            pass
+    return total
+
+def mb(value: int | None) -> float | None:
+    return round(value / (1024 * 1024), 1) if value is not None else None
+
+class PeakRssSampler:
+    """
+    Samples process_tree_rss() on a background thread and keeps the highest value seen.
+
+        with PeakRssSampler() as sampler:
+            run_the_scenario()
+        print(mb(sampler.peak))
+    """
+
+    def __init__(self, interval: float = 0.05):
+        self.interval = interval
+        self.peak = None
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        self._sample()
+        self._thread = threading.Thread(target=self._run, name="rss-sampler", daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        rss = process_tree_rss()
+        if rss is not None and (self.peak is None or rss > self.peak):
+            self.peak = rss
@@ -0,0 +1,121 @@
+# benchmarks/multi_sender_browsers.py
+# Compares the two ways of sending from several accounts:
+# 1. Current design: one persistent Chromium per sender (launch_persistent_context on ./profile_<safe_email>),
+#    sends going out one after another, as the sync-API BrowserSessionManager does them.
+# 2. Shared browser: one Chromium, one new_context(storage_state=...) per sender, concurrent sends
+#    (agent/shared_browser.py).
+# For both it reports the memory of all browser processes (total and per account) once every sender's
+# inbox is open, and the send throughput.
+#
+# This needs already logged-in sender profiles and sends real emails. Use test accounts and send to yourself:
+#
+#     python -m benchmarks.multi_sender_browsers --senders a@gmail.com,b@gmail.com,c@gmail.com --recipient you@gmail.com --count 3
+#
+# With --no-send only the memory (and time to open every inbox) is measured.
+
+import argparse
+import asyncio
+import json
+import time
+
+from playwright.async_api import async_playwright
+
+from agent.profiles import profile_dir_for
+from agent.shared_browser import SharedBrowserEngine, compose_and_send, open_inbox
+from benchmarks.memory import mb, process_tree_rss
+
+def jobs_for(senders: list[str], recipient: str, count: int, label: str) -> list[dict]:
+    return [{"recipient": recipient, "subject": f"{label} benchmark #{i + 1} from {sender}", "body": "Benchmark email.", "sender_email": sender}
+            for i in range(count) for sender in senders]
+
+async def run_per_sender_browsers(senders: list[str], recipient: str, count: int, send: bool) -> dict:
+    baseline = process_tree_rss()
+    async with async_playwright() as playwright:
+        started = time.perf_counter()
+        contexts, pages = [], {}
+        try:
+            for sender in senders:
+                context = await playwright.chromium.launch_persistent_context(user_data_dir=profile_dir_for(sender), headless=True)
+                contexts.append(context)
+                page = context.pages[0] if context.pages else await context.new_page()
+                await open_inbox(page, sender)
+                pages[sender] = page
+            ready = time.perf_counter() - started
+            memory = process_tree_rss()
+            sent, elapsed = 0, 0.0
+            if send:
+                started = time.perf_counter()
+                for job in jobs_for(senders, recipient, count, "Per-sender browser"):
+                    await compose_and_send(pages[job["sender_email"]], job["recipient"], job["subject"], job["body"])
+                    sent += 1
+                elapsed = time.perf_counter() - started
+        finally:
+            for context in contexts:
+                await context.close()
+    return summarize("one Chromium per sender", senders, baseline, memory, ready, sent, elapsed)
+
+async def run_shared_browser(senders: list[str], recipient: str, count: int, send: bool, max_parallel: int) -> dict:
+    baseline = process_tree_rss()
+    engine = SharedBrowserEngine(max_parallel=max_parallel, headless=True)
+    try:
+        started = time.perf_counter()
+        await asyncio.gather(*(engine.account(sender) for sender in senders))
+        ready = time.perf_counter() - started
+        memory = process_tree_rss()
+        sent, elapsed = 0, 0.0
+        if send:
+            started = time.perf_counter()
+            results = await engine.send_many(jobs_for(senders, recipient, count, "Shared browser"))
+            elapsed = time.perf_counter() - started
+            sent = sum(1 for result in results if not isinstance(result, BaseException))
+            for result in results:
+                if isinstance(result, BaseException):
+                    print(f"Send failed: {result}")
+    finally:
+        await engine.close()
+    return summarize(f"shared Chromium, {max_parallel} parallel sends", senders, baseline, memory, ready, sent, elapsed)
+
+def summarize(label, senders, baseline, memory, ready, sent, elapsed) -> dict:
+    browser_memory = memory - baseline if memory is not None and baseline is not None else None
+    return {
+        "design": label,
+        "senders": len(senders),
+        "seconds_to_open_all_inboxes": round(ready, 2),
+        "browser_memory_mb": mb(browser_memory),
+        "memory_per_account_mb": mb(browser_memory / len(senders)) if browser_memory is not None else None,
+        "emails_sent": sent,
+        "send_seconds": round(elapsed, 2),
+        "emails_per_minute": round(sent / elapsed * 60, 1) if elapsed else None,
+    }
+
+async def main_async(args):
+    senders = [s.strip() for s in args.senders.split(",") if s.strip()]
+    results = [await run_per_sender_browsers(senders, args.recipient, args.count, not args.no_send)]
+    results.append(await run_shared_browser(senders, args.recipient, args.count, not args.no_send, args.max_parallel))
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare one Chromium per sender against one shared Chromium with per-account contexts.")
+    parser.add_argument("--senders", required=True, help="Comma-separated sender accounts (their profiles should already be logged in).")
+    parser.add_argument("--recipient", help="Where the benchmark emails are sent (required unless --no-send).")
+    parser.add_argument("--count", type=int, default=2, help="Emails per sender.")
+    parser.add_argument("--max-parallel", type=int, default=4, help="Concurrent sends in the shared browser.")
+    parser.add_argument("--no-send", action="store_true", help="Only measure memory and inbox load time.")
+    parser.add_argument("--json", action="store_true", help="Print the results as JSON.")
+    args = parser.parse_args()
+    if not args.no_send and not args.recipient:
+        parser.error("--recipient is required unless --no-send is given")
+
+    results = asyncio.run(main_async(args))
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    for result in results:
+        print(f"{result['design']}:")
+        print(f"  all {result['senders']} inboxes open in {result['seconds_to_open_all_inboxes']}s, "
+              f"browser memory {result['browser_memory_mb']} MB ({result['memory_per_account_mb']} MB per account)")
+        if result["emails_sent"]:
+            print(f"  {result['emails_sent']} emails in {result['send_seconds']}s ({result['emails_per_minute']} per minute)")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+# benchmarks/send_latency.py
+# Measures per-send latency with a cold browser (the old one-shot send_email_with_browser path)
+# versus a warm one (BrowserSessionManager keeping the context and inbox page open).
+#
+# This needs a real, already logged-in sender profile, so it sends real emails.
+# Use a test account and send to yourself:
+#
+#     python -m benchmarks.send_latency --sender you@gmail.com --recipient you@gmail.com --count 3
+
+import argparse
+import getpass
+import statistics
+import time
+
+from playwright.sync_api import sync_playwright
+
+from agent.browser_automation import send_email_with_browser
+from agent.session_manager import BrowserSessionManager
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare cold vs warm browser send latency.")
+    parser.add_argument("--sender", required=True, help="Sender account (its profile should already be logged in).")
+    parser.add_argument("--recipient", required=True, help="Where the benchmark emails are sent.")
+    parser.add_argument("--count", type=int, default=3, help="Number of emails per mode.")
+    args = parser.parse_args()
+    password = getpass.getpass(f"Password for {args.sender} (only used if the profile is not logged in): ")
+
+    cold = []
+    for i in range(args.count):
+        started = time.perf_counter()
+        with sync_playwright() as playwright:
+            send_email_with_browser(playwright, args.recipient, f"Cold send benchmark #{i + 1}", "Benchmark email.", args.sender, password)
+        cold.append(time.perf_counter() - started)
+
+    manager = BrowserSessionManager()
+    try:
+        # The first warm-mode send still has to launch Chromium, so it is reported separately.
+        first = manager.send(args.recipient, "Warm send benchmark #0", "Benchmark email.", args.sender, password)
+        warm = [manager.send(args.recipient, f"Warm send benchmark #{i + 1}", "Benchmark email.", args.sender, password)
+                for i in range(args.count)]
+    finally:
+        manager.close()
+
+    print("\nPer-send latency (seconds)")
+    print(f"  cold (launch + Gmail load + send + close): mean {statistics.mean(cold):.2f}  min {min(cold):.2f}  max {max(cold):.2f}")
+    print(f"  warm session, first send (cold start):     {first:.2f}")
+    print(f"  warm session, later sends:                 mean {statistics.mean(warm):.2f}  min {min(warm):.2f}  max {max(warm):.2f}")
+    print(f"  saved per warm send: {statistics.mean(cold) - statistics.mean(warm):.2f}s")
+
+if __name__ == "__main__":
+    main()
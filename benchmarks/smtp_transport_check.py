@@ -0,0 +1,74 @@
+# benchmarks/smtp_transport_check.py
+# Offline check and throughput benchmark for the SMTP transport.
+# It starts a local SMTP stand-in (aiosmtpd, `pip install aiosmtpd`) that accepts and counts messages,
+# then sends the same batch twice: once opening a new connection per message (what a naive sender does)
+# and once through SmtpTransport's pooled, reused connections. It also cuts the pooled connection
+# half-way through to check that the transport reconnects and nothing is lost.
+#
+#     python -m benchmarks.smtp_transport_check --count 200
+
+import argparse
+import smtplib
+import socket
+import time
+
+from aiosmtpd.controller import Controller
+
+from agent.transports import SmtpTransport, build_message
+
+class CountingHandler:
+    """Accepts every message and remembers its Message-ID."""
+
+    def __init__(self):
+        self.message_ids = []
+
+    async def handle_DATA(self, server, session, envelope):
+        for line in envelope.content.decode("utf-8", "replace").splitlines():
+            if line.lower().startswith("message-id:"):
+                self.message_ids.append(line.split(":", 1)[1].strip())
+        return "250 Message accepted for delivery"
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark pooled SMTP sending against a local stand-in server.")
+    parser.add_argument("--count", type=int, default=200, help="Messages per run.")
+    parser.add_argument("--port", type=int, default=8025)
+    args = parser.parse_args()
+
+    handler = CountingHandler()
+    controller = Controller(handler, hostname="127.0.0.1", port=args.port)
+    controller.start()
+    sender = "bench@example.com"
+    try:
+        # Baseline: connect (and say hello) for every single message.
+        started = time.perf_counter()
+        for i in range(args.count):
+            with smtplib.SMTP("127.0.0.1", args.port) as smtp:
+                smtp.send_message(build_message("to@example.com", f"Baseline #{i}", "Benchmark email.", sender))
+        baseline = time.perf_counter() - started
+
+        # Pooled: the transport keeps connections open and reuses them.
+        transport = SmtpTransport(host="127.0.0.1", port=args.port, security="none", pool_size=2)
+        before = len(handler.message_ids)
+        started = time.perf_counter()
+        for i in range(args.count):
+            if i == args.count // 2:
+                # Simulate the server dropping us: the next send must reconnect and still deliver.
+                for pool in transport._pools.values():
+                    for conn in list(pool._idle.queue):
+                        conn.smtp.sock.shutdown(socket.SHUT_RDWR)
+            transport.send("to@example.com", f"Pooled #{i}", "Benchmark email.", sender, "")
+        pooled = time.perf_counter() - started
+        transport.close()
+        delivered = len(handler.message_ids) - before
+    finally:
+        controller.stop()
+
+    print(f"new connection per message: {args.count / baseline:8.1f} msg/s ({baseline:.2f}s)")
+    print(f"pooled SmtpTransport:       {args.count / pooled:8.1f} msg/s ({pooled:.2f}s)")
+    print(f"transport stats: {transport.stats}")
+    assert delivered == args.count, f"expected {args.count} pooled messages, the server received {delivered}"
+    assert transport.stats["reconnects"] >= 1, "the dropped connection was not detected"
+    print("OK: every message was delivered and the dropped connection was recovered.")
+
+if __name__ == "__main__":
+    main()
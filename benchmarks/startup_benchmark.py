@@ -0,0 +1,110 @@
+# benchmarks/startup_benchmark.py
+# Startup benchmark for the desktop app, so slow-startup regressions get caught.
+#
+# It reports two things:
+# 1. An import-time breakdown of `import app` (python -X importtime), and a check that the heavy
+#    modules (the Gemini SDK and Playwright) are NOT imported before the window appears.
+# 2. Time-to-window and time-to-LLM-ready, measured by launching the real app with
+#    EMAIL_ASSISTANT_STARTUP_PROBE set. With --live it also measures time-to-first-LLM-call
+#    (this needs GEMINI_API_KEY and makes one real request). Step 2 needs a display.
+#
+#     python -m benchmarks.startup_benchmark --runs 5 --max-window-ms 1500
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# These must stay out of the window's critical path.
+HEAVY_MODULES = ("google.generativeai", "playwright", "numpy")
+
+def import_profile(top: int = 10) -> dict:
+    """Runs `python -X importtime -c "import app"` and summarises the slowest imports."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app"],
+        cwd=ROOT, capture_output=True, text=True, check=True,
+    )
+    rows = []
+    for line in result.stderr.splitlines():
+        # Lines look like: "import time:       123 |       4567 | package.module"
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        parts = [p.strip() for p in line[len("import time:"):].split("|")]
+        if not parts[0].isdigit():
+            continue  # The header line.
+        rows.append({"module": parts[2].strip(), "self_us": int(parts[0]), "cumulative_us": int(parts[1])})
+
+    app_row = next((r for r in rows if r["module"] == "app"), None)
+    heavy = sorted({r["module"] for r in rows if r["module"].startswith(HEAVY_MODULES)})
+    return {
+        "import_app_ms": app_row["cumulative_us"] / 1000 if app_row else None,
+        "slowest": sorted(rows, key=lambda r: r["cumulative_us"], reverse=True)[:top],
+        "heavy_modules_imported": heavy,
+    }
+
+def probe_once(live: bool, timeout: float = 120) -> dict:
+    """Launches the app once in probe mode and timestamps each marker line it prints."""
+    env = dict(os.environ, EMAIL_ASSISTANT_STARTUP_PROBE="live" if live else "1")
+    started = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "app.py"], cwd=ROOT, env=env, stdout=subprocess.PIPE, text=True)
+    marks = {}
+    try:
+        for line in process.stdout:
+            if line.startswith("STARTUP_PROBE "):
+                marks[line.split()[1] + "_ms"] = (time.perf_counter() - started) * 1000
+            if time.perf_counter() - started > timeout:
+                break
+        process.wait(timeout=10)
+    finally:
+        if process.poll() is None:
+            process.kill()
+    return marks
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure app startup time.")
+    parser.add_argument("--runs", type=int, default=5, help="How many times to launch the app.")
+    parser.add_argument("--live", action="store_true", help="Also time the first real LLM call (needs GEMINI_API_KEY).")
+    parser.add_argument("--imports-only", action="store_true", help="Only run the import-time check (no display needed).")
+    parser.add_argument("--max-window-ms", type=float, help="Fail if the median time-to-window is above this.")
+    parser.add_argument("--json", help="Also write the results to this JSON file.")
+    args = parser.parse_args()
+
+    results = {"imports": import_profile()}
+    print(f"`import app`: {results['imports']['import_app_ms']:.1f} ms")
+    for row in results["imports"]["slowest"]:
+        print(f"  {row['cumulative_us'] / 1000:8.1f} ms  {row['module']}")
+
+    failures = []
+    if results["imports"]["heavy_modules_imported"]:
+        failures.append(f"heavy modules imported before the window: {results['imports']['heavy_modules_imported']}")
+
+    if not args.imports_only:
+        runs = [probe_once(args.live) for _ in range(args.runs)]
+        results["runs"] = runs
+        summary = {}
+        for key in ("window_ready_ms", "llm_ready_ms", "llm_first_call_ms"):
+            values = [r[key] for r in runs if key in r]
+            if values:
+                summary[key] = {"median": statistics.median(values), "min": min(values), "max": max(values)}
+                print(f"{key:>20}: median {summary[key]['median']:.0f} ms  (min {summary[key]['min']:.0f}, max {summary[key]['max']:.0f})")
+        results["summary"] = summary
+        window = summary.get("window_ready_ms", {}).get("median")
+        if window is None:
+            failures.append("the app never reported that its window was ready")
+        elif args.max_window_ms and window > args.max_window_ms:
+            failures.append(f"median time-to-window {window:.0f} ms is above {args.max_window_ms:.0f} ms")
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+
+    for failure in failures:
+        print(f"FAIL: {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == "__main__":
+    main()
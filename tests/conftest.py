@@ -0,0 +1,38 @@
+import threading
+
+import pytest
+
+from agent import transports
+from agent.transports import Transport
+
+class RecordingTransport(Transport):
+    """Records every send instead of delivering it; 'error' fails every send, 'fail_for' only those recipients."""
+
+    name = "recording"
+
+    def __init__(self, error: Exception | None = None, fail_for=()):
+        self.error = error
+        self.fail_for = set(fail_for)
+        self.sent = []
+        self._lock = threading.Lock()
+
+    @property
+    def recipients(self) -> list[str]:
+        with self._lock:
+            return [recipient for recipient, *_ in self.sent]
+
+    def send(self, recipient, subject, body, sender_email, sender_password, message_id=None):
+        if recipient in self.fail_for:
+            raise RuntimeError("mailbox unavailable")
+        with self._lock:
+            self.sent.append((recipient, subject, sender_email, sender_password))
+        if self.error is not None:
+            raise self.error
+        return 0.0
+
+@pytest.fixture
+def transport(monkeypatch):
+    """A RecordingTransport registered as the "recording" transport for the test."""
+    recording = RecordingTransport()
+    monkeypatch.setitem(transports._transports, "recording", recording)
+    return recording
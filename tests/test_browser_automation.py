@@ -0,0 +1,89 @@
+from urllib.parse import parse_qs, urlsplit
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from agent import browser_automation, session_probe
+from agent.browser_automation import compose_url, send_direct
+from agent.session_probe import KnownGoodSessions
+
+RECIPIENT = "first+tag@example.com, o'neil@example.co.uk"
+SUBJECT = "Q&A: 50% off? #1 = yes / no"
+BODY = "Hi Zoë,\n\nTom & Jerry said a=b+c; see https://example.com/?x=1&y=2#top 😀\n\nBest regards,\nAda"
+
+def _fields(url: str) -> dict:
+    return {name: values[0] for name, values in parse_qs(urlsplit(url).query, keep_blank_values=True).items()}
+
+def test_compose_url_carries_every_field_exactly():
+    url, body_in_url = compose_url(RECIPIENT, SUBJECT, BODY)
+    assert body_in_url
+    # Nothing in the fields can end the query early or turn into a space.
+    assert urlsplit(url).fragment == ""
+    assert not set(" \n+") & set(url)
+    assert _fields(url) == {"view": "cm", "fs": "1", "tf": "1", "to": RECIPIENT, "su": SUBJECT, "body": BODY}
+
+def test_long_body_is_left_out_of_the_compose_url(monkeypatch):
+    monkeypatch.setattr(browser_automation, "COMPOSE_URL_MAX_CHARS", 300)
+    url, body_in_url = compose_url(RECIPIENT, SUBJECT, BODY * 5)
+    assert not body_in_url
+    assert "body" not in _fields(url)
+    assert _fields(url)["su"] == SUBJECT
+
+class FakeLocator:
+    def __init__(self, page, name):
+        self.page = page
+        self.name = name
+
+    def input_value(self):
+        return self.page.prefilled.get(self.name, "")
+
+    def fill(self, text):
+        self.page.actions.append(("fill", self.name, text))
+
+    def click(self):
+        self.page.actions.append(("click", self.name))
+
+    def wait_for(self, timeout=None):
+        pass
+
+class FakePage:
+    """A compose view that shows whatever the URL filled in (only the subject, like Gmail, is read back)."""
+
+    def __init__(self):
+        self.visited = []
+        self.actions = []
+        self.prefilled = {}
+
+    def goto(self, url, **options):
+        self.visited.append(url)
+        self.prefilled = {"Subject": _fields(url).get("su", "")}
+
+    def get_by_placeholder(self, name):
+        return FakeLocator(self, name)
+
+    def get_by_role(self, role, name=None):
+        return FakeLocator(self, name)
+
+    def get_by_text(self, text):
+        return FakeLocator(self, text)
+
+@pytest.fixture
+def logged_in(monkeypatch):
+    monkeypatch.setattr(session_probe, "known_good_sessions", KnownGoodSessions(None))
+    monkeypatch.setattr(session_probe, "expect_logged_in", lambda sender_email: True)
+    monkeypatch.setattr(session_probe, "detect_page_state", lambda page, timeout, target="inbox": target)
+
+def test_send_direct_opens_the_filled_compose_view_and_types_nothing(logged_in):
+    page = FakePage()
+    send_direct(page, RECIPIENT, SUBJECT, BODY, "me@example.com", "pw")
+    [url] = page.visited
+    assert _fields(url)["to"] == RECIPIENT and _fields(url)["body"] == BODY
+    assert page.actions == [("click", browser_automation.SEND_BUTTON_NAME)]
+    assert session_probe.known_good_sessions.is_known_good("me@example.com")
+
+def test_send_direct_types_a_body_too_long_for_the_url(logged_in, monkeypatch):
+    monkeypatch.setattr(browser_automation, "COMPOSE_URL_MAX_CHARS", 300)
+    page = FakePage()
+    send_direct(page, RECIPIENT, SUBJECT, BODY * 5, "me@example.com", "pw")
+    assert page.actions == [("fill", "Message Body", BODY * 5), ("click", browser_automation.SEND_BUTTON_NAME)]
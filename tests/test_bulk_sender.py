@@ -0,0 +1,56 @@
+import pytest
+
+from agent import bulk_sender
+from agent.outbox import Outbox
+
+@pytest.fixture
+def outbox(tmp_path, monkeypatch):
+    box = Outbox(str(tmp_path / "outbox.sqlite3"), workers=1, max_attempts=1, sender_per_minute=0)
+    monkeypatch.setattr(bulk_sender, "get_outbox", lambda: box)
+    yield box
+    box.stop()
+
+def drafted(recipients):
+    return [{"row": number, "recipient": recipient, "draft": {"subject": "Hi", "body": f"Hello {recipient}"},
+             "status": "pending", "error": ""} for number, recipient in enumerate(recipients, start=1)]
+
+def test_rerunning_a_file_only_sends_the_rows_that_did_not_go_out(tmp_path, outbox, transport):
+    source = str(tmp_path / "contacts.csv")
+    transport.fail_for = {"b@example.com"}
+    results = bulk_sender.send_drafts(drafted(["a@example.com", "b@example.com", "c@example.com"]), source,
+                                      "me@example.com", "pw", "recording", on_progress=lambda line: None)
+    assert [r["status"] for r in results] == ["sent", "send_failed", "sent"]
+    assert transport.recipients == ["a@example.com", "c@example.com"]
+
+    # The same file again, with freshly generated (different) drafts: only the failed row is new.
+    transport.fail_for = set()
+    rerun = drafted(["a@example.com", "b@example.com", "c@example.com"])
+    for result in rerun:
+        result["draft"]["body"] += " (regenerated)"
+    bulk_sender.send_drafts(rerun, source, "me@example.com", "pw", "recording", on_progress=lambda line: None)
+    assert transport.recipients == ["a@example.com", "c@example.com"]
+    # 'b' already failed for good under its key; it is reported, not sent twice.
+    assert [r["status"] for r in rerun] == ["sent", "send_failed", "sent"]
+
+def test_row_key_depends_on_file_and_row():
+    row = {"row": 3, "recipient": "A@Example.com"}
+    assert bulk_sender.row_key("a.csv", row) == bulk_sender.row_key("a.csv", {"row": 3, "recipient": "a@example.com"})
+    assert bulk_sender.row_key("a.csv", row) != bulk_sender.row_key("b.csv", row)
+    assert bulk_sender.row_key("a.csv", row) != bulk_sender.row_key("a.csv", dict(row, row=4))
+
+def test_draft_progress_is_reported_as_each_draft_completes(monkeypatch):
+    progress = []
+
+    async def fake_generate_many(requests, on_done=None):
+        # The second draft finishes first; each is reported the moment it is ready.
+        on_done(1, {"subject": "B", "body": "b"})
+        progress.append("after first")
+        on_done(0, None)
+        return []
+
+    monkeypatch.setattr(bulk_sender, "agenerate_many", fake_generate_many)
+    rows = [{"recipient": "a@example.com", "prompt": "x"}, {"recipient": "b@example.com", "prompt": "y"}]
+    results = bulk_sender.generate_drafts(rows, "Alex", None, on_progress=progress.append)
+    assert progress == ["[draft 2/2] b@example.com: ok", "after first",
+                        "[draft 1/2] a@example.com: The AI could not generate a draft for this row."]
+    assert [r["status"] for r in results] == ["draft_failed", "pending"]
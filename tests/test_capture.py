@@ -0,0 +1,76 @@
+import os
+from pathlib import Path
+
+import pytest
+
+from agent import capture
+from agent.capture import CaptureWriter, SendCapture
+
+class FakePage:
+    def __init__(self):
+        self.shots = 0
+
+    def screenshot(self, **options):
+        self.shots += 1
+        return f"{options.get('type', 'png')} {self.shots}".encode()
+
+@pytest.fixture
+def writer(tmp_path, monkeypatch):
+    recording = CaptureWriter(str(tmp_path), keep_runs=3)
+    monkeypatch.setattr(capture, "_writer", recording)
+    return recording
+
+def _files(writer, run) -> dict:
+    assert writer.flush(5)
+    folder = Path(writer.root) / run.run_dir
+    return {path.name: path.read_bytes() for path in sorted(folder.iterdir())} if folder.is_dir() else {}
+
+def test_on_failure_keeps_nothing_when_the_run_succeeds(writer):
+    run = SendCapture(FakePage(), "send me@example.com", mode="on-failure")
+    run.frame("01_login_page")
+    run.frame("04_inbox_loaded")
+    run.success()
+    assert _files(writer, run) == {}
+
+def test_on_failure_writes_the_last_frames_and_the_error(writer, monkeypatch):
+    monkeypatch.setattr(capture, "CAPTURE_RING_SIZE", 2)
+    run = SendCapture(FakePage(), "send me@example.com", mode="on-failure")
+    for name in ("01_login_page", "04_inbox_loaded", "05_email_composed"):
+        run.frame(name)
+    try:
+        raise TimeoutError("Message sent never showed")
+    except TimeoutError as e:
+        run.failure(e)
+    files = _files(writer, run)
+    # Only the ring buffer's last two frames (as JPEG), plus a final full screenshot and the traceback.
+    assert sorted(files) == ["04_inbox_loaded.jpg", "05_email_composed.jpg", "error.png", "error.txt"]
+    assert files["05_email_composed.jpg"] == b"jpeg 3"
+    assert files["error.png"] == b"png 4"
+    assert b"TimeoutError: Message sent never showed" in files["error.txt"]
+
+def test_full_mode_writes_every_frame(writer):
+    run = SendCapture(FakePage(), "send me@example.com", mode="full")
+    run.frame("01_login_page")
+    run.frame("06_email_sent")
+    run.success()
+    assert _files(writer, run) == {"01_login_page.png": b"png 1", "06_email_sent.png": b"png 2"}
+
+def test_off_mode_and_no_page_take_no_screenshots(writer):
+    page = FakePage()
+    for run in (SendCapture(page, "send", mode="off"), SendCapture(None, "send", mode="full")):
+        run.frame("01_login_page")
+        run.failure(RuntimeError("failed"))
+        assert _files(writer, run) == {}
+    assert page.shots == 0
+
+def test_each_run_gets_its_own_folder_and_old_runs_are_pruned(writer):
+    runs = []
+    for number in range(5):
+        run = SendCapture(FakePage(), f"send {number}", mode="full")
+        # Run folders are named after their start time; make the order explicit rather than sleeping.
+        run.run_dir = f"2025010{number}-000000_{run.run_dir.split('_', 1)[1]}"
+        run.frame("01_login_page")
+        assert writer.flush(5)
+        runs.append(run.run_dir)
+    assert len(set(runs)) == 5
+    assert sorted(os.listdir(writer.root)) == runs[-3:]
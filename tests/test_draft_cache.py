@@ -0,0 +1,55 @@
+import time
+
+from agent.draft_cache import MISS, DraftCache, make_key
+
+def test_make_key_is_stable_and_sensitive_to_every_part():
+    assert make_key("generation", "Ada", "prompt") == make_key("generation", "Ada", "prompt")
+    assert make_key("generation", "Ada", "prompt") != make_key("generation", "Ada", "prompt ")
+    assert make_key("generation", "Ada", "prompt") != make_key("analysis", "Ada", "prompt")
+
+def test_none_is_cached_and_distinct_from_a_miss():
+    cache = DraftCache(None)
+    assert cache.get("k") is MISS
+    cache.put("k", None, kind="analysis")
+    assert cache.get("k") is None
+    assert cache.stats["misses"] == 1 and cache.stats["memory_hits"] == 1
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    path = str(tmp_path / "drafts.sqlite3")
+    DraftCache(path).put("k", {"subject": "Hi", "body": "Hello"})
+    reopened = DraftCache(path)
+    assert reopened.get("k") == {"subject": "Hi", "body": "Hello"}
+    assert reopened.stats["disk_hits"] == 1
+    # Now it is in memory too.
+    reopened.get("k")
+    assert reopened.stats["memory_hits"] == 1
+
+def test_entries_expire(tmp_path):
+    cache = DraftCache(str(tmp_path / "drafts.sqlite3"), ttl=0.05)
+    cache.put("k", "v")
+    time.sleep(0.1)
+    assert cache.get("k") is MISS
+
+def test_memory_tier_drops_the_least_recently_used():
+    cache = DraftCache(None, memory_entries=2)
+    cache.put("a", 1)
+    cache.put("b", 2)
+    cache.get("a")
+    cache.put("c", 3)
+    assert cache.get("b") is MISS
+    assert cache.get("a") == 1 and cache.get("c") == 3
+
+def test_disk_tier_is_trimmed(tmp_path):
+    cache = DraftCache(str(tmp_path / "drafts.sqlite3"), memory_entries=1, disk_entries=3)
+    for i in range(10):
+        cache.put(f"k{i}", i)
+    rows = cache._db.execute("SELECT COUNT(*) FROM cache").fetchone()[0]
+    assert rows == 3
+    assert cache.get("k9") == 9
+    assert cache.get("k0") is MISS
+
+def test_clear_empties_both_tiers(tmp_path):
+    cache = DraftCache(str(tmp_path / "drafts.sqlite3"))
+    cache.put("k", "v")
+    cache.clear()
+    assert cache.get("k") is MISS
@@ -0,0 +1,61 @@
+import pytest
+
+pytest.importorskip("numpy")
+
+from agent.draft_index import DRAFT_SUGGESTION_MIN_SIMILARITY, DraftIndex
+
+DRAFTS = [
+    ("thank you note to the hiring team after my interview", "Thank you for the interview"),
+    ("sick leave for tomorrow because of a fever", "Leave request: tomorrow"),
+    ("refund request for order 10023 because it arrived damaged", "Refund request for order 10023"),
+    ("schedule a meeting with Priya next monday to discuss the roadmap", "Meeting to discuss the roadmap"),
+    ("congratulate Alex on the product launch", "Congratulations on the product launch"),
+]
+
+def _filled(folder, merge_every: int = 1024, copies: int = 1) -> DraftIndex:
+    index = DraftIndex(str(folder), bits=16, merge_every=merge_every)
+    for i in range(copies):
+        for prompt, subject in DRAFTS:
+            index.add(f"{prompt} {i}" if i else prompt, {"subject": subject, "body": "..."}, user_name="Ada")
+    return index
+
+def _all_scores(index: DraftIndex) -> list[float]:
+    return [match["score"] for prompt, subject in DRAFTS for match in index.search(f"{prompt} {subject}", k=len(index))]
+
+def test_identical_draft_scores_close_to_one(tmp_path):
+    index = _filled(tmp_path)
+    prompt, subject = DRAFTS[1]
+    [best] = index.search(f"{prompt} {subject}", k=1)
+    assert best["subject"] == subject
+    assert best["score"] == pytest.approx(1.0, abs=1e-3)
+
+def test_request_without_shared_words_is_not_suggested(tmp_path):
+    index = _filled(tmp_path)
+    assert index.search("quarterly tax filing reminder for the accountant", k=3) == []
+
+def test_unrelated_request_sharing_a_few_words_stays_under_the_suggestion_threshold(tmp_path):
+    index = _filled(tmp_path)
+    request = "resignation letter to my manager, my last working day at the team is Friday, thank you"
+    assert index.search(request, k=1, min_score=DRAFT_SUGGESTION_MIN_SIMILARITY) == []
+
+def test_scores_never_exceed_one_before_and_after_a_merge(tmp_path):
+    index = _filled(tmp_path, merge_every=1024, copies=3)
+    assert index.stats["merges"] == 0
+    before = _all_scores(index)
+    index.save()
+    assert index.stats["merges"] == 1
+    after = _all_scores(index)
+    assert before and max(before) <= 1.0 and max(after) <= 1.0
+    assert before == after
+
+def test_persist_and_reload_round_trip(tmp_path):
+    index = _filled(tmp_path, merge_every=3)
+    # One draft after the last snapshot, which is re-indexed from drafts.jsonl on load.
+    index.add("farewell email to my team, today is my last day", {"subject": "Goodbye", "body": "..."}, user_name="Bo")
+    expected = index.search("sick leave tomorrow fever", k=3)
+
+    reloaded = DraftIndex(str(tmp_path), bits=16, merge_every=3)
+    assert len(reloaded) == len(DRAFTS) + 1
+    assert reloaded.search("sick leave tomorrow fever", k=3) == expected
+    assert reloaded.search("farewell to my team", k=1, user_name="Bo")[0]["subject"] == "Goodbye"
+    assert reloaded.search("farewell to my team", k=1, user_name="Ada")[0]["subject"] != "Goodbye"
@@ -0,0 +1,36 @@
+import json
+
+from agent.draft_stream import StreamingDraftParser
+
+def _feed_all(chunks):
+    parser = StreamingDraftParser()
+    deltas = []
+    for chunk in chunks:
+        deltas.extend(parser.feed(chunk))
+    return deltas
+
+def _joined(deltas):
+    fields = {}
+    for field, text in deltas:
+        fields[field] = fields.get(field, "") + text
+    return fields
+
+def test_one_character_at_a_time_matches_json_loads():
+    draft = {"subject": "Hi \"there\"", "body": "Line one\nLine two\ttabbed \\ done é \U0001F600"}
+    text = "```json\n" + json.dumps(draft) + "\n```"
+    deltas = _feed_all(list(text))
+    assert _joined(deltas) == draft
+    assert all(text for _, text in deltas)
+
+def test_surrogate_pair_split_across_chunks_emits_no_empty_delta():
+    deltas = _feed_all(['{"subject": "Hi ', '\\ud83d', '\\ude00', '!", "body": ""}'])
+    assert ("subject", "") not in deltas
+    assert _joined(deltas)["subject"] == "Hi \U0001F600!"
+
+def test_lone_surrogate_halves_become_replacement_characters():
+    deltas = _feed_all(['{"subject": "a\\ud83db\\ude00c\\ud83d"}'])
+    assert _joined(deltas)["subject"] == "a�b�c�"
+
+def test_other_fields_and_values_are_skipped():
+    text = '{"meta": {"tone": "formal", "n": [1, 2]}, "count": 3, "subject": "S", "body": "B"}'
+    assert _joined(_feed_all([text[:20], text[20:]])) == {"subject": "S", "body": "B"}
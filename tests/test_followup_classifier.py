@@ -0,0 +1,84 @@
+import json
+
+import pytest
+
+from agent.followup_classifier import FollowupClassifier, extract_entities, load_decisions, replay
+
+@pytest.fixture
+def classifier():
+    return FollowupClassifier(None, audit_rate=0.0)
+
+@pytest.mark.parametrize("prompt", [
+    "Ask the courier to leave the package at the security desk",
+    "happy holiday greetings to my team",
+    "Thank my manager for approving my vacation",
+    "I am sick of the noise, complain to the landlord",
+])
+def test_words_that_are_not_leave_requests_get_no_leave_question(classifier, prompt):
+    decision = classifier.classify(prompt)
+    assert decision.question != "For what dates will you be on leave?"
+    assert decision.needs_followup is not True
+
+@pytest.mark.parametrize("prompt", [
+    "I need a day off",
+    "leave application for 2 days",
+    "I will be absent for a week",
+])
+def test_a_duration_is_not_a_date(classifier, prompt):
+    decision = classifier.classify(prompt)
+    assert decision.needs_followup is True
+    assert decision.source == "rules"
+
+def test_absent_for_a_week_is_left_to_the_model(classifier):
+    assert classifier.classify("absent for a week").needs_followup is None
+
+@pytest.mark.parametrize("prompt", [
+    "sick leave for tomorrow and the day after",
+    "apply for leave from 12th to 15th March",
+    "inform my team I'll be on leave from Monday to Wednesday",
+])
+def test_leave_request_with_dates_needs_nothing_more(classifier, prompt):
+    decision = classifier.classify(prompt)
+    assert decision.needs_followup is False
+    assert decision.source == "rules"
+
+@pytest.mark.parametrize("prompt", [
+    "I need 1.5 days of leave",
+    "leave the office early, the update to 2.10.1 is done",
+    "sick leave, server 10.0.0.1 can wait",
+])
+def test_decimals_and_version_numbers_are_not_dates(prompt):
+    assert extract_entities(prompt)["date"] == []
+
+@pytest.mark.parametrize("prompt", ["leave on 12/03", "leave from 12-03-2025", "leave on 12.03.2025."])
+def test_numeric_dates_are_dates(prompt):
+    assert len(extract_entities(prompt)["date"]) == 1
+
+def test_mixed_intents_go_to_the_model(classifier):
+    decision = classifier.classify("thank the team and schedule a meeting on Friday")
+    assert decision.needs_followup is None
+    assert decision.source == "llm"
+
+def test_audited_answers_are_not_used_but_are_logged(tmp_path):
+    log_path = tmp_path / "decisions.jsonl"
+    auditing = FollowupClassifier(str(log_path), audit_rate=1.0)
+    decision = auditing.classify("sick leave for tomorrow")
+    assert decision.audit and not decision.is_local
+    assert decision.needs_followup is False
+    auditing.record("sick leave for tomorrow", "Which team should be told?", decision)
+    record = json.loads(log_path.read_text(encoding="utf-8"))
+    assert record["local"]["audit"] is True
+
+def test_replay_reports_rules_and_model_separately(tmp_path):
+    log_path = tmp_path / "decisions.jsonl"
+    auditing = FollowupClassifier(str(log_path), audit_rate=1.0)
+    for prompt, question in [("sick leave for tomorrow", None), ("thank you note to the hiring team", "To whom?"),
+                             ("email my landlord about the heater", None)]:
+        auditing.record(prompt, question, auditing.classify(prompt))
+
+    report = replay(load_decisions(str(log_path)))
+    assert report["rules"] == {"answered": 2, "agreement": 0.5}
+    # Three decisions are not enough for the learned model to answer, so it has no agreement figure.
+    assert report["model"] == {"answered": 0, "agreement": None}
+    assert report["audited_live"]["rules"] == {"answered": 2, "agreement": 0.5}
+    assert "agreement" not in report
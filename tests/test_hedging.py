@@ -0,0 +1,77 @@
+import asyncio
+import time
+
+import pytest
+
+from agent import hedging
+from agent.hedging import DeadlineExceeded, HedgedCall, LatencyTracker
+
+@pytest.fixture(autouse=True)
+def quick_hedges(monkeypatch):
+    # Without enough samples the hedge waits LLM_HEDGE_DEFAULT_DELAY; keep that short for the tests.
+    monkeypatch.setattr(hedging, "LLM_HEDGE_DEFAULT_DELAY", 0.05)
+
+def test_async_deadline_gives_up_and_cancels_the_attempt():
+    cancelled = []
+
+    async def never_answers(attempt):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            cancelled.append(attempt.index)
+            raise
+
+    async def run():
+        await HedgedCall("test", deadline=0.1, hedge=False, tracker=LatencyTracker()).arun(never_answers)
+
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        asyncio.run(run())
+    assert time.monotonic() - started < 1.0
+    assert cancelled == [0]
+
+def test_threaded_deadline():
+    call = HedgedCall("test", deadline=0.1, hedge=False, tracker=LatencyTracker())
+    started = time.monotonic()
+    with pytest.raises(DeadlineExceeded):
+        call.run(lambda attempt: time.sleep(0.5))
+    assert time.monotonic() - started < 0.4
+
+def test_slow_first_request_is_hedged_and_the_hedge_wins():
+    tracker = LatencyTracker()
+
+    async def attempt_fn(attempt):
+        await asyncio.sleep(1.0 if attempt.index == 0 else 0.01)
+        return attempt.index
+
+    assert asyncio.run(HedgedCall("test", deadline=2, tracker=tracker).arun(attempt_fn)) == 1
+    assert tracker.counts["hedges"] == 1 and tracker.counts["hedge_wins"] == 1
+
+def test_failed_first_request_sends_the_hedge_at_once(monkeypatch):
+    monkeypatch.setattr(hedging, "LLM_HEDGE_DEFAULT_DELAY", 5.0)
+
+    async def attempt_fn(attempt):
+        if attempt.index == 0:
+            raise ValueError("unusable answer")
+        return "ok"
+
+    started = time.monotonic()
+    assert asyncio.run(HedgedCall("test", deadline=10, tracker=LatencyTracker()).arun(attempt_fn)) == "ok"
+    assert time.monotonic() - started < 1.0
+
+def test_hedges_stay_within_the_budget():
+    tracker = LatencyTracker()
+
+    async def attempt_fn(attempt):
+        await asyncio.sleep(0.2 if attempt.index == 0 else 0.0)
+        return attempt.index
+
+    async def run():
+        for _ in range(20):
+            await HedgedCall("test", deadline=2, tracker=tracker).arun(attempt_fn)
+
+    asyncio.run(run())
+    counts = tracker.counts
+    assert counts["calls"] == 20
+    assert counts["hedges"] <= hedging.LLM_HEDGE_MAX_RATIO * counts["calls"] + 1
+    assert counts["refused"] == counts["calls"] - counts["hedges"]
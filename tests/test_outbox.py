@@ -0,0 +1,111 @@
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from agent.outbox import Outbox
+from agent.transports import AmbiguousSendError
+
+def wait_for(predicate, timeout: float = 5.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if predicate():
+            return
+        time.sleep(0.01)
+    raise AssertionError("condition not reached in time")
+
+def test_same_key_is_sent_once(tmp_path, transport):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), workers=2, sender_per_minute=0)
+    try:
+        first_id, created = outbox.enqueue("to@example.com", "Hi", "Body", "me@example.com", "pw", transport="recording", idempotency_key="k1")
+        wait_for(lambda: outbox.get(first_id)["status"] == "sent")
+        second_id, created_again = outbox.enqueue("to@example.com", "Hi", "Body", "me@example.com", "pw", transport="recording", idempotency_key="k1")
+    finally:
+        outbox.stop()
+    assert created and not created_again
+    assert first_id == second_id
+    assert len(transport.sent) == 1
+
+def test_on_done_reports_an_already_finished_email(tmp_path, transport):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), workers=1, sender_per_minute=0)
+    done = threading.Event()
+    try:
+        outbox_id, _ = outbox.enqueue("to@example.com", "Hi", "Body", "me@example.com", "pw", transport="recording")
+        wait_for(lambda: outbox.get(outbox_id)["status"] == "sent")
+        outbox.enqueue("to@example.com", "Hi", "Body", "me@example.com", "pw", transport="recording", on_done=lambda row: done.set())
+        assert done.wait(5)
+    finally:
+        outbox.stop()
+    assert len(transport.sent) == 1
+
+def test_interrupted_send_is_marked_uncertain_on_restart(tmp_path):
+    path = str(tmp_path / "outbox.sqlite3")
+    Outbox(path, workers=0).stop()
+    db = sqlite3.connect(path, isolation_level=None)
+    db.execute("INSERT INTO outbox (idempotency_key, sender, recipient, subject, body, transport, status, attempts,"
+               " next_attempt_at, created_at, updated_at) VALUES ('k', 'me@example.com', 'to@example.com', 'Hi', 'Body',"
+               " 'recording', 'sending', 1, 0, 0, 0)")
+    db.close()
+
+    outbox = Outbox(path, workers=0)
+    assert outbox.get(1)["status"] == "uncertain"
+
+def test_ambiguous_send_is_not_retried(tmp_path, transport):
+    transport.error = AmbiguousSendError("no confirmation")
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), workers=1, sender_per_minute=0)
+    try:
+        outbox_id, _ = outbox.enqueue("to@example.com", "Hi", "Body", "me@example.com", "pw", transport="recording")
+        wait_for(lambda: outbox.get(outbox_id)["status"] == "uncertain")
+        time.sleep(0.1)
+    finally:
+        outbox.stop()
+    assert len(transport.sent) == 1
+
+def test_email_queued_before_a_restart_waits_for_the_password(tmp_path, transport):
+    path = str(tmp_path / "outbox.sqlite3")
+    # Queued, then the app stopped before any worker picked it up.
+    before = Outbox(path, workers=0)
+    outbox_id, _ = before.enqueue("to@example.com", "Hi", "Body", "me@example.com", "pw", transport="recording")
+    before.stop()
+
+    outbox = Outbox(path, workers=1, sender_per_minute=0)
+    try:
+        outbox.start()
+        wait_for(lambda: outbox.get(outbox_id)["status"] == "needs_credentials")
+        assert transport.sent == []
+        assert outbox.metrics()["needs_credentials"] == 1
+
+        assert outbox.set_credentials("me@example.com", "secret") == 1
+        wait_for(lambda: outbox.get(outbox_id)["status"] == "sent")
+    finally:
+        outbox.stop()
+    assert transport.sent == [("to@example.com", "Hi", "me@example.com", "secret")]
+
+def test_enqueue_supplies_the_password_for_waiting_emails(tmp_path, transport):
+    path = str(tmp_path / "outbox.sqlite3")
+    before = Outbox(path, workers=0)
+    waiting_id, _ = before.enqueue("first@example.com", "Hi", "Body", "me@example.com", "pw", transport="recording")
+    before.stop()
+
+    outbox = Outbox(path, workers=1, sender_per_minute=0)
+    try:
+        outbox.start()
+        wait_for(lambda: outbox.get(waiting_id)["status"] == "needs_credentials")
+        new_id, _ = outbox.enqueue("second@example.com", "Hello", "Body", "me@example.com", "secret", transport="recording")
+        wait_for(lambda: outbox.get(waiting_id)["status"] == "sent" and outbox.get(new_id)["status"] == "sent")
+    finally:
+        outbox.stop()
+    assert {password for *_, password in transport.sent} == {"secret"}
+
+def test_a_rate_limited_backlog_does_not_hide_other_senders(tmp_path, transport):
+    outbox = Outbox(str(tmp_path / "outbox.sqlite3"), workers=1, sender_per_minute=1)
+    try:
+        for i in range(250):
+            outbox.enqueue(f"to{i}@example.com", "Hi", "Body", "busy@example.com", "pw", transport="recording")
+        wait_for(lambda: len(transport.sent) == 1)
+        other_id, _ = outbox.enqueue("to@example.com", "Hi", "Body", "other@example.com", "pw", transport="recording")
+        wait_for(lambda: outbox.get(other_id)["status"] == "sent")
+    finally:
+        outbox.stop()
+    assert [sender for _, _, sender, _ in transport.sent] == ["busy@example.com", "other@example.com"]
@@ -0,0 +1,52 @@
+import json
+import os
+
+from agent.profile_manager import list_profiles, move
+from agent.profiles import load_storage_state, local_storage_script
+
+STATE = {
+    "cookies": [{"name": "SID", "value": "x", "domain": ".google.com", "path": "/"}],
+    "origins": [{"origin": "https://mail.google.com", "localStorage": [{"name": "gmail.settings", "value": "{}"}]}],
+}
+
+def _make_profile(root, name: str, state: dict | None = STATE):
+    folder = root / name
+    (folder / "Default").mkdir(parents=True)
+    (folder / "Default" / "Cookies").write_bytes(b"cookies")
+    if state is not None:
+        (root / f"{name}.storage_state.json").write_text(json.dumps(state), encoding="utf-8")
+
+def test_move_takes_the_folder_and_the_storage_state(tmp_path):
+    source, root = tmp_path / "old", tmp_path / "new"
+    source.mkdir()
+    _make_profile(source, "profile_a_example_com")
+    [report] = move(str(source), str(root))
+    assert len(report["moved_to"]) == 2
+    assert [profile["profile"] for profile in list_profiles(str(root))] == ["profile_a_example_com"]
+    assert not os.listdir(source)
+
+def test_move_leaves_the_whole_profile_when_either_target_exists(tmp_path):
+    source, root = tmp_path / "old", tmp_path / "new"
+    source.mkdir()
+    root.mkdir()
+    _make_profile(source, "profile_a_example_com")
+    # Only the storage_state is already there; the folder must not be moved on its own.
+    (root / "profile_a_example_com.storage_state.json").write_text("{}", encoding="utf-8")
+    [report] = move(str(source), str(root))
+    assert "skipped" in report
+    assert (source / "profile_a_example_com").is_dir()
+    assert (source / "profile_a_example_com.storage_state.json").exists()
+    assert not (root / "profile_a_example_com").exists()
+
+def test_load_storage_state_keeps_the_origins(tmp_path):
+    path = tmp_path / "state.json"
+    path.write_text(json.dumps(STATE), encoding="utf-8")
+    assert load_storage_state(str(path)) == STATE
+    path.write_text(json.dumps({"cookies": [], "origins": STATE["origins"]}), encoding="utf-8")
+    assert load_storage_state(str(path)) is None
+
+def test_local_storage_script():
+    assert local_storage_script([]) is None
+    assert local_storage_script([{"origin": "https://mail.google.com", "localStorage": []}]) is None
+    script = local_storage_script(STATE["origins"])
+    assert '"https://mail.google.com"' in script and "gmail.settings" in script
@@ -0,0 +1,66 @@
+import asyncio
+import time
+
+from agent.rate_limiter import AsyncRateLimiter, estimate_tokens
+
+def test_estimate_tokens():
+    assert estimate_tokens("") == 1
+    assert estimate_tokens("x" * 400) == 100
+
+def test_no_limits_never_waits():
+    async def run():
+        limiter = AsyncRateLimiter(None, 0)
+        started = time.monotonic()
+        for _ in range(1000):
+            await limiter.acquire(10_000)
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 0.5
+
+def test_requests_per_minute_spaces_out_calls_past_the_burst():
+    async def run():
+        # 600 per minute: a burst of 600, then one every 0.1 s.
+        limiter = AsyncRateLimiter(requests_per_minute=600)
+        for _ in range(600):
+            await limiter.acquire()
+        started = time.monotonic()
+        for _ in range(3):
+            await limiter.acquire()
+        return time.monotonic() - started
+
+    assert 0.25 <= asyncio.run(run()) < 0.6
+
+def test_tokens_per_minute_holds_back_a_big_request():
+    async def run():
+        limiter = AsyncRateLimiter(tokens_per_minute=600)
+        await limiter.acquire(600)
+        started = time.monotonic()
+        await limiter.acquire(20)  # 10 tokens per second refill.
+        return time.monotonic() - started
+
+    assert 1.5 <= asyncio.run(run()) < 2.5
+
+def test_request_bigger_than_the_bucket_still_goes_through():
+    async def run():
+        limiter = AsyncRateLimiter(tokens_per_minute=60)
+        started = time.monotonic()
+        await limiter.acquire(10_000)
+        return time.monotonic() - started
+
+    assert asyncio.run(run()) < 0.1
+
+def test_waiters_are_served_in_order():
+    async def run():
+        limiter = AsyncRateLimiter(requests_per_minute=1200)
+        for _ in range(1200):
+            await limiter.acquire()
+        order = []
+
+        async def waiter(i):
+            await limiter.acquire()
+            order.append(i)
+
+        await asyncio.gather(*(waiter(i) for i in range(5)))
+        return order
+
+    assert asyncio.run(run()) == [0, 1, 2, 3, 4]
@@ -0,0 +1,58 @@
+from agent.revision import RevisionContext, RevisionTimer
+
+DRAFT = {"subject": "Leave request", "body": "Dear Ms. Rao,\n\nI would like to request leave on Friday.\n\nBest regards,\nAda"}
+
+def test_request_text_adds_follow_up_answers():
+    context = RevisionContext("leave request to my manager")
+    context.add_detail("Friday the 12th")
+    assert context.request_text() == "leave request to my manager. Additional details: Friday the 12th"
+
+def test_render_shows_the_draft_and_the_feedback_once():
+    context = RevisionContext("leave request")
+    context.set_draft(DRAFT)
+    context.add_feedback("make it  shorter")
+    context.add_feedback("Make it shorter")
+    context.add_feedback("mention the project handover")
+    rendered = context.render()
+    assert DRAFT["body"] in rendered
+    assert rendered.count("shorter") == 1
+    assert rendered.index("shorter") < rendered.index("handover")
+    assert rendered.count("Original request") == 1
+
+def test_set_draft_keeps_its_own_copy():
+    context = RevisionContext("leave request")
+    draft = dict(DRAFT)
+    context.set_draft(draft)
+    draft["subject"] = "changed"
+    assert context.draft["subject"] == "Leave request"
+
+def test_context_stays_within_budget_and_keeps_the_newest_feedback():
+    context = RevisionContext("leave request", token_budget=120)
+    context.set_draft(DRAFT)
+    for i in range(20):
+        context.add_feedback(f"change number {i}: " + "please adjust the wording " * 10)
+    assert context.token_count() <= 120 or len(context.feedback) == 1
+    assert context.feedback[-1].startswith("change number 19")
+    assert context.dropped_feedback > 0
+    assert "already applied" in context.render()
+
+def test_many_rounds_do_not_grow_the_prompt_without_bound():
+    context = RevisionContext("leave request", token_budget=300)
+    context.set_draft(DRAFT)
+    sizes = []
+    for i in range(30):
+        context.add_feedback(f"round {i}: tweak the tone a little more")
+        sizes.append(context.token_count())
+    assert max(sizes) <= 300
+
+def test_revision_timer_records_rounds(capsys):
+    context = RevisionContext("leave request")
+    with RevisionTimer(context, "revise", "x" * 400) as timer:
+        timer.ok = True
+    try:
+        with RevisionTimer(context, "revise", "x" * 40):
+            raise RuntimeError("model down")
+    except RuntimeError:
+        pass
+    assert [(r["round"], r["prompt_tokens"], r["ok"]) for r in context.rounds] == [(1, 100, True), (2, 10, False)]
+    assert "Revision round 1" in capsys.readouterr().out
@@ -0,0 +1,129 @@
+import asyncio
+import json
+import struct
+
+import pytest
+
+from agent.server import ConversationServer, ModelBackend, MAX_BODY_BYTES, read_ws_frame
+
+class SlowBackend(ModelBackend):
+    def __init__(self, latency: float = 0.0):
+        self.latency = latency
+
+    async def analyze(self, prompt):
+        await asyncio.sleep(self.latency)
+        return None
+
+    async def generate(self, user_name, prompt, regenerate=False):
+        await asyncio.sleep(self.latency)
+        return {"subject": "Hello", "body": f"Hello,\n\n{prompt}\n\nBest regards,\n{user_name}"}
+
+    async def revise(self, user_name, context):
+        context.set_draft(context.draft)
+        return context.draft
+
+async def _serve(backend: ModelBackend):
+    server = ConversationServer(backend=backend)
+    port = await server.start("127.0.0.1", 0)
+    return server, port
+
+async def _exchange(port: int, raw: bytes) -> bytes:
+    reader, writer = await asyncio.open_connection("127.0.0.1", port)
+    writer.write(raw)
+    await writer.drain()
+    data = await reader.read()
+    writer.close()
+    return data
+
+def test_model_backend_must_implement_every_call():
+    class Partial(ModelBackend):
+        async def analyze(self, prompt):
+            return None
+
+    with pytest.raises(TypeError):
+        Partial()
+
+def test_malformed_content_length_is_a_bad_request():
+    async def run():
+        server, port = await _serve(SlowBackend())
+        try:
+            return await _exchange(port, b"POST /sessions HTTP/1.1\r\nContent-Length: abc\r\n\r\n")
+        finally:
+            await server.stop()
+
+    response = asyncio.run(run())
+    assert response.startswith(b"HTTP/1.1 400 ")
+    assert b"Content-Length" in response
+
+def test_oversized_websocket_frame_gets_close_1009():
+    async def run():
+        server, port = await _serve(SlowBackend())
+        try:
+            served, _ = server.create_session()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write((f"GET /sessions/{served.session.session_id}/ws HTTP/1.1\r\nUpgrade: websocket\r\n"
+                          "Connection: Upgrade\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n\r\n").encode("latin-1"))
+            await reader.readuntil(b"\r\n\r\n")
+            await read_ws_frame(reader)  # the current state of the session
+            # Only the header: the server has to refuse the frame from its announced length alone.
+            writer.write(struct.pack("!BBQ", 0x81, 0x80 | 127, MAX_BODY_BYTES + 1))
+            await writer.drain()
+            frame = await read_ws_frame(reader)
+            rest = await reader.read()
+            writer.close()
+            return frame, rest
+        finally:
+            await server.stop()
+
+    (_, opcode, payload), rest = asyncio.run(run())
+    assert opcode == 0x8
+    assert struct.unpack("!H", payload[:2])[0] == 1009
+    assert b"HTTP/1.1" not in rest
+
+def test_fragmented_message_over_the_limit_gets_close_1009():
+    chunk = b"x" * (MAX_BODY_BYTES // 2)
+
+    async def run():
+        server, port = await _serve(SlowBackend())
+        try:
+            served, _ = server.create_session()
+            reader, writer = await asyncio.open_connection("127.0.0.1", port)
+            writer.write((f"GET /sessions/{served.session.session_id}/ws HTTP/1.1\r\nUpgrade: websocket\r\n"
+                          "Connection: Upgrade\r\nSec-WebSocket-Key: dGhlIHNhbXBsZSBub25jZQ==\r\n\r\n").encode("latin-1"))
+            await reader.readuntil(b"\r\n\r\n")
+            await read_ws_frame(reader)  # the current state of the session
+            # A text frame and continuation frames, each under the limit, never marked final.
+            writer.write(struct.pack("!BBQ", 0x01, 127, len(chunk)) + chunk)
+            for _ in range(3):
+                writer.write(struct.pack("!BBQ", 0x00, 127, len(chunk)) + chunk)
+            await writer.drain()
+            frame = await asyncio.wait_for(read_ws_frame(reader), 5)
+            writer.close()
+            return frame
+        finally:
+            await server.stop()
+
+    _, opcode, payload = asyncio.run(run())
+    assert opcode == 0x8
+    assert struct.unpack("!H", payload[:2])[0] == 1009
+
+def test_delete_waits_for_the_running_event():
+    async def run():
+        server, port = await _serve(SlowBackend(latency=0.2))
+        try:
+            served, _ = server.create_session()
+            session_id = served.session.session_id
+            served.session.submit("to@example.com")
+            served.session.submit("Ada")
+            # Analysis and generation each take 0.2 s; the DELETE arrives while the first is still running.
+            event = asyncio.create_task(server.handle_event(served, "message", {"text": "Ask for the report by Friday"}))
+            await asyncio.sleep(0.05)
+            reply = await _exchange(port, f"DELETE /sessions/{session_id} HTTP/1.1\r\nConnection: close\r\n\r\n".encode("latin-1"))
+            return event.done(), served.lock.locked(), reply, session_id in server.sessions
+        finally:
+            await server.stop()
+
+    event_done, locked, reply, still_open = asyncio.run(run())
+    assert reply.startswith(b"HTTP/1.1 200 ")
+    assert event_done and not locked
+    assert not still_open
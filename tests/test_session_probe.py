@@ -0,0 +1,80 @@
+import json
+import os
+import sqlite3
+import time
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from agent import profiles, session_probe
+from agent.profiles import profile_dir_for, storage_state_path_for
+from agent.session_probe import KnownGoodSessions, has_stored_session, record_check, stored_session_expiry
+
+SENDER = "me@example.com"
+
+@pytest.fixture(autouse=True)
+def profile_root(tmp_path, monkeypatch):
+    monkeypatch.setattr(profiles, "PROFILE_ROOT", str(tmp_path))
+    return tmp_path
+
+def _write_state(cookies):
+    with open(storage_state_path_for(SENDER), "w", encoding="utf-8") as f:
+        json.dump({"cookies": cookies, "origins": []}, f)
+
+def _write_cookie_db(rows):
+    folder = os.path.join(profile_dir_for(SENDER), "Default", "Network")
+    os.makedirs(folder)
+    with sqlite3.connect(os.path.join(folder, "Cookies")) as db:
+        db.execute("CREATE TABLE cookies (host_key TEXT, name TEXT, expires_utc INTEGER)")
+        db.executemany("INSERT INTO cookies VALUES (?, ?, ?)", rows)
+
+def _chrome_time(unix_seconds: float) -> int:
+    return int((unix_seconds + session_probe._CHROME_EPOCH_OFFSET) * 1_000_000)
+
+def test_no_profile_means_no_session():
+    assert stored_session_expiry(SENDER) is None
+    assert not has_stored_session(SENDER)
+
+def test_storage_state_session_cookie():
+    expires = time.time() + 3600
+    _write_state([{"name": "NID", "domain": ".google.com", "expires": expires + 1000},
+                  {"name": "SID", "domain": ".google.com", "expires": expires}])
+    assert stored_session_expiry(SENDER) == pytest.approx(expires)
+    assert has_stored_session(SENDER)
+
+def test_expired_or_foreign_cookies_do_not_count():
+    _write_state([{"name": "SID", "domain": ".google.com", "expires": time.time() - 60},
+                  {"name": "SID", "domain": ".example.com", "expires": time.time() + 3600}])
+    assert not has_stored_session(SENDER)
+
+def test_browser_session_cookie_never_expires():
+    _write_state([{"name": "OSID", "domain": "mail.google.com", "expires": -1}])
+    assert stored_session_expiry(SENDER) == float("inf")
+
+def test_chromium_cookie_store():
+    expires = time.time() + 3600
+    _write_cookie_db([(".google.com", "__Secure-1PSID", _chrome_time(expires)),
+                      (".google.com", "NID", _chrome_time(expires + 1000)),
+                      (".example.com", "SID", _chrome_time(expires + 1000))])
+    assert stored_session_expiry(SENDER) == pytest.approx(expires, abs=1e-3)
+    assert has_stored_session(SENDER)
+
+def test_known_good_sessions_expire_and_persist(tmp_path):
+    path = str(tmp_path / "known_good.json")
+    sessions = KnownGoodSessions(path, ttl=3600)
+    sessions.mark_good(SENDER)
+    assert KnownGoodSessions(path).is_known_good(SENDER)
+    sessions.forget(SENDER)
+    assert not KnownGoodSessions(path).is_known_good(SENDER)
+    expired = KnownGoodSessions(None, ttl=-1)
+    expired.mark_good(SENDER)
+    assert not expired.is_known_good(SENDER)
+
+def test_time_saved_is_only_an_upper_bound_for_checks_that_missed_the_inbox(monkeypatch):
+    stats = {"checks": 0, "seconds": 0.0, "saved_seconds_upper_bound": 0.0}
+    monkeypatch.setattr(session_probe, "probe_stats", stats)
+    record_check("inbox", 1.5)
+    record_check("login", 0.5)
+    record_check("unknown", 9.0)
+    assert stats == {"checks": 3, "seconds": 11.0, "saved_seconds_upper_bound": 6.5}
@@ -0,0 +1,62 @@
+import asyncio
+
+import pytest
+
+pytest.importorskip("playwright")
+
+from agent import shared_browser
+from agent.shared_browser import SharedBrowserEngine, _AccountContext
+
+class FakeContext:
+    async def close(self):
+        pass
+
+    async def storage_state(self, path=None):
+        pass
+
+class FakeEngine(SharedBrowserEngine):
+    """The engine's scheduling without a browser: each context's page is just its sender and a number."""
+
+    async def start(self):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_parallel)
+
+    async def account(self, sender_email):
+        if sender_email not in self._accounts:
+            self.stats["contexts_opened"] += 1
+            page = (sender_email, self.stats["contexts_opened"])
+            self._accounts[sender_email] = _AccountContext(sender_email, FakeContext(), page)
+        return self._accounts[sender_email]
+
+def _jobs(*senders):
+    return [{"recipient": "to@example.com", "subject": "Hi", "body": "Hello", "sender_email": sender} for sender in senders]
+
+def test_sends_waiting_for_a_busy_sender_do_not_hold_slots(monkeypatch):
+    finished = []
+
+    async def compose_and_send(page, recipient, subject, body):
+        await asyncio.sleep(0.05)
+        finished.append(page[0])
+
+    monkeypatch.setattr(shared_browser, "compose_and_send", compose_and_send)
+    engine = FakeEngine(max_parallel=2)
+    asyncio.run(engine.send_many(_jobs("a@example.com", "a@example.com", "a@example.com", "b@example.com")))
+    # 'b' gets the second slot right away instead of queueing behind a's later sends.
+    assert sorted(finished[:2]) == ["a@example.com", "b@example.com"]
+    assert engine.stats["sends"] == 4
+
+def test_a_send_waiting_behind_a_failed_one_gets_a_fresh_context(monkeypatch):
+    pages = []
+
+    async def compose_and_send(page, recipient, subject, body):
+        pages.append(page)
+        await asyncio.sleep(0.01)
+        if len(pages) == 1:
+            raise RuntimeError("Compose did not open")
+
+    monkeypatch.setattr(shared_browser, "compose_and_send", compose_and_send)
+    engine = FakeEngine(max_parallel=2)
+    first, second = asyncio.run(engine.send_many(_jobs("a@example.com", "a@example.com")))
+    assert isinstance(first, RuntimeError) and isinstance(second, float)
+    assert pages == [("a@example.com", 1), ("a@example.com", 2)]
+    assert engine.stats["failures"] == 1
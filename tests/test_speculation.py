@@ -0,0 +1,58 @@
+import threading
+
+import pytest
+
+from agent import speculation
+from agent.followup_classifier import FollowupClassifier
+from agent.speculation import SpeculativeDrafter
+
+DRAFT = {"subject": "Hello", "body": "Hello,\n\nBest regards,\nAda"}
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Fake model calls; the analysis answers whatever calls["question"] says."""
+    recorded = {"question": None, "generated": []}
+
+    def generate_email_content(user_name, prompt):
+        recorded["generated"].append(prompt)
+        return DRAFT
+
+    monkeypatch.setattr(speculation, "FOLLOWUP_FAST_PATH", False)
+    monkeypatch.setattr(speculation, "generate_email_content", generate_email_content)
+    monkeypatch.setattr(speculation, "analyze_prompt_for_followup", lambda prompt: recorded["question"])
+    return recorded
+
+def test_draft_is_used_when_no_question_is_needed(calls):
+    drafter = SpeculativeDrafter()
+    question, draft = drafter.analyze_and_draft("Ada", "thank the team for the launch")
+    assert question is None
+    assert draft.result(timeout=5) == DRAFT
+    assert drafter.stats == {"hits": 1, "misses": 0, "cancelled": 0, "local": 0}
+
+def test_draft_not_yet_started_is_cancelled_when_a_question_is_needed(calls):
+    calls["question"] = "To whom should the email be sent?"
+    drafter = SpeculativeDrafter(max_workers=1)
+    # Keep the only worker busy so the speculative draft is still queued when the analysis returns.
+    release = threading.Event()
+    blocker = drafter._executor.submit(release.wait)
+    try:
+        question, draft = drafter.analyze_and_draft("Ada", "write an email")
+    finally:
+        release.set()
+    blocker.result(timeout=5)
+    drafter._executor.shutdown(wait=True)
+    assert question == "To whom should the email be sent?" and draft is None
+    assert calls["generated"] == []
+    assert drafter.stats == {"hits": 0, "misses": 1, "cancelled": 1, "local": 0}
+    assert drafter.hit_rate() == 0.0
+
+def test_local_answer_starts_no_model_call(calls, monkeypatch):
+    monkeypatch.setattr(speculation, "FOLLOWUP_FAST_PATH", True)
+    # A classifier that never audits, so the rules' answer is always the one used.
+    monkeypatch.setattr(speculation, "get_followup_classifier", lambda: FollowupClassifier(None, audit_rate=0.0))
+    calls["question"] = "never asked"
+    drafter = SpeculativeDrafter()
+    question, draft = drafter.analyze_and_draft("Ada", "I need a day off")
+    assert question == "For what dates will you be on leave?" and draft is None
+    assert calls["generated"] == []
+    assert drafter.stats["local"] == 1
@@ -0,0 +1,37 @@
+import pytest
+
+from agent.structured_output import _repair, parse_draft
+
+def test_strict_json_is_used_as_is():
+    assert parse_draft('{"subject": "Hi", "body": "Hello"}') == {"subject": "Hi", "body": "Hello"}
+
+def test_code_fence_trailing_comma_and_raw_line_break():
+    text = '```json\n{"subject": "Hi", "body": "Line one\nline two",}\n```'
+    assert parse_draft(text) == {"subject": "Hi", "body": "Line one\nline two"}
+
+def test_quotes_inside_the_body_are_escaped():
+    text = 'Here you go: {"subject": "Hi", "body": "She said "yes" to it"} Thanks!'
+    assert parse_draft(text) == {"subject": "Hi", "body": 'She said "yes" to it'}
+
+def test_missing_comma_between_fields():
+    assert parse_draft('{"subject": "Hi"\n"body": "x"}') == {"subject": "Hi", "body": "x"}
+
+def test_missing_closing_brace_after_a_finished_body():
+    assert parse_draft('{"subject": "Hi", "body": "Done."') == {"subject": "Hi", "body": "Done."}
+
+def test_python_style_single_quotes():
+    assert parse_draft("{'subject': 'Hi', 'body': 'Yo'}") == {"subject": "Hi", "body": "Yo"}
+
+def test_body_cut_off_mid_sentence_is_rejected():
+    with pytest.raises(ValueError, match="cut off"):
+        parse_draft('{"subject": "Hi", "body": "Dear team,\nI wanted to')
+
+def test_repair_reports_the_cut_off():
+    repaired, cut_off = _repair('{"subject": "Hi", "body": "Dear team')
+    assert cut_off
+    _, finished = _repair('{"subject": "Hi", "body": "Dear team"')
+    assert not finished
+
+def test_no_object_at_all():
+    with pytest.raises(ValueError):
+        parse_draft("Sorry, I can't help with that.")
@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+from agent import tracing
+from agent.tracing import Tracer, annotate, load_spans, percentile, span, summarize
+
+@pytest.fixture
+def tracer(tmp_path, monkeypatch):
+    recording = Tracer(str(tmp_path / "spans.jsonl"), str(tmp_path / "metrics.prom"))
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", True)
+    monkeypatch.setattr(tracing, "_tracer", recording)
+    return recording
+
+def test_spans_nest_and_are_written_as_jsonl(tracer):
+    with span("send", sender="me@example.com"):
+        with span("browser.compose_and_send"):
+            annotate(attempt=1)
+        with pytest.raises(ValueError):
+            with span("browser.confirm"):
+                raise ValueError("no confirmation")
+    assert tracer.flush(5)
+
+    records = {record["name"]: record for record in load_spans(tracer.trace_path)}
+    assert set(records) == {"send", "browser.compose_and_send", "browser.confirm"}
+    parent = records["send"]
+    assert parent["parent_id"] is None and parent["attributes"] == {"sender": "me@example.com"}
+    for child in ("browser.compose_and_send", "browser.confirm"):
+        assert records[child]["parent_id"] == parent["span_id"]
+        assert records[child]["trace_id"] == parent["trace_id"]
+    assert records["browser.compose_and_send"]["attributes"] == {"attempt": 1}
+    assert records["browser.confirm"]["status"] == "error"
+    assert records["browser.confirm"]["error"] == "ValueError: no confirmation"
+
+def test_async_spans_nest_per_task(tracer):
+    async def send(name):
+        async with span("send", job=name):
+            await asyncio.sleep(0.01)
+            async with span("browser.compose_and_send", job=name):
+                await asyncio.sleep(0.01)
+
+    async def run():
+        await asyncio.gather(send("a"), send("b"))
+
+    asyncio.run(run())
+    assert tracer.flush(5)
+    records = load_spans(tracer.trace_path)
+    parents = {r["span_id"]: r["attributes"]["job"] for r in records if r["name"] == "send"}
+    children = [r for r in records if r["name"] == "browser.compose_and_send"]
+    assert len(children) == 2
+    # Each child belongs to the send of its own task, not to whichever span started last.
+    assert all(parents[child["parent_id"]] == child["attributes"]["job"] for child in children)
+
+def test_prometheus_histogram(tracer):
+    for seconds, error in [(0.003, None), (0.2, None), (0.2, RuntimeError("x"))]:
+        finished = tracing.Span("llm.generate", {})
+        finished.finish(error)
+        finished.duration = seconds
+        tracer.record(finished)
+    assert tracer.flush(5)
+
+    with open(tracer.metrics_path, encoding="utf-8") as f:
+        text = f.read()
+    assert text == tracer.prometheus_text()
+    lines = text.splitlines()
+    assert "# TYPE email_assistant_stage_duration_seconds histogram" in lines
+    assert 'email_assistant_stage_duration_seconds_bucket{stage="llm.generate",le="0.005"} 1' in lines
+    assert 'email_assistant_stage_duration_seconds_bucket{stage="llm.generate",le="0.1"} 1' in lines
+    assert 'email_assistant_stage_duration_seconds_bucket{stage="llm.generate",le="0.25"} 3' in lines
+    assert 'email_assistant_stage_duration_seconds_bucket{stage="llm.generate",le="+Inf"} 3' in lines
+    assert 'email_assistant_stage_duration_seconds_count{stage="llm.generate"} 3' in lines
+    assert 'email_assistant_stage_duration_seconds_sum{stage="llm.generate"} 0.403000' in lines
+    assert 'email_assistant_stage_errors_total{stage="llm.generate"} 1' in lines
+
+def test_spans_are_not_recorded_when_tracing_is_off(tracer, monkeypatch):
+    monkeypatch.setattr(tracing, "TRACING_ENABLED", False)
+    with span("send") as s:
+        s.set(sender="me@example.com")
+    assert tracer.flush(5)
+    assert tracer.prometheus_text().count("stage=") == 0
+
+def test_summary_percentiles():
+    assert percentile([], 50) == 0.0
+    assert percentile([1, 2, 3, 4, 5, 6, 7, 8, 9, 10], 95) == 10
+    records = [{"name": "send", "duration_ms": float(ms), "status": "ok", "attributes": {"warm": ms < 50}}
+               for ms in range(1, 101)]
+    [row] = summarize(records)
+    assert row == {"stage": "send", "count": 100, "errors": 0, "p50_ms": 50.0, "p95_ms": 95.0, "p99_ms": 99.0, "max_ms": 100.0}
+    by_warm = summarize(records, by="warm")
+    assert [(row["warm"], row["count"]) for row in by_warm] == [("False", 51), ("True", 49)]
@@ -0,0 +1,100 @@
+import smtplib
+import socket
+
+import pytest
+
+from agent.transports import AmbiguousSendError, SmtpTransport, build_message
+
+class FakeSmtp:
+    """Answers like an SMTP server would; 'script' says how each step goes for this connection."""
+
+    def __init__(self, script: dict, log: list):
+        self.script = script
+        self.log = log
+
+    def ehlo_or_helo_if_needed(self):
+        pass
+
+    def mail(self, sender):
+        self.log.append(("mail", sender))
+        return self._answer("mail", (250, b"OK"))
+
+    def rcpt(self, address):
+        self.log.append(("rcpt", address))
+        return self._answer("rcpt", (250, b"OK"))
+
+    def data(self, content):
+        self.log.append(("data",))
+        return self._answer("data", (250, b"Queued"))
+
+    def _answer(self, step, default):
+        outcome = self.script.get(step, default)
+        if isinstance(outcome, BaseException):
+            raise outcome
+        return outcome
+
+    def rset(self):
+        self.log.append(("rset",))
+
+    def noop(self):
+        return 250, b"OK"
+
+    def quit(self):
+        self.log.append(("quit",))
+
+    def close(self):
+        pass
+
+class FakeSmtpTransport(SmtpTransport):
+    def __init__(self, scripts: list[dict]):
+        super().__init__(security="none", pool_size=1)
+        self.scripts = list(scripts)
+        self.log = []
+
+    def connect(self, sender_email, sender_password):
+        self.stats["connections_opened"] += 1
+        return FakeSmtp(self.scripts.pop(0), self.log)
+
+def _message(index: int = 0):
+    return build_message(f"to{index}@example.com", "Hi", "Body", "me@example.com")
+
+def test_refused_recipients_fail_without_a_reconnect():
+    transport = FakeSmtpTransport([{"rcpt": (550, b"No such user")}])
+    with pytest.raises(smtplib.SMTPRecipientsRefused):
+        transport.send_messages([_message()], "me@example.com", "pw")
+    assert transport.stats == {"connections_opened": 1, "messages_sent": 0, "reconnects": 0}
+
+def test_refused_sender_fails_without_a_reconnect():
+    transport = FakeSmtpTransport([{"mail": (553, b"Not allowed")}])
+    with pytest.raises(smtplib.SMTPSenderRefused):
+        transport.send_messages([_message()], "me@example.com", "pw")
+    assert transport.stats["reconnects"] == 0
+
+@pytest.mark.parametrize("outcome", [(554, b"Message rejected as spam"), smtplib.SMTPDataError(554, b"No DATA now")])
+def test_rejected_data_is_a_definite_failure(outcome):
+    transport = FakeSmtpTransport([{"data": outcome}])
+    with pytest.raises(smtplib.SMTPDataError):
+        transport.send_messages([_message()], "me@example.com", "pw")
+    assert transport.stats["reconnects"] == 0
+
+@pytest.mark.parametrize("error", [smtplib.SMTPServerDisconnected("gone"), socket.timeout("timed out"), ConnectionResetError()])
+def test_disconnect_during_data_is_ambiguous(error):
+    transport = FakeSmtpTransport([{"data": error}, {}])
+    with pytest.raises(AmbiguousSendError):
+        transport.send_messages([_message()], "me@example.com", "pw")
+    # Never retried: the server may have accepted it.
+    assert transport.log.count(("data",)) == 1
+    assert transport.stats["connections_opened"] == 1
+
+def test_connection_lost_before_data_reconnects_and_sends():
+    transport = FakeSmtpTransport([{"mail": smtplib.SMTPServerDisconnected("Connection unexpectedly closed")}, {}])
+    transport.send_messages([_message(0), _message(1)], "me@example.com", "pw")
+    assert transport.stats == {"connections_opened": 2, "messages_sent": 2, "reconnects": 1}
+    assert [entry[1] for entry in transport.log if entry[0] == "rcpt"] == ["to0@example.com", "to1@example.com"]
+
+def test_connection_lost_twice_gives_up():
+    dropped = smtplib.SMTPServerDisconnected("Connection unexpectedly closed")
+    transport = FakeSmtpTransport([{"mail": dropped}, {"mail": dropped}])
+    with pytest.raises(smtplib.SMTPServerDisconnected):
+        transport.send_messages([_message()], "me@example.com", "pw")
+    assert transport.stats["reconnects"] == 1